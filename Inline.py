@@ -24,6 +24,22 @@ Additional functions:
 required proprietary modules:
 	1. C:\Python34\InlineClasses.py
 	2. C:\Python34\InlineFuncs.py
+	3. C:\Python34\InlineAcq.py
+	4. C:\Python34\InlineHW.py
+	5. C:\Python34\InlineTestPlan.py
+	6. C:\Python34\InlineEval.py
+	7. C:\Python34\InlineCal.py
+	8. C:\Python34\InlineStore.py
+	9. C:\Python34\InlineLog.py
+	10. C:\Python34\InlineDB.py
+	11. C:\Python34\InlineSnapshot.py
+	12. C:\Python34\InlineHistory.py
+	13. C:\Python34\InlineSPC.py
+	14. C:\Python34\InlineTiming.py
+	15. C:\Python34\InlineMetrics.py
+	16. C:\Python34\InlineBench.py (cycle time benchmark, not required for testing)
+	17. C:\Python34\InlineReplay.py (re-evaluation of the results files with candidate limits, not required for testing)
+	18. C:\Python34\InlineSupervisor.py (several stations on one PC, not required for a single tester)
 
 
 Python-Setup:
@@ -37,30 +53,83 @@ program start cmd
 	type: C:\Python34\python C:\Python34\Inline.py
 	or
 	python C:\Python34\Inline.py (after python was added as environment variable: Windows -> Computer -> Eigenschaften -> Einstellungen ändern -> Erweitert -> Umgebungsvariablen)
+
+offline run with simulated Labjack modules (no drivers / hardware required), e.g. for profiling:
+	python Inline.py -sim -nl start Y
+	python -m cProfile -s cumtime Inline.py -sim -nl start Y
+
+without GUI (no display required, tkinter isn't imported), e.g. unattended lines or benchmarks; Ctrl+C exits the test:
+	python Inline.py -headless -nl start Y -metrics 9100
+
+several stations (own Labjack modules, station ID and files) in separate processes with one aggregator: see InlineSupervisor
+	python InlineSupervisor.py stations.json
 """
 
-from labjack import ljm
 from array import array
 import ctypes
+import os
 from enum import IntEnum
 import sys
 import time
 from datetime import date
 import threading
 import queue
-from InlineClasses import MODE, LIMIT, Ports, states, position, STATE, STATUS, ERR, QGUI, NDUT, MEMCYC
-from InlineGUI import ShuttleGUI
-import tkinter
+import signal
+import io
+from InlineClasses import MODE, ACQ, OP, LIMIT, Ports, states, position, STATE, STATUS, ERR, QGUI, NDUT, MEMCYC
+from InlineAcq import AcqEngine
+from InlineHW import LJMBackend, SimT7Backend
+from InlineTestPlan import TESTPLAN, compile_testplan
+from InlineEval import limit_arrays, evaluate_step, classify
+from InlineCal import CAL_FILE, load_calibration, save_calibration, fit_channel, apply_calibration, identity
+from InlineStore import ResultWriter
+from InlineLog import LogWriter
+from InlineDB import ResultDB
+from InlineSnapshot import SnapshotChannel
+from InlineHistory import PositionHistory
+from InlineSPC import SPCEngine
+from InlineTiming import TIMING, timed, install_dump_signal
+from InlineMetrics import MetricsServer
 import random
 
 
 
 #------------------------------------------------------------------------Inline Tester State Machine-----------------------------------------------------------------------
 class InlineStateMachine:
-	def __init__(self, master):
+	def __init__(self, hw = None, station = None, aggregator = None, heartbeat = None, paths = None):
+		#Hardware access layer: all ljm calls go through self.hw (real Labjack modules or simulated modules, see InlineHW)
+		if hw is None:
+			hw = LJMBackend()
+		self.hw = hw
+		#Station of the supervisor (see InlineSupervisor): {"id": station ID, "serials": [SN module 1, SN module 2], "args": command line arguments}
+		#None: single tester with the serial numbers below and the command line of the program
+		self.station = station
+		#Files of the tester: {"log": LOG_PATH, "spool": SPOOL_PATH, "db": DB_FILE, "cal": CAL_FILE} instead of the production paths
+		#(e.g. the temporary directory of InlineBench), None: production paths
+		self.paths = {} if paths is None else paths
+		self.STATION_ID = "" if station is None else station["id"]
+		self.ARGV = sys.argv if station is None else ["Inline.py"] + list(station.get("args", []))
+		self.aggregator = aggregator			#queue of the supervisor for the results and state changes, None: no supervisor
+		self.heartbeat = heartbeat				#shared value (multiprocessing.Value) with the time of the last schedule, watchdog of the supervisor
+		self.StationState = None				#last state sent to the aggregator
 		self.AN_CH = 14						#Number of analog channels
 		self.DIO_CH = 23					#Number of digital channels per 
 		self.NLJM = 2						#Number of LabjackModules
+
+		"""
+		Analog channel assignment, overview: C:\Python34\Analog_Channel_Assignment.txt
+			Module1: AIN0..AIN8 = AIN_GATEMO1..9, AIN9..AIN13 = AIN_PHASEMO1..5
+			Module2: AIN0..AIN3 = AIN_PHASEMO6..9, AIN4..AIN12 = AIN_SOURCEMO1..9
+		names and addresses are computed once, so that each acquisition is a single batched USB transaction per module
+		"""
+		self.AIN_NAMES_LJM1 = ["AIN%i" % i for i in range(0, 14)]
+		self.AIN_NAMES_LJM2 = ["AIN%i" % i for i in range(0, 13)]
+		self.AIN_ADDR_LJM1, self.AIN_TYPES_LJM1 = self.hw.namesToAddresses(len(self.AIN_NAMES_LJM1), self.AIN_NAMES_LJM1)
+		self.AIN_ADDR_LJM2, self.AIN_TYPES_LJM2 = self.hw.namesToAddresses(len(self.AIN_NAMES_LJM2), self.AIN_NAMES_LJM2)
+		#all digital IOs of module 1 as bitmask (bit n = DIOn), used to poll the shuttle valve sensors with a single read
+		self.DIO_STATE_ADDR, self.DIO_STATE_TYPE = self.hw.namesToAddresses(1, ["DIO_STATE"])
+		self.SHUTTLE_POLL = 0.001				#poll period in sec while waiting for the shuttle valve end position
+		self.TIME_SHUTTLETRAVEL = float(0)		#measured travel time of the last shuttle valve movement in sec
 		
 		#Flags as basis to set the state in which the tester state machine is in
 		self.PROG_MODE = MODE.PRODUCTION	#Program Mode PRODUCTION: normal test flow, SERVICE: Service staff can control actor / sensors / test flow
@@ -83,21 +152,18 @@ class InlineStateMachine:
 
 		self.DUTSTATUS = list(range(0, NDUT))		#Status of complete test of each DUT (Device under Test, SSSPR Module in the shuttle)
 		self.DUTSTATUSTMP = list(range(0, NDUT))	#For Evaluation of each test step
-		self.DUTSTATUSMEM = list(range(0, NDUT*MEMCYC))	#DUT Results from last shuttle
 	
 		for i in range(0, NDUT):
 			self.DUTSTATUS[i] = ERR.NORES
 			self.DUTSTATUSTMP[i] = ERR.NORES
 		
-		for m in range(0, MEMCYC):
-			for i in range(0, NDUT):	
-				self.DUTSTATUSMEM[m*NDUT + i] = ERR.NORES
-				#quasi 2-D Array
-				#DUTSTATMEM[0...8] 		contains DUT Error Codes from last shuttle (= N-1)
-				#= DUTSTATMEM[m=0, i=0...8]
-				#DUTSTATMEM[9...17] 	contains DUT Error Codes from shuttle N-2
-				#= DUTSTATMEM[m=1, i=0...8]
-				...
+		#error codes of the last shuttles per position and repetition error check (see InlineHistory)
+		#depth: shuttles kept (default MEMCYC), rules: successive shuttles with the same error code at a position which stop the tester
+		self.history = PositionHistory(NDUT, MEMCYC)
+		self.HISTORY_VIEW = 3					#previous shuttles shown in the GUI (N-1 ... N-3, see QGUI.Dutstati_Old)
+		self.HistoryView = self.history.recent(self.HISTORY_VIEW)	#copy for the GUI, updated by the state machine (see ApplyEvaluation)
+		#rolling yield, EWMA and CUSUM per shuttle position and error class (see InlineSPC), alarms are logged and shown in the GUI
+		self.spc = SPCEngine(NDUT)
 	
 		self.TotalDUTsTested = 0		
 		self.TotalDUTsPassed = 0
@@ -108,10 +174,62 @@ class InlineStateMachine:
 
 		self.SN_LJM1 = "470011540"				#change only if labjack modules are changed
 		self.SN_LJM2 = "470011571"				#change only if labjack modules are changed
+		if station is not None:
+			self.SN_LJM1, self.SN_LJM2 = station["serials"]
 		self.handle1 = 0						#Handle (int value) for identification of the Labjack Module
 		self.handle2 = 0						#Handle (int value) for identification of the Labjack Module
 		self.error = 0							#error as return value for methods
 		self.LabjacksOpened = states.CLEAR		#if LabjacksOpened = CLEAR -> all modules are closed / if set all modules are opened
+		self.acq = None							#Acquisition engine with one worker per Labjack module, is started after the modules have been opened
+		self.ACQ_MODE = ACQ.SINGLE				#SINGLE: one sample per channel and test step, STREAM: stream of STREAM_SCANS scans, reduced to mean / min / max / noise
+		self.STREAM_SCANS = 50					#scans per test step in STREAM mode
+		self.STREAM_RATE = 2000					#scans / sec in STREAM mode, (14 channels * 2000 scans/sec is within the T7 stream limit)
+
+		#Settling after switching relays in STATE.TESTING (see Settle)
+		self.ADAPTIVE_SETTLING = states.SET		#SET: wait until the inputs are stable (at most the fixed settling time), CLEAR: always wait the fixed settling time
+		self.SETTLE_BAND = 0.005				#all channels have to stay within a band of SETTLE_BAND (max - min in V) ...
+		self.SETTLE_NPOLL = 4					#... for SETTLE_NPOLL successive polls
+		self.SETTLE_POLL = 0.025				#poll period in sec
+		self.SETTLE_MIN = 0.02					#minimum settle time in sec (operate time of the relays)
+		self.SettleTimeShuttle = float(0)		#Sum of the measured settle times of the current shuttle
+		self.SettleMaxShuttle = float(0)		#Sum of the fixed settling times of the current shuttle
+
+		#Test plan of STATE.TESTING (see InlineTestPlan), compiled in STATE.INIT
+		self.TestSchedule = []					#flat execution schedule
+		self.TestStores = []					#names of the error code lists which are kept for STATE.EVALUATE
+		self.StepErrors = {}					#error code lists of the current shuttle, e.g. StepErrors["GateErrorT4"]
+		self.StepTimes = []						#(test step, time in sec) of the current shuttle
+
+		#Logging: L:\YYYY-MM-DD_Init.ascii for STATE.INIT, one text log and one results file (see InlineStore) per day for all shuttles
+		#all logs are written to the local spool SPOOL_PATH first and forwarded to LOG_PATH in the background (see InlineLog)
+		self.LOG_PATH = self.paths.get("log", "L:\\")
+		self.SPOOL_PATH = self.paths.get("spool", "C:\\InlineSpool")
+		#traceability database of all shuttles / DUTs on the local disk (see InlineDB), written in the background
+		self.DB_FILE = self.paths.get("db", "C:\\InlineData\\InlineResults.db")
+		if station is not None:
+			#each station has its own files: L:\<station ID>_YYYY-MM-DD_..., spool directory and database (InlineResults_<station ID>.db)
+			self.LOG_PATH = self.LOG_PATH + self.STATION_ID + "_"
+			self.SPOOL_PATH = os.path.join(self.SPOOL_PATH, self.STATION_ID)
+			self.DB_FILE = os.path.splitext(self.DB_FILE)[0] + "_%s.db" % self.STATION_ID
+		self.logwriter = LogWriter(self.SPOOL_PATH)
+		self.db = ResultDB(self.DB_FILE)
+		self.ShuttleLogFile = None				#daily text log, kept open during testing
+		self.ShuttleLogDay = None
+		self.Results = None						#daily results file, created in STATE.INIT
+		self.ShuttleNo = 0						#shuttle number of the day (record in the results file)
+		self.RAW_GROUP = {QGUI.Gate: 0, QGUI.Phase: 1, QGUI.Source: 2}	#order of the channel groups in the raw voltages
+		self.RawShuttle = array("f")			#raw voltages of the current shuttle [step][group][DUT], allocated in STATE.INIT
+		self.RawEmpty = array("f")				#NaN for each raw voltage, to reset RawShuttle
+		#Pipelined evaluation (-pl): STATE.EVALUATE of shuttle N runs on a worker thread while the state machine waits for shuttle N+1
+		#the shuttles are evaluated in order (FIFO), the evaluation is finished before the next shuttle is stopped (see WaitEvaluation)
+		#the worker doesn't change the fields shared with the GUI / the state machine, its results are applied by the state machine (see ApplyEvaluation)
+		self.PIPELINE = states.CLEAR
+		self.evalqueue = queue.Queue()
+		self.evalresults = queue.Queue()		#results of the worker (see EvaluateShuttle)
+		self.evalworker = None
+		self.EvalJob = None						#data of the tested shuttle for STATE.EVALUATE (see ShuttleJob)
+		self.TIME_ACQ_LJM1 = float(0)			#Timestamp of the last acquisition of module 1 (seconds since epoch)
+		self.TIME_ACQ_LJM2 = float(0)			#Timestamp of the last acquisition of module 2 (seconds since epoch)
 												#this flag enables closing / opening modules only if they were opened / closed
 
 		"""
@@ -130,6 +248,18 @@ class InlineStateMachine:
 		self.DIV_GATE = array("f", [2.6027, 2.6027, 2.6027, 2.6027, 2.6027, 2.6027, 2.6027, 2.6027, 2.6027])		#AINmeasured(in V)*DIV_GATE = DUT_GATE_Voltage(in V)
 		self.DIV_PHASE = array("f", [3.0, 3.0, 3.0, 3.0, 3.0, 3.0, 3.0, 3.0, 3.0])									#AINmeasured(in V)*DIV_PHASE = DUT_PHASE_Voltage (in V)
 		self.DIV_SOURCE = array("f", [10.0, 10.0, 10.0, 10.0, 10.0, 10.0, 10.0, 10.0, 10.0])						#AINmeasured*DIV_SOURCE = DUT_Drain_Current in mA
+
+		"""
+		Calibration of the analog inputs (see InlineCal): the DIV_ arrays above are the nominal dividers
+		deviations of the actual dividers and offsets of the AINs are corrected by a gain / offset table per module (serial number SN_LJM1 / SN_LJM2)
+		the tables are loaded in STATE.INIT and can be determined with the guided calibration (-cal, see calibrate)
+		"""
+		self.CAL_FILE = self.paths.get("cal", CAL_FILE)
+		self.CAL_REQ = states.CLEAR				#SET: guided calibration in STATE.INIT prior to the selftest
+		self.CalRevisions = [0, 0]				#revision of the calibration table of each module, 0: not calibrated
+		#group and nominal divider of each AIN (index 0: module 1, 1: module 2)
+		self.AIN_DIV = [list(self.DIV_GATE) + list(self.DIV_PHASE[0:5]), list(self.DIV_PHASE[5:NDUT]) + list(self.DIV_SOURCE)]
+		self.AIN_GROUP = [[QGUI.Gate]*NDUT + [QGUI.Phase]*5, [QGUI.Phase]*4 + [QGUI.Source]*NDUT]
 		
 		#Set the initial Tester States for the state machine
 		#By storing the previous state repetition errors counters / reinit-steps etc. can be set
@@ -137,9 +267,10 @@ class InlineStateMachine:
 		self.This_State = STATE.ENTRY
 		self.Next_State = STATE.ENTRY
 
-		self.master = master
-		self.QMAXSIZE = 20
-		self.guiqueue = queue.Queue(maxsize = self.QMAXSIZE)
+		#the state machine doesn't know the GUI: it only publishes snapshots (see InlineSnapshot), the GUI is a subscriber in the main thread (see run_gui)
+		self.GUI_MAXFPS = 10					#max. number of GUI updates per second, the GUI is updated when the state machine publishes new data
+		self.LoggedOn = threading.Event()		#set after the logon, the GUI is built afterwards (layout depends on PROG_MODE)
+		self.Exited = threading.Event()			#set at the end of STATE.EXIT, i.e. the state machine has ended regularly (not by an exception)
 	
 		self.VPhaseDUT = list(range(0, NDUT))
 		self.VGateDUT = list(range(0, NDUT))
@@ -167,13 +298,13 @@ class InlineStateMachine:
 		self.InlineLimits[LIMIT.MIN_SOURCE] = 0.8
 		self.InlineLimits[LIMIT.VOFF] = 0.08		#+/-LIMIT.VOFF: range for Voltages which are supposed to be switched off 
 
-		#Set up the Queue from which the GUI takes the information
-		self.qObj = list(range(0, 14))	#length QGUI
+		#Set up the qObj, the GUI gets a copy of it via the snapshot channel (see InlineSnapshot)
+		self.qObj = list(range(0, 15))	#length QGUI
 		self.qObj[QGUI.Gate] = self.VGateDUT
 		self.qObj[QGUI.Phase] = self.VPhaseDUT
 		self.qObj[QGUI.Source] = self.VSourceDUT
 		self.qObj[QGUI.Dutstatus] = self.DUTSTATUS
-		self.qObj[QGUI.Dutstati_Old] = self.DUTSTATUSMEM
+		self.qObj[QGUI.Dutstati_Old] = self.HistoryView
 		self.qObj[QGUI.TesterState] = self.TESTER_STATUS
 		self.qObj[QGUI.Ntot] = self.TotalDUTsTested
 		self.qObj[QGUI.Npass] = self.TotalDUTsPassed
@@ -183,15 +314,23 @@ class InlineStateMachine:
 		self.qObj[QGUI.Nds_short] = self.TotalDUTsDSShort		
 		self.qObj[QGUI.State] = self.Next_State
 		self.qObj[QGUI.Mode] = self.PROG_MODE
+		self.qObj[QGUI.Spc] = self.spc.summary()
 
-		self.guiqueue.put(self.qObj)
-	
-		#self.gui = ShuttleGUI(self.master, self.guiqueue, self.startCommand, self.haltCommand, self.exitCommand, self.gui_shuttlevalve_up, self.gui_shuttlevalve_down, self.gui_vphase_on, self.gui_vphase_off, self.gui_vphase_rev_off, self.gui_vphase_rev_on, self.gui_gate_on, self.gui_vgate_off, self.GetVGate, self.GetVPhase, self.GetVSource)
+		self.snapshots = SnapshotChannel(self.qObj)
 
 		#UserStart is set / reset by the gui via the functions startCommand / haltCommand to indicate start stop
 		self.UserStart = 0
 		self.UserExit = 0
 		
+		#latency histograms of the tester operations (see InlineTiming), written at EXIT and on demand (Ctrl+Break):
+		#the signal handler (installed in the main thread, see main) only sets the request, the table is written by schedule()
+		self.DumpRequest = threading.Event()
+		self.TimeLastShuttle = None				#perf_counter at the start of the last shuttle (cycle time)
+		self.TimeSchedule = None				#perf_counter of the last call of schedule (dwell time per state)
+		#optional HTTP endpoint on localhost with throughput / latency metrics (-metrics PORT, see InlineMetrics)
+		self.METRICS_PORT = None
+		self.metrics = None
+
 		#start the inline tester state machine which runs in parallel to the inlineGui
 		self.thread1 = threading.Thread(target=self.state_machine)
 		self.thread1.start()
@@ -200,40 +339,67 @@ class InlineStateMachine:
 	#evaluate the command line inputs
 	#command line arguments are described in the print statement of the help section -h
 	def eval_cmdargs(self):
-		#reference to the fields of the returned list
-		for i in range(len(sys.argv)):
+		#reference to the fields of the returned list, the command line of the program or the arguments of the station (see ARGV)
+		argv = self.ARGV
+		for i in range(len(argv)):
 			#Program Mode
-			if sys.argv[i] == "-m":
-				if sys.argv[i+1] == "SERVICE":
+			if argv[i] == "-m":
+				if argv[i+1] == "SERVICE":
 					self.PROG_MODE = MODE.SERVICE
 				else:
 					self.PROG_MODE = MODE.PRODUCTION
 			#Output Mode
-			if sys.argv[i] == "-v":
+			if argv[i] == "-v":
 				self.OUTPUT_MODE = MODE.DEBUG
 				#else: init value of self.OUTPUT_MODE
 			#User
-			if sys.argv[i] == "-l":
-				self.USERNAME = sys.argv[i+1]
+			if argv[i] == "-l":
+				self.USERNAME = argv[i+1]
 				import getpass
 				pswd = getpass.getpass('Password:')
 				self.check_login(pswd)	#check login alters self.LOGON_OK, self.ACCESS_LEVEL
 			#Omit password
-			if sys.argv[i] == "-nl":
+			if argv[i] == "-nl":
 				self.LOGON_OK = STATUS.PASSED
 			#Serial Number enabled?
-			if sys.argv[i] == "-s":
+			if argv[i] == "-s":
 				self.REQ_SN = states.SET
 				print('Serial Number required')
 			#Lot Code?
-			if sys.argv[i] == "-LT":
+			if argv[i] == "-LT":
 				self.REQ_LOTN = states.SET
-			if sys.argv[i] == "start":
-				if sys.argv[i+1] == "Y":
+			#Fixed settling times instead of adaptive settling
+			if argv[i] == "-fs":
+				self.ADAPTIVE_SETTLING = states.CLEAR
+			#Guided calibration of the analog inputs
+			if argv[i] == "-cal":
+				self.CAL_REQ = states.SET
+			#Depth of the position history / repetition rule of an error class, e.g. -rep NOT_BONDED 0 (not checked)
+			if argv[i] == "-mem":
+				self.history.set_depth(int(argv[i+1]))
+			if argv[i] == "-rep":
+				self.history.set_rule(ERR[argv[i+1]], int(argv[i+2]))
+			#Pipelined evaluation
+			if argv[i] == "-pl":
+				self.PIPELINE = states.SET
+			#Metrics endpoint
+			if argv[i] == "-metrics":
+				self.METRICS_PORT = int(argv[i+1])
+			#max. GUI update rate
+			if argv[i] == "-fps":
+				self.GUI_MAXFPS = float(argv[i+1])
+			#Acquisition Mode
+			if argv[i] == "-a":
+				if argv[i+1] == "STREAM":
+					self.ACQ_MODE = ACQ.STREAM
+				else:
+					self.ACQ_MODE = ACQ.SINGLE
+			if argv[i] == "start":
+				if argv[i+1] == "Y":
 					self.startCommand()
 				else:
 					self.haltCommand()
-			if sys.argv[i] == "-h":
+			if argv[i] == "-h":
 				print(	"-h print this help\n" 
 						"\n"
 						"-v enable verbose output\n"
@@ -257,7 +423,30 @@ class InlineStateMachine:
 						"	start immediately after hitting return"
 						"	N: No, start from GUI\n"
 						"	Y: Yes, start immediately\n"
-						)
+						"-a [mode]\n"
+						"	acquisition mode of the analog inputs, mode can be:\n"
+						"	SINGLE:	one sample per channel and test step (default)\n"
+						"	STREAM:	hardware timed stream per test step, averaged\n"
+						"-cal\n"
+						"	guided calibration of the analog inputs prior to the selftest (no shuttle in the tester, reference meter required)\n"
+						"-fs\n"
+						"	fixed settling times after switching relays instead of adaptive settling\n"
+						"-mem [depth]\n"
+						"	number of shuttles kept in the error history of the shuttle positions (default %i)\n"
+						"-rep [class] [count]\n"
+						"	repetition error if the error class (e.g. GS_SHORT, NOT_BONDED) occurs count times in succession at the same position\n"
+						"	count 0: the class isn't checked, default for all failed classes %i\n"
+						"-pl\n"
+						"	pipelined evaluation: classification, logging and statistics of a shuttle run in the background while the next shuttle arrives\n"
+						"-metrics [port]\n"
+						"	metrics of the tester (Prometheus text format) on http://localhost:port/metrics\n"
+						"-fps [rate]\n"
+						"	max. number of GUI updates per second (default 10)\n"
+						"-sim\n"
+						"	simulated Labjack modules, no drivers / hardware required\n"
+						"-headless\n"
+						"	no GUI (no display required), the test is exited with Ctrl+C\n"
+						% (MEMCYC, MEMCYC))
 
 	def debug_output(self, str_in):
 		#print debug strings in various functions if output-mode "DEBUG" is enabled, otherwise do noth'n
@@ -307,13 +496,13 @@ class InlineStateMachine:
 	#Open Labjack modules, initially two modules are assumed. Input: Module number, Output: handle ID
 	def OpenLabjack(self, module):
 		if module == 1:
-			self.handle1 = ljm.openS("T7", "USB", self.SN_LJM1)
-			info = ljm.getHandleInfo(self.handle1)
+			self.handle1 = self.hw.openS("T7", "USB", self.SN_LJM1)
+			info = self.hw.getHandleInfo(self.handle1)
 			self.debug_output("\nOpened LabJack Module 1 \n	Serial number: %i \n	value handle1 is: %i\n \n" % (info[2], self.handle1))
 			ret_val = self.handle1
 		elif module == 2:
-			self.handle2 = ljm.openS("T7", "USB", self.SN_LJM2)
-			info = ljm.getHandleInfo(self.handle2)
+			self.handle2 = self.hw.openS("T7", "USB", self.SN_LJM2)
+			info = self.hw.getHandleInfo(self.handle2)
 			ret_val = self.handle2
 			self.debug_output("\nOpened LabJack Module 2 \n	Serial number: %i \n	value handle2 is: %i\n \n" % (info[2], self.handle2))
 		else:
@@ -325,11 +514,11 @@ class InlineStateMachine:
 	def CloseLabjack(self, module):
 		if module == 1:
 			# Close handle1
-			error = ljm.close(self.handle1)
+			error = self.hw.close(self.handle1)
 			self.debug_output("Closed Labjack Module %i, errors: %s " % (module, error))
 		elif module == 2:
 			# Close handle1
-			error = ljm.close(self.handle2)
+			error = self.hw.close(self.handle2)
 			self.debug_output("Closed Labjack Module %i, errors: %s " % (module, error))
 		else:
 			self.debug_output("CloseLabjack: wrong argument, Labjack Module not available" % module)
@@ -337,6 +526,7 @@ class InlineStateMachine:
 		return error	
 
 
+	@timed("SetRelay")
 	def SetRelay(self, dioport, state):
 		"""Setting the dioport to state
 			in case of failure the TESTER_STATUS is set to ERROR
@@ -350,36 +540,10 @@ class InlineStateMachine:
 			but the calling function won't have to check for this return value, since also the TESTER_STATUS is changed
 		"""
 		func_name = "SetRelay"
-		ret_val = ljm.eWriteName(self.handle1, "DIO"+str(int(dioport)), state)
+		ret_val = self.hw.eWriteName(self.handle1, "DIO"+str(int(dioport)), state)
 		if dioport == Ports.SHUTTLE_VALVE:
-			shuttlevalvesetcounter = 0
-			SHUTTLE_TICK = 0.05		#period in sec
-			SHUTTLEMAXWAIT = 50		#period * ticks until TESTER_STATUS is set to ERROR
-
-			if state == position.UP:
-				target_pos = position.UP
-				target_sens = Ports.SHUTTLE_VALVE_UPPER_POS
-				oppos_pos = position.DOWN
-				oppos_sens = Ports.SHUTTLE_VALVE_LOWER_POS
-			elif state == position.DOWN:
-				target_pos = position.DOWN
-				target_sens = Ports.SHUTTLE_VALVE_LOWER_POS
-				oppos_pos = position.UP
-				oppos_sens =  Ports.SHUTTLE_VALVE_UPPER_POS
-			else:
-				self.debug_output("no such target position as %i", state)
-	
-			#Get Position and set timer
-			while self.GetRelay(target_sens) != states.CLEAR and shuttlevalvesetcounter <= SHUTTLEMAXWAIT:
-					time.sleep(SHUTTLE_TICK)
-					shuttlevalvesetcounter += 1
-					self.debug_output("Shuttle is moving, counter is %i" %shuttlevalvesetcounter)
-					#Only for manual mode, NOT automatic mode: Switches have to be pressed during driving up
-					if (state == position.UP) and (self.GetRelay(Ports.SHUTTLE_AVLBL) != states.CLEAR):
-						self.TESTER_STATUS = STATUS.ERROR
-						self.SetRelay(Ports.SHUTTLE_VALVE, position.DOWN)
-			#self.debug_output("waiting for shuttle to reach upper position, counter is %i" % shuttlevalvesetcounter)
-			if shuttlevalvesetcounter >= SHUTTLEMAXWAIT:
+			SHUTTLEMAXWAIT = 2.5	#time in sec until TESTER_STATUS is set to ERROR
+			if self.WaitShuttlePos(state, SHUTTLEMAXWAIT) < 0:
 				self.TESTER_STATUS = STATUS.ERROR
 				self.schedule(STATE.HALT) #inform scheduler, so he can query the TESTER_STATUS flag and update the TESTER_STATUS in the gui
 
@@ -393,12 +557,53 @@ class InlineStateMachine:
 			self.debug_output("Error %s: %s could not be set to %s" % (func_name, repr(dioport), repr(state)))
 		return ret_val
 	
+	def WaitShuttlePos(self, state, maxwait):
+		"""Wait until the shuttle valve has reached the end position state (position.UP / position.DOWN)
+			all digital inputs are read at once via DIO_STATE (one USB round trip per poll) in a tight loop,
+			the function returns as soon as the end-position sensor of the target position flips
+			while moving up SHUTTLE_AVLBL is checked within the same read
+			
+			returns the measured travel time of the shuttle valve in sec (also in self.TIME_SHUTTLETRAVEL)
+			or -1 if the end position wasn't reached within maxwait sec or the shuttle left while moving up
+		"""
+		func_name = "WaitShuttlePos"
+		if state == position.UP:
+			target_sens = Ports.SHUTTLE_VALVE_UPPER_POS
+		elif state == position.DOWN:
+			target_sens = Ports.SHUTTLE_VALVE_LOWER_POS
+		else:
+			self.debug_output("%s: no such target position as %i" % (func_name, state))
+			return -1
+
+		tstart = time.perf_counter()
+		travel = float(0)
+		while 1 == 1:
+			diostate = int(self.hw.eReadAddresses(self.handle1, 1, self.DIO_STATE_ADDR, self.DIO_STATE_TYPE)[0])
+			travel = time.perf_counter() - tstart
+			#sensors are low active: the end position is reached if the sensor bit is cleared
+			if (diostate >> target_sens) & 1 == states.CLEAR:
+				break
+			#Only for manual mode, NOT automatic mode: Switches have to be pressed during driving up
+			if state == position.UP and (diostate >> Ports.SHUTTLE_AVLBL) & 1 != states.CLEAR:
+				self.debug_output("%s: shuttle is not available while moving up" % func_name)
+				self.TESTER_STATUS = STATUS.ERROR
+				self.SetRelay(Ports.SHUTTLE_VALVE, position.DOWN)
+				return -1
+			if travel > maxwait:
+				self.debug_output("%s: %s not reached within %2.2f sec" % (func_name, repr(target_sens), maxwait))
+				return -1
+			time.sleep(self.SHUTTLE_POLL)
+		self.TIME_SHUTTLETRAVEL = travel
+		self.debug_output("%s: shuttle valve reached %s after %2.3f sec" % (func_name, repr(state), travel))
+		return travel
+
+	@timed("GetRelay")
 	def GetRelay(self, dioport):
 		"""Getting the state of dioport
 		the other descriptions apply from the function SetRelay
 		"""
 		func_name = "GetRelay"
-		ret_val = ljm.eReadName(self.handle1, "DIO"+str(int(dioport)))
+		ret_val = self.hw.eReadName(self.handle1, "DIO"+str(int(dioport)))
 		if ret_val == 0 or ret_val == 1:
 			self.debug_output("%s: %s is %s" % (func_name, repr(dioport), repr(ret_val)))
 		else:
@@ -408,28 +613,57 @@ class InlineStateMachine:
 		return ret_val	
 	
 	
+	#Acquire Gate-, Phase- and Source-Voltages of all DUTs with one batched transaction per Labjack module
+	#overview of analog channel assignment: C:\Python34\Analog_Channel_Assignment.txt
+	#Publish the new voltages to the GUI
+	@timed("GetVAll")
+	def GetVAll(self, modules = None):
+		"""
+		replaces the sequence GetVGate(), GetVPhase(), GetVSource() in the test steps:
+		instead of one eReadName per channel (27 USB round trips) all AINs of a module are read with a single eReadAddresses
+		both modules are read at the same time by the acquisition engine self.acq (one worker per handle)
+		the timestamps of the modules are stored in TIME_ACQ_LJM1 / TIME_ACQ_LJM2
+		the vectors are updated in place, so that references to VGateDUT / VPhaseDUT / VSourceDUT (e.g. in the qObj) remain valid
+		modules: indices (0: module 1, 1: module 2) of the modules which are read, default both modules
+		returns the three voltage vectors VGateDUT, VPhaseDUT, VSourceDUT
+		"""
+		if modules is None:
+			modules = (0, 1)
+		(ain1, ain2), (self.TIME_ACQ_LJM1, self.TIME_ACQ_LJM2) = self.acq.acquire(None, modules)
+		if self.ACQ_MODE == ACQ.STREAM and self.OUTPUT_MODE == MODE.DEBUG:
+			for m in modules:
+				self.debug_output("GetVAll: max noise module %i: %2.4f V" % (m+1, max(self.acq.noise[m])))
+		if 0 in modules:
+			self.VGateDUT[0:NDUT] = ain1[0:9]		#Module1 AIN0..8
+			self.VPhaseDUT[0:5] = ain1[9:14]		#Module1 AIN9..13
+		if 1 in modules:
+			self.VPhaseDUT[5:NDUT] = ain2[0:4]		#Module2 AIN0..3
+			self.VSourceDUT[0:NDUT] = ain2[4:13]	#Module2 AIN4..12
+
+		#Publish newly acquired voltages to the GUI
+		self.qObj[QGUI.Gate] = self.VGateDUT
+		self.qObj[QGUI.Phase] = self.VPhaseDUT
+		self.qObj[QGUI.Source] = self.VSourceDUT
+		self.snapshots.publish(self.qObj)
+		return self.VGateDUT, self.VPhaseDUT, self.VSourceDUT
+
 	#Acquire Gate-Voltages of all DUTs,  overview of analog channel assignment: C:\Python34\Analog_Channel_Assignment.txt
-	#Write the new voltages to the GUIQueue
+	#Publish the new voltages to the GUI
+	@timed("GetVGate")
 	def GetVGate(self):
-		for i in range(0, NDUT):
-			self.VGateDUT[i] = ljm.eReadName(self.handle1, "AIN"+str(i))
-			#self.debug_output("GetVGate: VGate%i is %f V" % (i+1, self.VGateDUT[i]))
-		#Write newly acquired voltages to the queue
+		self.VGateDUT[0:NDUT] = self.CalValues(0, 0, self.hw.eReadAddresses(self.handle1, NDUT, self.AIN_ADDR_LJM1[0:9], self.AIN_TYPES_LJM1[0:9]))
+		#Publish newly acquired voltages to the GUI
 		self.qObj[QGUI.Gate] = self.VGateDUT
-		if self.guiqueue.qsize() < self.QMAXSIZE:
-			self.guiqueue.put(self.qObj)
+		self.snapshots.publish(self.qObj)
 
 	#Acquire Phase-Voltages of all DUTs,  overview of analog channel assignment: C:\Python34\Analog_Channel_Assignment.txt
-	#Write the new voltages to the GUIQueue
+	#Publish the new voltages to the GUI
+	@timed("GetVPhase")
 	def GetVPhase(self):
 		#VPhase in first Labjack Module
-		for i in range(0, 5):
-			self.VPhaseDUT[i] = ljm.eReadName(self.handle1, "AIN"+str(i+9))
-			#self.debug_output("GetVPhase: VPhase%i ( AIN%i of module %i) is %f V" % (i+1, i+9, 1, self.VPhaseDUT[i]))
+		self.VPhaseDUT[0:5] = self.CalValues(0, 9, self.hw.eReadAddresses(self.handle1, 5, self.AIN_ADDR_LJM1[9:14], self.AIN_TYPES_LJM1[9:14]))
 		#VPhase in second Labjack Module
-		for i in range(0, 4):
-			self.VPhaseDUT[i+5] = ljm.eReadName(self.handle2, "AIN"+str(i))
-			self.debug_output("GetVPhase: VPhase%i ( AIN%i of module %i) is %f V" % (i+6, i, 2, self.VPhaseDUT[i+5]))
+		self.VPhaseDUT[5:NDUT] = self.CalValues(1, 0, self.hw.eReadAddresses(self.handle2, 4, self.AIN_ADDR_LJM2[0:4], self.AIN_TYPES_LJM2[0:4]))
 		"""#Channel Assignment for VPhase:
 		
 			#Module1
@@ -444,68 +678,403 @@ class InlineStateMachine:
 			#AIN[2] 	=	'AIN_PHASEMO8'
 			#AIN[3]		=	'AIN_PHASEMO9'
 			"""
-		#Write newly acquired voltages to the queue
+		#Publish newly acquired voltages to the GUI
 		self.qObj[QGUI.Phase] = self.VPhaseDUT
-		if self.guiqueue.qsize() < self.QMAXSIZE:
-			self.guiqueue.put(self.qObj)
+		self.snapshots.publish(self.qObj)
 
 
  	#Acquire Analog channels of a Labjack Module
-	#Write the new voltages to the GUIQueue
+	#Publish the new voltages to the GUI
+	@timed("GetVSource")
 	def GetVSource(self):
-		for i in range(0, NDUT):
-			self.VSourceDUT[i] = ljm.eReadName(self.handle2, "AIN"+str(i+4))
-			#self.debug_output("GetVPhase: VSource%i ( AIN%i of module %i) is %f V" % (i+1, i+4, 2, self.VSourceDUT[i]))
+		self.VSourceDUT[0:NDUT] = self.CalValues(1, 4, self.hw.eReadAddresses(self.handle2, NDUT, self.AIN_ADDR_LJM2[4:13], self.AIN_TYPES_LJM2[4:13]))
 
-		#Write newly acquired voltages to the queue
+		#Publish newly acquired voltages to the GUI
 		self.qObj[QGUI.Source] = self.VSourceDUT
-		if self.guiqueue.qsize() < self.QMAXSIZE:
-			self.guiqueue.put(self.qObj)
+		self.snapshots.publish(self.qObj)
 	
 
-	def evaluate(self, showstr, listin, lowLimit, erronlow, upLimit, erronhigh, queueindex):
+	def CalValues(self, module, first, values):
+		#calibration of values read without the acquisition engine (service functions), first: AIN of values[0]
+		if self.acq is None:
+			return values
+		return apply_calibration(values, self.acq.cal[module], first)
+
+	def LoadCalibration(self):
 		"""
-		the string with drawing text, prior to this the test step in self.TESTSTEP is shown
-		evaluate gets as input the listin which is to be evaluated, 
-		the lower / upper limits for the comparison, 
-		the errornumbers in case the lower, upper limits are violated
-		the index of the queue object which is to be put on the queue
+		load the calibration tables of both modules from CAL_FILE and hand them over to the acquisition engine
+		a defective calibration file sets the TESTER_STATUS to STATUS.ERROR
 		"""
-		for i in range(0, len(listin)):
-			if listin[i] < lowLimit:
-				if erronlow != ERR.TESTER_FAULT:
-					self.DUTSTATUSTMP[i] = erronlow 	#write result to DUTSTATUSTMP unless the error is significant and TESTER_STATUS is affected
-				elif erronlow == ERR.TESTER_FAULT:
-					self.TESTER_STATUS = STATUS.ERROR
-					self.debug_output("TESTER_STATUS was set to STATUS.ERROR")
-				else:
-					self.TESTER_STATUS = STATUS.ERROR
-			elif  listin[i] > upLimit:
-				if erronlow != ERR.TESTER_FAULT:
-					self.DUTSTATUSTMP[i] = erronhigh 	#write result to DUTSTATUS unless the error is significant and TESTER_STATUS is affected
-				elif erronlow == ERR.TESTER_FAULT:
-					self.TESTER_STATUS = STATUS.ERROR
-					self.debug_output("TESTER_STATUS was set to STATUS.ERROR")
-				else:
-					self.TESTER_STATUS = STATUS.ERROR
-			else:
-				#DUT is passed
-				#write result to DUTSTATUSTMP
-				self.DUTSTATUSTMP[i] = ERR.PASSED
-			
+		try:
+			tables, self.CalRevisions = load_calibration([self.SN_LJM1, self.SN_LJM2], [len(self.AIN_NAMES_LJM1), len(self.AIN_NAMES_LJM2)], self.CAL_FILE)
+		except (OSError, ValueError, KeyError, TypeError) as e:
+			print("Kalibrierdatei %s fehlerhaft: %s" % (self.CAL_FILE, e))
+			self.TESTER_STATUS = STATUS.ERROR
+			return
+		self.acq.set_calibration(tables)
+		self.LoggingFile.write("Calibration %s: module 1 revision %i, module 2 revision %i\n" % (self.CAL_FILE, self.CalRevisions[0], self.CalRevisions[1]))
+		self.debug_output("LoadCalibration: module 1 revision %i, module 2 revision %i" % (self.CalRevisions[0], self.CalRevisions[1]))
 
-			self.debug_output("%s Mo%i: %2.3f V [%2.3f V ... %2.3f V] ErrCode: %i" % (self.TESTSTEP + showstr, i+1, listin[i], lowLimit, upLimit, self.DUTSTATUSTMP[i]))
-			#put statistics to LoggingFile if verbose mode is enabled (self.OUTPUT_MODE = MODE.DEBUG)
-			if self.OUTPUT_MODE == MODE.DEBUG:
-				self.LoggingFile.write("%s Mo%i: %2.3f V [%2.3f V ... %2.3f V] ErrCode: %i\n" % (self.TESTSTEP + showstr, i+1, listin[i], lowLimit, upLimit, self.DUTSTATUSTMP[i]))
+	def calibrate(self):
+		"""
+		guided calibration of the analog inputs, executed in STATE.INIT prior to the selftest, there must be no shuttle in the tester
+		reference points:
+			1. VGate OFF, VPhase OFF: all AINs are 0 V
+			2. VGate ON: the gate voltage is measured with the reference meter, reference of AIN_GATEMOx = voltage / DIV_GATE
+			3. VPhase ON (reversed): the phase voltage is measured with the reference meter, reference of AIN_PHASEMOx = voltage / DIV_PHASE
+			all other AINs are 0 V in points 2. and 3.
+		each point is acquired without calibration in STREAM mode (mean of STREAM_SCANS scans)
+		gain and offset of each AIN are fitted by least squares (InlineCal.fit_channel),
+		the source channels only get a new offset, their gain is kept (no reference current without DUT)
+		the new tables are only saved after confirmation by the user
+		"""
+		nchannels = [len(self.AIN_NAMES_LJM1), len(self.AIN_NAMES_LJM2)]
+		try:
+			tables = load_calibration([self.SN_LJM1, self.SN_LJM2], nchannels, self.CAL_FILE)[0]
+		except (OSError, ValueError, KeyError, TypeError) as e:
+			#the new tables start without correction (gain of the source channels 1.0)
+			print("Warnung: Kalibrierdatei %s fehlerhaft, Kalibrierung ohne vorherige Tabellen: %s" % (self.CAL_FILE, e))
+			tables = [identity(n) for n in nchannels]
+		self.acq.set_calibration(None)
+		points = [[[] for c in range(0, len(self.AIN_DIV[m]))] for m in range(0, self.NLJM)]
+		refpoints = [	("VGate OFF, VPhase OFF", [(Ports.DOUT_VGATE_ON, states.CLEAR), (Ports.DOUT_VPHASE_ON, states.CLEAR)], None),
+						("VGate ON", [(Ports.DOUT_VGATE_ON, states.SET)], QGUI.Gate),
+						("VPhase ON", [(Ports.DOUT_VGATE_ON, states.CLEAR), (Ports.DOUT_VPHASE_ON, states.SET)], QGUI.Phase)]
+		for name, relays, group in refpoints:
+			print("Kalibrierung: %s" % name)
+			for port, state in relays:
+				self.SetRelay(port, state)
+			time.sleep(0.5) #Settling Time after switching relais
+			voltage = 0.0
+			while group is not None:
+				try:
+					voltage = float(input("Spannung am Referenz-Messgeraet in V (mit Vorzeichen) eingeben:\n"))
+					break
+				except ValueError:
+					print("ungueltige Eingabe")
+			results = self.acq.acquire(ACQ.STREAM)[0]
+			for m in range(0, self.NLJM):
+				for c in range(0, len(self.AIN_DIV[m])):
+					ref = voltage / self.AIN_DIV[m][c] if self.AIN_GROUP[m][c] == group else 0.0
+					points[m][c].append((results[m][c], ref))
+		self.SetRelay(Ports.DOUT_VPHASE_ON, states.CLEAR)	#VPhase OFF
+
+		for m in range(0, self.NLJM):
+			gain, offset = tables[m]
+			for c in range(0, len(self.AIN_DIV[m])):
+				gain[c], offset[c] = fit_channel(points[m][c], gain[c])
+				print("Mo%i AIN%i: gain %1.5f offset %+1.5f V" % (m+1, c, gain[c], offset[c]))
+		if input("Kalibrierung speichern? (Y/N)\n") == "Y":
+			try:
+				self.CalRevisions = save_calibration([self.SN_LJM1, self.SN_LJM2], tables, self.USERNAME, self.CAL_FILE)
+			except (OSError, ValueError, KeyError) as e:
+				print("Kalibrierung nicht gespeichert: %s" % e)
+				return
+			self.LoggingFile.write("Calibration saved by %s: module 1 revision %i, module 2 revision %i\n" % (self.USERNAME, self.CalRevisions[0], self.CalRevisions[1]))
+			print("Kalibrierung gespeichert")
+
+	def DumpTiming(self):
+		#latency table of all operations to the console and to L:\YYYY-MM-DD_Timing.ascii
+		table = TIMING.dump()
+		print(table)
+		self.logwriter.open(self.LOG_PATH + str(date.today()) + "_Timing.ascii", 'w').write(table)
+
+	def ShuttleLog(self):
+		#text log of all shuttles of a day, kept open and appended instead of one file per shuttle
+		if self.ShuttleLogDay != date.today():
+			if self.ShuttleLogFile is not None:
+				self.ShuttleLogFile.close()
+			self.ShuttleLogDay = date.today()
+			self.ShuttleLogFile = self.logwriter.open(self.LOG_PATH + str(self.ShuttleLogDay) + "_Shuttles.ascii", 'a')
+		return self.ShuttleLogFile
+
+	@timed("Settle")
+	def Settle(self, maxtime):
+		"""
+		Wait after switching relays until the analog inputs are settled
+		maxtime is the fixed settling time which was used before, it is the upper bound of the wait time
+		in adaptive mode all channels are polled with batched reads, the wait ends as soon as every channel is inside SETTLE_BAND
+		the measured settle time of each test step is written to the LoggingFile
+		"""
+		if self.ADAPTIVE_SETTLING == states.SET:
+			settletime, settled = self.acq.settle(maxtime, self.SETTLE_BAND, self.SETTLE_POLL, self.SETTLE_NPOLL, self.SETTLE_MIN)
+		else:
+			time.sleep(maxtime)
+			settletime, settled = maxtime, True
+		self.SettleTimeShuttle += settletime
+		self.SettleMaxShuttle += maxtime
+		if settled:
+			self.LoggingFile.write("%s settle time: %2.3f sec (max %2.3f sec)\n" % (self.TESTSTEP, settletime, maxtime))
+		else:
+			self.LoggingFile.write("%s settle time: %2.3f sec (max %2.3f sec), inputs not settled\n" % (self.TESTSTEP, settletime, maxtime))
+		self.debug_output("Settle: %s %2.3f sec (max %2.3f sec), settled: %s" % (self.TESTSTEP, settletime, maxtime, settled))
+		return settletime
+
+	@timed("RunTestPlan")
+	def RunTestPlan(self):
+		"""
+		Execute the compiled test plan self.TestSchedule (see InlineTestPlan.compile_testplan)
+		the error codes of the evaluations with a store name are copied to self.StepErrors[store] for STATE.EVALUATE
+		the time of each test step is written to the LoggingFile and kept in self.StepTimes
+		"""
+		self.StepTimes = []
+		StepIndex = 0
+		EvalIndex = 0
+		vectors = {QGUI.Gate: self.VGateDUT, QGUI.Phase: self.VPhaseDUT, QGUI.Source: self.VSourceDUT}
+		for op in self.TestSchedule:
+			if op[0] == OP.STEP:
+				StepIndex += 1			#Number of Test Steps, for Protokoll
+				self.TESTSTEP = "TS" + str(StepIndex) + " - " + op[1] + ": "
+				StepName = "TS" + str(StepIndex) + " " + op[1]
+				tstep = time.perf_counter()
+			elif op[0] == OP.RELAY:
+				self.SetRelay(op[1], op[2])
+			elif op[0] == OP.WAIT:
+				time.sleep(op[1])
+			elif op[0] == OP.SETTLE:
+				self.Settle(op[1])
+			elif op[0] == OP.MEASURE:
+				self.GetVAll(op[1])
+			elif op[0] == OP.EVAL:
+				groups, low, erronlow, high, erronhigh, stores = op[1:7]
+				codes = self.evaluate_matrix(groups, low, erronlow, high, erronhigh)
+				#the error codes are copied index wise, the lists in StepErrors remain the same objects during the test
+				for k in range(0, len(groups)):
+					if stores[k] is not None:
+						self.StepErrors[stores[k]][0:NDUT] = codes[k]
+					#keep the raw voltages of the step for the results file and the database (independent of OUTPUT_MODE)
+					base = (EvalIndex * len(self.RAW_GROUP) + self.RAW_GROUP[groups[k]]) * NDUT
+					self.RawShuttle[base:base + NDUT] = array("f", vectors[groups[k]])
+				EvalIndex += 1
+			elif op[0] == OP.END:
+				steptime = time.perf_counter() - tstep
+				self.StepTimes.append((self.TESTSTEP, steptime))
+				TIMING.record(StepName, steptime)
+				self.LoggingFile.write("%s step time: %2.3f sec\n" % (self.TESTSTEP, steptime))
+				self.debug_output("RunTestPlan: %s step time: %2.3f sec" % (self.TESTSTEP, steptime))
+
+	def ShuttleJob(self):
+		"""
+		data of the tested shuttle for the evaluation (see EvaluateShuttle), taken at the end of STATE.TESTING
+		the job doesn't share data with the next shuttle: StepErrors is a new dict for each shuttle, the raw voltages are copied
+		the log lines of the evaluation are buffered in "text" and written to the shuttle log "log" by the state machine (see ApplyEvaluation)
+		"""
+		return {"errors": self.StepErrors, "raw": array("f", self.RawShuttle), "start": self.TIME_RUNSTART, "stop": self.TIME_RUNSTOP,
+				"lot": self.LOTCODE, "serial": self.SERIAL, "status": self.TESTER_STATUS, "log": self.LoggingFile, "text": io.StringIO()}
+
+	@timed("EvaluateShuttle")
+	def EvaluateShuttle(self, job):
+		"""
+		STATE.EVALUATE of a shuttle: classification of the DUTs, logging, results file / database, repetition check and SPC
+		runs in the state machine or, in pipelined mode, on the evaluation worker: the fields shared with the GUI and the state machine
+		(DUTSTATUS, counters, TESTER_STATUS, qObj) aren't changed here, the returned result is applied by the state machine (see ApplyEvaluation)
+		returns {"status": error code per DUT, "shuttle": shuttle number, "repeated": positions with repetition error,
+				"recent": error codes of the last shuttles for the GUI, "spc": SPC summary, "log", "text", "error": None}
+		"""
+		status = classify(job["errors"], NDUT)
+		LoggingFile = job["text"]		#the shuttle log is shared with the next shuttle, it is only written by the state machine
+		for i in range(0,NDUT): 	#sample the test results of each step and each DUT
+			LoggingFile.write('Auftragsnummer: %s\n' % (job["lot"]))
+			LoggingFile.write('Ausgewählte SN: %s\n' % (job["serial"]))
 			
+			LoggingFile.write("DUT Error Code Module%i: %i\n" % (i+1, status[i]))
+
+		#write Testtime to LoggingFile
+		testtime = job["stop"] - job["start"]
+		LoggingFile.write("Total test time: %2.2f sec\n" % testtime)
+		#append the shuttle to the results file of the day
+		shuttleno = self.Results.append(job["start"], job["lot"], job["serial"], testtime, job["status"], job["raw"], status)
+		resultsfile = self.LOG_PATH + os.path.basename(self.Results.filename)
+		self.logwriter.mirror(self.Results.filename, resultsfile)
+		LoggingFile.write("Results: %s shuttle %i\n" % (resultsfile, shuttleno))
+		self.db.add(job["start"], shuttleno, job["lot"], job["serial"], testtime, job["status"], status, job["raw"])
+		dberror = self.db.take_error()
+		if dberror is not None:
+			#the shuttles are kept by the database writer and written with the next batch
+			LoggingFile.write("Database error: %s, %i shuttles not written yet, %i dropped\n" % (repr(dberror), self.db.unwritten, self.db.dropped))
+			if self.aggregator is not None:
+				self.aggregator.put(("alarm", self.STATION_ID, "Database error: %s" % repr(dberror)))
+		if self.aggregator is not None:
+			self.aggregator.put(("shuttle", self.STATION_ID, {"timestamp": job["start"], "shuttle": shuttleno, "lot": job["lot"], "serial": job["serial"],
+								"testtime": testtime, "status": int(job["status"]), "dutstatus": [int(e) for e in status]}))
+		logerror = self.logwriter.take_error()
+		if logerror is not None:
+			#lost log data (spool or queue), the log writer keeps running
+			LoggingFile.write("Log error: %s\n" % logerror)
+			if self.aggregator is not None:
+				self.aggregator.put(("alarm", self.STATION_ID, "Log error: %s" % logerror))
+		if self.OUTPUT_MODE == MODE.DEBUG:
+			self.debug_output("LogWriter: %s" % repr(self.logwriter.stats()))
+
+		#Check if an error occured repeatedly at the same position (default MEMCYC = 3 times in succession, see InlineHistory)
+		#the repetition error includes only test fails (not NORES and not PASSED), the TESTER_STATUS is set in ApplyEvaluation
+		repeated = self.history.add(status)
+		for i in repeated:
+			#root cause might be a the Needle adapter (needle fault, cable connection, power supply, etc.)
+			LoggingFile.write("Repetition Error: Position %i, %s %i times in succession\n" % (i+1, status[i].name, self.history.run[i]))
+			if self.aggregator is not None:
+				self.aggregator.put(("alarm", self.STATION_ID, "Repetition Error: Position %i, %s" % (i+1, status[i].name)))
+
+		#SPC: new alarms are written to the log, the active alarms are shown in the GUI
+		for alarm in self.spc.update(status):
+			LoggingFile.write("SPC alarm: %s\n" % self.spc.describe(alarm))
+			self.debug_output("SPC alarm: %s" % self.spc.describe(alarm))
+			if self.aggregator is not None:
+				self.aggregator.put(("alarm", self.STATION_ID, "SPC alarm: %s" % self.spc.describe(alarm)))
+
+		for i in range(0,NDUT):
+			self.debug_output("STATE.EVALUATE: GateErrorT4 Mo %i is %s" % (i+1, repr(job["errors"]["GateErrorT4"][i])))
+		return {"status": status, "shuttle": shuttleno, "repeated": repeated, "recent": self.history.recent(self.HISTORY_VIEW),
+				"spc": self.spc.summary(), "log": job["log"], "text": job["text"], "error": None}
+
+	def RunEvaluation(self, job):
+		#EvaluateShuttle, an exception is returned as result (the state machine halts the tester, see ApplyEvaluation)
+		try:
+			return self.EvaluateShuttle(job)
+		except Exception as e:
+			return {"error": repr(e), "log": job["log"], "text": job["text"]}
+
+	def ApplyEvaluation(self, result):
+		"""
+		result of EvaluateShuttle: DUTSTATUS, counters, TESTER_STATUS and GUI update
+		only called by the state machine thread, so that the shared fields are changed by one thread
+		"""
+		#log lines of the evaluation in one block (in pipelined mode the lines of the next shuttle's test might be written before)
+		LoggingFile = result["log"]
+		LoggingFile.write(result["text"].getvalue())
+		if result["error"] is not None:
+			#a shuttle which can't be evaluated stops the test like a repetition error
+			print("EvaluateShuttle: shuttle %i not evaluated: %s" % (self.ShuttleNo + 1, result["error"]))
+			LoggingFile.write("Evaluation error: %s\n" % result["error"])
+			LoggingFile.flush()
+			self.TESTER_STATUS = STATUS.ERROR
+			return
+		status = result["status"]
+		self.ShuttleNo = result["shuttle"]
+		for i in range(0,NDUT):
+			self.DUTSTATUS[i] = status[i]
+			self.TotalDUTsTested += 1		#Bonded and unbonded DUTs
+			if status[i] == ERR.PASSED:
+				self.TotalDUTsPassed += 1
+			elif status[i] == ERR.GS_SHORT:
+				self.TotalDUTsFailed += 1
+				self.TotalDUTsGSShort += 1
+			elif status[i] == ERR.NOT_BONDED:
+				self.TotalDUTsNotBonded += 1
+				#dont increase TotalDUTsFailed counter: the number of unbonded parts can be calculated by: total - passed - failed
+			elif status[i] == ERR.DS_SHORT:
+				self.TotalDUTsFailed += 1
+				self.TotalDUTsDSShort += 1
+			else:
+				self.TotalDUTsFailed += 1
+
+		#put statistics to LoggingFile if verbose mode is enabled (self.OUTPUT_MODE = MODE.DEBUG)
+		if self.OUTPUT_MODE == MODE.DEBUG:
+			LoggingFile.write("\n")
+			LoggingFile.write("Statistics:\n")
+			LoggingFile.write("Total DUTs Passed %i\n" % self.TotalDUTsPassed)
+			LoggingFile.write("Total DUTs Failed %i\n" % self.TotalDUTsFailed)
+			LoggingFile.write("Total DUTs with GS-Short %i\n" % self.TotalDUTsGSShort)
+			LoggingFile.write("Total DUTs with DS-Short %i\n" % self.TotalDUTsDSShort)
+			LoggingFile.write("Total DUTs not bonded %i\n" % self.TotalDUTsNotBonded)
+		LoggingFile.flush()		#the logging file is kept open for the next shuttle
+
+		for i in result["repeated"]:
+			#Tester-Status is set to Error at the first occurrance of a repetition error 
+			self.TESTER_STATUS = STATUS.ERROR
+			self.debug_output("Repetition Error: Position %i is %s" % (i+1, repr(self.TESTER_STATUS)))
+
+		#publish result to the GUI
+		self.HistoryView = result["recent"]
+		self.qObj[QGUI.Dutstatus] = self.DUTSTATUS	#Index with the errorcodes
+		self.qObj[QGUI.Ntot] = self.TotalDUTsTested
+		self.qObj[QGUI.Npass] = self.TotalDUTsPassed
+		self.qObj[QGUI.Nfail] = self.TotalDUTsFailed
+		self.qObj[QGUI.Ngs_short] = self.TotalDUTsGSShort
+		self.qObj[QGUI.Nnot_bonded] = self.TotalDUTsNotBonded
+		self.qObj[QGUI.Nds_short] = self.TotalDUTsDSShort
+		self.qObj[QGUI.Spc] = result["spc"]
+		
+		self.snapshots.publish(self.qObj)
+
+	def EvaluationWorker(self):
+		#evaluation worker of the pipelined mode, the jobs are evaluated in the order of the shuttles, None stops the worker
+		while 1 == 1:
+			job = self.evalqueue.get()
+			try:
+				if job is None:
+					break
+				self.evalresults.put(self.RunEvaluation(job))
+			finally:
+				self.evalqueue.task_done()
+
+	def ApplyEvaluations(self):
+		#results of the evaluation worker which are already finished (pipelined mode), called by the state machine only
+		while 1 == 1:
+			try:
+				result = self.evalresults.get_nowait()
+			except queue.Empty:
+				return
+			self.ApplyEvaluation(result)
+
+	@timed("WaitEvaluation")
+	def WaitEvaluation(self):
+		"""
+		waits until the evaluation worker has finished all tested shuttles (pipelined mode) and applies their results
+		returns False if the evaluation set the TESTER_STATUS to ERROR (e.g. repetition error), the next shuttle must not be tested
+		"""
+		if self.evalworker is not None:
+			self.evalqueue.join()
+			self.ApplyEvaluations()
+		return self.TESTER_STATUS != STATUS.ERROR
+
+	@timed("Evaluate")
+	def evaluate_matrix(self, groups, low, erronlow, high, erronhigh):
+		"""
+		evaluate the channel groups (QGUI.Gate / QGUI.Phase / QGUI.Source) of a test step with one call (see InlineEval.evaluate_step)
+		low / high are per-channel limit arrays, erronlow / erronhigh the error codes per group
+		the TESTER_STATUS is set to ERROR if a limit with the error code ERR.TESTER_FAULT is violated
+		DUTSTATUSTMP gets the error codes of the last group
+		returns the error codes, one list per group
+		"""
+		vectors = {QGUI.Gate: self.VGateDUT, QGUI.Phase: self.VPhaseDUT, QGUI.Source: self.VSourceDUT}
+		matrix = [vectors[g] for g in groups]
+		codes, fault = evaluate_step(matrix, low, erronlow, high, erronhigh)
+		if any([any(row) for row in fault]):
+			self.TESTER_STATUS = STATUS.ERROR
+			self.debug_output("TESTER_STATUS was set to STATUS.ERROR")
+		self.DUTSTATUSTMP[0:len(codes[-1])] = codes[-1]
+
+		#the strings are only built if verbose mode is enabled (self.OUTPUT_MODE = MODE.DEBUG)
+		if self.OUTPUT_MODE == MODE.DEBUG:
+			names = {QGUI.Gate: "VGate", QGUI.Phase: "VPhase", QGUI.Source: "VSource"}
+			for k in range(0, len(groups)):
+				for i in range(0, len(matrix[k])):
+					line = "%s Mo%i: %2.3f V [%2.3f V ... %2.3f V] ErrCode: %i" % (self.TESTSTEP + names[groups[k]], i+1, matrix[k][i], low[k][i], high[k][i], codes[k][i])
+					print(line)
+					#put statistics to LoggingFile
+					self.LoggingFile.write(line + "\n")
+
 		#Update Status Colours in GUI for each test step only in Service Mode
-		if self.PROG_MODE == MODE.SERVICE:		
-			self.qObj[queueindex] = listin	#Voltage values
+		if self.PROG_MODE == MODE.SERVICE:
+			for k in range(0, len(groups)):
+				self.qObj[groups[k]] = matrix[k]	#Voltage values
 			self.qObj[QGUI.Dutstatus] = self.DUTSTATUSTMP	#Index with the errorcodes
 		
-			if self.guiqueue.qsize() < self.QMAXSIZE:
-				self.guiqueue.put(self.qObj)
+			self.snapshots.publish(self.qObj)
+		return codes
+
+	def evaluate(self, showstr, listin, lowLimit, erronlow, upLimit, erronhigh, queueindex):
+		"""
+		the string with drawing text, prior to this the test step in self.TESTSTEP is shown
+		evaluate gets as input the listin which is to be evaluated, 
+		the lower / upper limits for the comparison, 
+		the errornumbers in case the lower, upper limits are violated
+		the index of the qObj field which is published to the GUI
+		evaluates a single channel group (e.g. in the selftest), listin has to be one of VGateDUT / VPhaseDUT / VSourceDUT
+		"""
+		groups, low, elow, high, ehigh, stores = limit_arrays([(queueindex, lowLimit, erronlow, upLimit, erronhigh, None)], len(listin))
+		self.evaluate_matrix(groups, low, elow, high, ehigh)
 		 
 	#button function for the GUI
 	#has to be without input parameters, therefore SetRelay is out of scope	
@@ -602,28 +1171,28 @@ class InlineStateMachine:
 			
 			
 
-	def periodicCall(self):
-		"""
-		Check if there is something new in the queue.
-		"""
-		self.gui.processIncoming()
-		if not self.UserStart:
-			#even if the self.UserStart flag is cleared
-			#the GUI will be forced to update the data
-			#but the statemachine won't write data to queue in case UserStart is cleared
-			#this enables to start / stop the testing process without having to terminate the process completely
-			#time.sleep(0.5)
-			self.master.after(502, self.periodicCall)
-			#sys.exit(1)
-		else:
-			self.master.after(502, self.periodicCall)
-			
 	def schedule(self, nextState):
+		#pipelined mode: the finished evaluations are applied before the TESTER_STATUS is checked (repetition error -> STATE.HALT)
+		if self.evalworker is not None:
+			self.ApplyEvaluations()
+		#dwell time of the state which has just been executed ("State IDLE", etc., see InlineTiming)
+		now = time.perf_counter()
+		if self.TimeSchedule is not None:
+			TIMING.record("State " + self.Next_State.name, now - self.TimeSchedule)
+		self.TimeSchedule = now
+		if self.DumpRequest.is_set():
+			self.DumpRequest.clear()
+			self.DumpTiming()
 		self.qObj[QGUI.TesterState] = self.TESTER_STATUS
 		self.qObj[QGUI.State] = self.Next_State
 		self.qObj[QGUI.Mode] = self.PROG_MODE
-		if self.guiqueue.qsize() < self.QMAXSIZE:
-			self.guiqueue.put(self.qObj)
+		self.snapshots.publish(self.qObj)
+		#supervisor: the state machine is alive, state changes are sent to the aggregator
+		if self.heartbeat is not None:
+			self.heartbeat.value = time.time()
+		if self.aggregator is not None and self.StationState != self.Next_State:
+			self.StationState = self.Next_State
+			self.aggregator.put(("state", self.STATION_ID, (self.Next_State.name, self.TESTER_STATUS.name)))
 		"""
 			Update the states and check status flags
 		"""
@@ -659,9 +1228,7 @@ class InlineStateMachine:
 		self.SetRelay(Ports.DOUT_VGATE_ON, states.CLEAR)	#VGate OFF
 		self.SetRelay(Ports.DOUT_VPHASE_ON, states.CLEAR)	#VPhase OFF
 		time.sleep(0.5) #Settling Time after switching relais
-		self.GetVGate()
-		self.GetVPhase()
-		self.GetVSource()
+		self.GetVAll()
 
 		self.evaluate("VGate", self.VGateDUT, -0.03, ERR.TESTER_FAULT, 0.03, ERR.TESTER_FAULT, QGUI.Gate)
 		self.evaluate("VPhase", self.VPhaseDUT, -0.03, ERR.TESTER_FAULT, 0.03, ERR.TESTER_FAULT, QGUI.Phase)
@@ -672,9 +1239,7 @@ class InlineStateMachine:
 		self.debug_output("selftest: Gate ON, Phase OFF")
 		
 		time.sleep(0.5) #Settling Time after switching relais
-		self.GetVGate()
-		self.GetVPhase()
-		self.GetVSource()
+		self.GetVAll()
 					
 		self.evaluate("VGate", self.VGateDUT, 5.65, ERR.TESTER_FAULT, 5.85, ERR.TESTER_FAULT, QGUI.Gate)
 		self.evaluate("VPhase", self.VPhaseDUT, -0.03, ERR.TESTER_FAULT, 0.03, ERR.TESTER_FAULT, QGUI.Phase)
@@ -686,9 +1251,7 @@ class InlineStateMachine:
 		self.SetRelay(Ports.DOUT_VPHASE_ON, states.SET)	#VPhase ON
 
 		time.sleep(0.5) #Settling Time after switching relais
-		self.GetVGate()
-		self.GetVPhase()
-		self.GetVSource()
+		self.GetVAll()
 
 		self.evaluate("VGate", self.VGateDUT, -0.03, ERR.TESTER_FAULT, 0.03, ERR.TESTER_FAULT, QGUI.Gate)
 		self.evaluate("VPhase", self.VPhaseDUT, -8.0, ERR.TESTER_FAULT, -7.7, ERR.TESTER_FAULT, QGUI.Phase)
@@ -699,9 +1262,7 @@ class InlineStateMachine:
 
 		#Check OFF State
 		time.sleep(0.5) #Settling Time after switching relais
-		self.GetVGate()
-		self.GetVPhase()
-		self.GetVSource()
+		self.GetVAll()
 
 		self.evaluate("VGate", self.VGateDUT, -0.03, ERR.TESTER_FAULT, 0.03, ERR.TESTER_FAULT, QGUI.Gate)
 		self.evaluate("VPhase", self.VPhaseDUT, -0.03, ERR.TESTER_FAULT, 0.03, ERR.TESTER_FAULT, QGUI.Phase)
@@ -735,7 +1296,15 @@ class InlineStateMachine:
 					#Login has been successful
 					self.debug_output("login successfull")
 					self.schedule(STATE.HALT)		#User Starts Test Process, from HALT state -> INIT state
-					self.gui = ShuttleGUI(self.master, self.guiqueue, self.startCommand, self.haltCommand, self.exitCommand, self.gui_shuttlevalve_up, self.gui_shuttlevalve_down, self.gui_vphase_on, self.gui_vphase_off, self.gui_vphase_rev_off, self.gui_vphase_rev_on, self.gui_gate_on, self.gui_vgate_off, self.GetVGate, self.GetVPhase, self.GetVSource)
+					if self.METRICS_PORT is not None and self.metrics is None:
+						#the test runs without metrics if the port can't be used (e.g. already in use by another program / station)
+						try:
+							self.metrics = MetricsServer(self.snapshots, self.METRICS_PORT)
+							self.metrics.start()
+						except OSError as e:
+							print("Metrics: port %i not available, no metrics: %s" % (self.METRICS_PORT, repr(e)))
+							self.METRICS_PORT = None
+					self.LoggedOn.set()
 					#control output
 					print("Bitte auf den Start-Knopf Drücken, um den Test zu starten")
 
@@ -744,12 +1313,17 @@ class InlineStateMachine:
 				#Init State
 				#if self.Prev_State == STATE.ENTRY and This_State == STATE.ENTRY and self.Next_State == STATE.INIT:
 				if self.Next_State == STATE.INIT:
+					#the shuttles of the previous run have to be evaluated before the counters / files are reset
+					self.WaitEvaluation()
+					if self.PIPELINE == states.SET and self.evalworker is None:
+						self.evalworker = threading.Thread(target=self.EvaluationWorker, daemon=True)
+						self.evalworker.start()
 					#Set Logging File and Path for Selftest
 					self.TotalShuttlesTested = 0
 					#date: L:\YYYY-MM-DD_Shuttle_XXXX
 					#Logging File is set in STATE.TESTING, self.TotalShuttlesTested is increased in STATE.EVALUATE
-					self.LoggingFile = "L:\\" + str(date.today()) + "_" + "Init" + ".ascii"
-					self.LoggingFile = open(self.LoggingFile, 'w')
+					self.LoggingFile = self.LOG_PATH + str(date.today()) + "_" + "Init" + ".ascii"
+					self.LoggingFile = self.logwriter.open(self.LoggingFile, 'w')
 		
 					#control output
 					self.debug_output("Prev_State: %s,\nThis_State: %s,\nNext_State: %s\n" % (repr(self.Prev_State), repr(self.This_State), repr(self.Next_State)))
@@ -772,18 +1346,27 @@ class InlineStateMachine:
 
 					#Open Labjack Modules 1 and 2
 					if self.LabjacksOpened == states.CLEAR:
+						opened = 0
 						for i in range(0, self.NLJM):
 							if self.OpenLabjack(i+1) >= 0:
+								opened += 1
 								self.debug_output("No errors during opening Labjack Module")
 								#Setting Tester Status is done after each step in which the correct behavior can be checked
 								self.TESTER_STATUS = STATUS.PASSED
 								self.debug_output("Labjack Module %i opened, Tester_Status is %s" % (i+1, repr(self.TESTER_STATUS)))
 							else:
 								self.TESTER_STATUS = STATUS.ERROR
-						#set the flag to indicate the Labjacks are opened
+						#set the flag to indicate the Labjacks are opened (the relays are switched off with these handles in STATE.EXIT)
+						if opened == self.NLJM:
+							self.LabjacksOpened = states.SET
 					#else:
 					#	do nothing, leave the state of self.LabjacksOpened as defined by the constructor
 
+					#(Re-)Start the acquisition engine with the handles of the opened modules
+					if self.acq is not None:
+						self.acq.stop()
+					self.acq = AcqEngine(self.hw, [(self.handle1, self.AIN_ADDR_LJM1, self.AIN_TYPES_LJM1), (self.handle2, self.AIN_ADDR_LJM2, self.AIN_TYPES_LJM2)], self.ACQ_MODE, self.STREAM_SCANS, self.STREAM_RATE)
+
 					#------Initialize Tester------------------------------------------------#
 					#------Each Time an Actor is controlled the self.TESTER_STATUS might be set to STATUS.ERROR in case of an error
 					self.SetRelay(Ports.DOUT_3V3ISO_ON, states.CLEAR)	#3V3ISO OFF
@@ -792,12 +1375,26 @@ class InlineStateMachine:
 					self.SetRelay(Ports.STOPPER_VALVE, position.DOWN)	#Set StopperValve to position down (let Shuttles pass)
 					#------Initialize Tester Status------------------------------------------------#
 
+					#Calibration of the analog inputs, the guided calibration is done once if requested in the cmd args
+					if self.CAL_REQ == states.SET:
+						self.calibrate()
+						self.CAL_REQ = states.CLEAR
+					self.LoadCalibration()
+
 					self.selftest() #selftest keeps the relay settings after it is finished
 
+					#Compile the test plan of STATE.TESTING once into a flat execution schedule
+					self.TestSchedule, self.TestStores = compile_testplan(TESTPLAN)
+					#results file with the raw voltages of each evaluated test step
+					nsteps = len([op for op in self.TestSchedule if op[0] == OP.EVAL])
+					self.RawEmpty = array("f", [float("nan")]) * (nsteps * len(self.RAW_GROUP) * NDUT)
+					self.RawShuttle = array("f", self.RawEmpty)
+					if self.Results is not None:
+						self.Results.close()
+					self.Results = ResultWriter(os.path.join(self.SPOOL_PATH, ""), nsteps)
+
 					self.LoggingFile.close()	#close logging file for init after selftest
 					
-					#start periodic execution of the gui which is polled cyclical via the function processIncoming which is called from the InlineStateMachine
-					self.periodicCall()
 					setcounter = 0		#anti glitch counter in idle state, has to be initialized here to avoid unwanted resetting
 					self.schedule(STATE.IDLE)
 				
@@ -829,224 +1426,44 @@ class InlineStateMachine:
 						time.sleep(0.5)
 						setcounter = 0		#reset setcounter e.g. after a glitch
 					if setcounter == MAXWAITCYC:
-						self.SetRelay(Ports.STOPPER_VALVE, position.UP)	#Set StopperValve to position up (stop Shuttles)
 						setcounter = 0
-						StepIndex = 0			#Number of Test Steps, for Protokoll
+						#pipelined mode: the previous shuttle has to be evaluated before this shuttle is stopped,
+						#a repetition error of the previous shuttle halts the tester (see schedule), the shuttle passes untested
+						if self.WaitEvaluation():
+							self.SetRelay(Ports.STOPPER_VALVE, position.UP)	#Set StopperValve to position up (stop Shuttles)
 						self.schedule(STATE.TESTING)
 				
 			
 				if self.Next_State == STATE.TESTING:
-					SettlingTime = 0.3
-					StepIndex += 1			#current Test Step, for Protokoll, init in the state before TESTING, currently this is IDLE
 					#time.sleep(2)			#only in automatic mode: wait for shuttle to reach index position after Stopper went up
-					#Temp variables to store the error codes after each DUT Test step
-					GateErrorT4 = list(range(0, NDUT))
-					GateErrorT5 = list(range(0, NDUT))
-					PhaseErrorT3 = list(range(0, NDUT))
-					SourceErrorT3 = list(range(0, NDUT))
-					SourceErrorT4 = list(range(0, NDUT))
-					SourceErrorT5 = list(range(0, NDUT))
-					SourceErrorT6 = list(range(0, NDUT))
-					
-	
-					self.qObj[QGUI.Dutstati_Old] = self.DUTSTATUSMEM	#Index with the errorcodes
-					if self.guiqueue.qsize() < self.QMAXSIZE:
-						self.guiqueue.put(self.qObj)
-				
-					for i in range(0, NDUT):
-						GateErrorT4[i] = ERR.NORES
-						GateErrorT5[i] = ERR.NORES
-						PhaseErrorT3[i] = ERR.NORES
-						SourceErrorT3[i] = ERR.NORES
-						SourceErrorT4[i] = ERR.NORES
-						SourceErrorT5[i] = ERR.NORES
-						SourceErrorT6[i] = ERR.NORES
+					#Temp variables to store the error codes after each DUT Test step (e.g. GateErrorT4, see InlineTestPlan)
+					self.StepErrors = {}
+					for store in self.TestStores:
+						self.StepErrors[store] = [ERR.NORES] * NDUT
 
-	
-					#shift DUTSTATUS in memory
-					#older self.DUTSTATUS-data is shifted back
-					for m in range(0, MEMCYC-1):
-						for i in range(0, NDUT):	
-							self.DUTSTATUSMEM[(MEMCYC-m-1)*NDUT + i] = self.DUTSTATUSMEM[(MEMCYC-m-2)*NDUT + i]
-					#m = 0 for DUTSTATUS N-1, 
-					#last shuttle gets self.DUTSTATUS from current shuttle at beginning of the next test
-					#this assignment has to be done after all the old data has been shifted
-					#after this assignment self.DUTSTATUS of the current test is set to NORES
+					#the last shuttle is shown as N-1 (it has been added to the history in EvaluateShuttle), the current DUTSTATUS is set to NORES
 					for i in range(0, NDUT):		
-						self.DUTSTATUSMEM[i] = self.DUTSTATUS[i]
-						#set current DUTRESULT to NORES
 						self.DUTSTATUS[i] = ERR.NORES
+					self.qObj[QGUI.Dutstatus] = self.DUTSTATUS
+					self.qObj[QGUI.Dutstati_Old] = self.HistoryView	#Index with the errorcodes
+					self.snapshots.publish(self.qObj)
 
 					self.TotalShuttlesTested = self.TotalShuttlesTested + 1
-					#date: L:\YYYY-MM-DD_Shuttle_XXXX
-					self.LoggingFile = "L:\\" + str(date.today()) + "_" + "Shuttle_" + str(self.TotalShuttlesTested) + ".ascii"
-					print("The Logging File is: %s " % self.LoggingFile)
-					self.LoggingFile = open(self.LoggingFile, 'w')
-					
-
+					#date: L:\YYYY-MM-DD_Shuttles.ascii, the file is kept open for all shuttles of the day
+					self.LoggingFile = self.ShuttleLog()
+					self.debug_output("The Logging File is: %s " % self.LoggingFile.name)
 					
 					self.TIME_RUNSTART = time.time()	#Get Start Time (seconds till epoch 1.1.1970) as float  
-					#-----------------------------------TS001----------------------------------------------------------------------------
-					self.TESTSTEP = "TS" + str(StepIndex) + " - Selftest1: "
-					self.SetRelay(Ports.SHUTTLE_VALVE, position.DOWN)		#Set Shuttle Valve to position down
-					self.SetRelay(Ports.DOUT_VPHASE_ON, states.CLEAR)		#VPhase OFF
-					self.SetRelay(Ports.DOUT_VPHASE_REV_OFF, states.CLEAR)	#VPhase in Reverse State
-					self.SetRelay(Ports.DOUT_VGATE_ON, states.SET)			#VGate ON
-					time.sleep(SettlingTime)					
-					
-					self.GetVGate()
-					self.GetVPhase()
-					self.GetVSource()
-
-					#if any of these voltages is out of range evaluate(...) sets TESTER_STATUS to STATUS.FAIL
-					#possible causes for voltages being out of range: voltage supply off, Labjack Module defective / not connected
-					self.evaluate("VGate", self.VGateDUT, 5.65, ERR.TESTER_FAULT, 5.85, ERR.TESTER_FAULT, QGUI.Gate)
-					self.evaluate("VPhase", self.VPhaseDUT, -0.03, ERR.TESTER_FAULT, 0.03, ERR.TESTER_FAULT, QGUI.Phase)
-					self.evaluate("VSource", self.VSourceDUT, -0.03, ERR.TESTER_FAULT, 0.03, ERR.TESTER_FAULT, QGUI.Source) #determine whether Source is connected
-					
-					self.SetRelay(Ports.DOUT_VGATE_ON, states.CLEAR)			#VGate OFF
-					
-					#------------------------------------TS002-------------------------------------------------------------------------
-					StepIndex += 1			#Number of Test Steps, for Protokoll
-					self.TESTSTEP = "TS" + str(StepIndex) + " - Selftest2: "
-					self.SetRelay(Ports.DOUT_VPHASE_ON, states.SET)				#VPhase ON
-
-					time.sleep(SettlingTime)
-					
-					self.GetVGate()
-					self.GetVPhase()
-					self.GetVSource()
-
-					self.evaluate("VGate", self.VGateDUT, -0.03, ERR.TESTER_FAULT, 0.03, ERR.TESTER_FAULT, QGUI.Gate)
-					self.evaluate("VPhase", self.VPhaseDUT, -8.0, ERR.TESTER_FAULT, -7.6, ERR.TESTER_FAULT, QGUI.Phase)
-					self.evaluate("VSource", self.VSourceDUT, -0.03, ERR.TESTER_FAULT, 0.03, ERR.TESTER_FAULT, QGUI.Source) #determine whether Source is connected
-
-					self.SetRelay(Ports.DOUT_VPHASE_ON, states.CLEAR)				#VPhase OFF
-					
-
-
-					#-------------------------------------TS003--------------------------------------------------------------------------------
-					#-----------This test step determines:
-					#-----------Needle Connection Phase, Source (and Gate) to DCB (Only a fault can be detected but not which one of the needle pairs caused the fault)
-					#-----------Source wire not bonded 
-					StepIndex += 1			#Number of Test Steps, for Protokoll
-					self.TESTSTEP = "TS" + str(StepIndex) + " - Phase Reverse: "
-					self.SetRelay(Ports.SHUTTLE_VALVE, position.UP)		#Set Shuttle Valve to position up
-					time.sleep(SettlingTime*2)							#additional wait time for ESD safety to make sure the VGate is only applied after all needle contacted
-					self.SetRelay(Ports.DOUT_VPHASE_ON, states.SET)		#VPhase ON, Rev Mode activated in previous tests
-
-					time.sleep(SettlingTime*5)							#additional wait time for ESD safety to make sure the VGate is only applied after all needle contacted	#Sufficient wait time after shuttle has reached its upper position is mandatory to avoid pseudo errors (contact of gate-needle / source needle is not recognized)
-				
-					self.GetVGate()
-					self.GetVPhase()
-					self.GetVSource()
-					
-					self.evaluate("VGate", self.VGateDUT, -0.200, ERR.VLOW, -0.170, ERR.VHIGH, QGUI.Gate)
-					self.evaluate("VPhase", self.VPhaseDUT, -7.6, ERR.VLOW, -7.4, ERR.VHIGH, QGUI.Phase)
-					#evaluate() writes the result with the error codes to DUTSTATUSTMP
-					#to copy the error codes prior to the next evaluation (which would overwrite the old results)
-					#copy has to be done index wise and not GateErrorT4 = self.DUTSTATUSTMP this would merely make GateErrorT4 a reference to DUTSTATUSTMP and the info about the current test would be lost
-					for i in range(0, NDUT):
-						PhaseErrorT3[i] = self.DUTSTATUSTMP[i]	#Assign DUTSTATUS with Phase Errors to temporary list to validate error patterns in STATE.EVALUATE
-
-					self.evaluate("VSource", self.VSourceDUT, -0.77, ERR.VLOW, -0.57, ERR.VHIGH, QGUI.Source)
-					for i in range(0, NDUT):
-						SourceErrorT3[i] = self.DUTSTATUSTMP[i]	#Assign DUTSTATUS with Source Errors to temporary list to validate error patterns in STATE.EVALUATE
-
-					time.sleep(SettlingTime)										
-
-					self.SetRelay(Ports.DOUT_VPHASE_ON, states.CLEAR)		#VPhase OFF
-
-					#-------------------------------------TS004--------------------------------------------------------------------------------
-					#-----------This test step determines:
-					#-----------Gate and Source needle connection to DCB (it can't be differntiated between a fault of one or both of these needle pairs)
-					#-----------Gate Source functioning: Tomb Stone of Gate-Source Short, R1/2/3, Gate not bonded (Tomb Stone and Not-Bonded can't be differtiated in this step allone)
-					StepIndex += 1			#Number of Test Steps, for Protokoll
-					self.TESTSTEP = "TS" + str(StepIndex) + " - Fct G-ON Ph-OFF: "
-					self.SetRelay(Ports.DOUT_VGATE_ON, states.SET)			#VGate ON
-					
-					time.sleep(SettlingTime)
-					
-					self.GetVGate()
-					self.GetVPhase()
-					self.GetVSource()
-					
-					self.evaluate("VGate", self.VGateDUT, 5.1, ERR.VLOW, 5.35, ERR.VHIGH, QGUI.Gate)
-					for i in range(0, NDUT):
-						GateErrorT4[i] = self.DUTSTATUSTMP[i]
-					self.evaluate("VPhase", self.VPhaseDUT, 0.01, ERR.VLOW, 0.07, ERR.VHIGH, QGUI.Phase)
-					self.evaluate("VSource", self.VSourceDUT, 0.06, ERR.VLOW, 0.08, ERR.VHIGH, QGUI.Source) #determine whether Source is connected
-					for i in range(0, NDUT):
-						SourceErrorT4[i] = self.DUTSTATUSTMP[i]
-					
-					#-------------------------------------TS005--------------------------------------------------------------------------------
-					#-----------This test step determines:
-					#-----------DUT Function (even if a GS-short was detected, this test is performed): Gate-Source Function, Drain-Source Function, Bonded / Not Bonded
-					
-					StepIndex += 1			#Number of Test Steps, for Protokoll
-					self.TESTSTEP = "TS" + str(StepIndex) + " - Fct G-ON Ph-ON: "
-
-					self.SetRelay(Ports.DOUT_VPHASE_REV_OFF, states.SET)	#VPhase Reverse OFF
-					self.SetRelay(Ports.DOUT_VPHASE_ON, states.SET)		#VPhase ON
-
-					time.sleep(SettlingTime)															
-					
-					self.GetVGate()
-					self.GetVPhase()
-					self.GetVSource()
-					
-					self.evaluate("VGate", self.VGateDUT, 5.19, ERR.VLOW, 5.4, ERR.VHIGH, QGUI.Gate)
-					for i in range(0, NDUT):
-						GateErrorT5[i] = self.DUTSTATUSTMP[i]
-					self.evaluate("VPhase", self.VPhaseDUT, 7.35, ERR.VLOW, 7.65, ERR.VHIGH, QGUI.Phase)
-					self.evaluate("VSource", self.VSourceDUT, 0.70, ERR.VLOW, 0.83, ERR.VHIGH, QGUI.Source)
-					for i in range(0, NDUT):
-						SourceErrorT5[i] = self.DUTSTATUSTMP[i]
-
-					#-------------------------------------TS006--------------------------------------------------------------------------------
-					#-----------This test step determines:
-					#-----------Drain Source Function Test / DUT in OFF State 
-					StepIndex += 1			#Number of Test Steps, for Protokoll
-					self.TESTSTEP = "TS" + str(StepIndex) + " - Fct G-OFF Ph-ON: "
-
-					self.SetRelay(Ports.DOUT_VGATE_ON, states.CLEAR)			#VGate OFF
-
-					time.sleep(SettlingTime)										
-					
-					self.GetVGate()
-					self.GetVPhase()
-					self.GetVSource()
-					
-					self.evaluate("VGate", self.VGateDUT, 0.055, ERR.VLOW, 0.085, ERR.VHIGH, QGUI.Gate)
-					self.evaluate("VPhase", self.VPhaseDUT, 7.65, ERR.VLOW, 7.9, ERR.VHIGH, QGUI.Phase)
-					self.evaluate("VSource", self.VSourceDUT, 0.14, ERR.VLOW, 0.18, ERR.VHIGH, QGUI.Source)
-					for i in range(0, NDUT):
-						SourceErrorT6[i] = self.DUTSTATUSTMP[i]
-
-					#-------------------------------------TS007--------------------------------------------------------------------------------
-					StepIndex += 1			#Number of Test Steps, for Protokoll
-					self.TESTSTEP = "TS" + str(StepIndex) + " - Fct G-OFF Ph-OFF: "
-
-					self.SetRelay(Ports.DOUT_VPHASE_ON, states.CLEAR)		#VPhase OFF
-					self.SetRelay(Ports.DOUT_VPHASE_REV_OFF, states.CLEAR)	#VPhase Reverse, prepare to finish testing
-
-					time.sleep(SettlingTime)										
-					
-					self.GetVGate()
-					self.GetVPhase()
-					self.GetVSource()
-					
-					self.evaluate("VGate", self.VGateDUT, -0.03, ERR.TESTER_FAULT, 0.03, ERR.TESTER_FAULT, QGUI.Gate)
-					self.evaluate("VPhase", self.VPhaseDUT, -0.03, ERR.TESTER_FAULT, 0.03, ERR.TESTER_FAULT, QGUI.Phase)
-					self.evaluate("VSource", self.VSourceDUT, -0.03, ERR.TESTER_FAULT, 0.03, ERR.TESTER_FAULT, QGUI.Source)
-
-					#----------------------------------Test Finished-----------------------------------------------------------------------------
-					self.SetRelay(Ports.DOUT_VGATE_ON, states.CLEAR)	#VGate OFF
-					self.SetRelay(Ports.DOUT_VPHASE_ON, states.CLEAR)	#VPhase OFF
-					self.SetRelay(Ports.DOUT_VPHASE_REV_OFF, states.CLEAR)	#VPhase in Reverse State
-
-					self.SetRelay(Ports.STOPPER_VALVE, position.DOWN)		#1. Remove Stopper
-					self.SetRelay(Ports.SHUTTLE_VALVE, position.DOWN)		#2. Set Shuttle Valve to position down
+					tshuttle = time.perf_counter()
+					if self.TimeLastShuttle is not None:
+						TIMING.record("Cycle", tshuttle - self.TimeLastShuttle)		#start to start of two successive shuttles
+					self.TimeLastShuttle = tshuttle
+					self.LoggingFile.write("Shuttle %i, %s\n" % (self.TotalShuttlesTested, time.strftime("%H:%M:%S", time.localtime(self.TIME_RUNSTART))))
+					self.RawShuttle[0:len(self.RawEmpty)] = self.RawEmpty
+					self.SettleTimeShuttle = float(0)
+					self.SettleMaxShuttle = float(0)
+					#Execute the compiled test plan: TS1 ... TS7 and the finishing relay settings (stopper down, shuttle valve down)
+					self.RunTestPlan()
 				
 					self.debug_output("test finished")
 
@@ -1057,14 +1474,25 @@ class InlineStateMachine:
 
 					#Get Stop time, this step might have to be moved to STATE.EVALUATE
 					self.TIME_RUNSTOP = time.time()	#Get Start Time (seconds till epoch 1.1.1970) as float  
+					TIMING.record("Shuttle", time.perf_counter() - tshuttle)
 					
 					print("Total test time was: %2.2f sec" % (self.TIME_RUNSTOP - self.TIME_RUNSTART))
+					print("Total settle time was: %2.2f sec (fixed settling times: %2.2f sec)" % (self.SettleTimeShuttle, self.SettleMaxShuttle))
 					
 					for i in range(0,NDUT):
-						self.debug_output("STATE.TESTING: GateErrorT4 Mo %i is %s" % (i+1, repr(GateErrorT4[i])))
+						self.debug_output("STATE.TESTING: GateErrorT4 Mo %i is %s" % (i+1, repr(self.StepErrors["GateErrorT4"][i])))
 					
-					#Go to Evaluation
-					self.schedule(STATE.EVALUATE)
+					#Go to Evaluation, in pipelined mode the shuttle is evaluated by the worker and the state machine waits for the next shuttle
+					self.EvalJob = self.ShuttleJob()
+					#Reset serial number to default value so that the input is done once if self.REQ_SN was set in cmd_args
+					if self.REQ_SN == states.SET:
+						self.SERIAL = "0"
+					if self.evalworker is not None:
+						self.evalqueue.put(self.EvalJob)
+						self.EvalJob = None
+						self.schedule(STATE.IDLE)
+					else:
+						self.schedule(STATE.EVALUATE)
 
 				if self.Next_State == STATE.HALT:
 					time.sleep(1) #wait a little longer, so the gui can be updated
@@ -1080,111 +1508,94 @@ class InlineStateMachine:
 					self.schedule(self.Next_State)
 					
 				if self.Next_State == STATE.EVALUATE:
-					#evaluation of the errors occurred during STATE.TESTING
-					#the evaluation includes only the DUT-relevant test steps (possible errors are Voltage high / low) 
-					#and not those which evaluate the tester (possible error code is ERR.TESTER_FAULT)
-		
-					for i in range(0,NDUT): 	#sample the test results of each step and each DUT
-						self.TotalDUTsTested += 1		#Bonded and unbonded DUTs
-						if PhaseErrorT3[i] == ERR.PASSED and SourceErrorT3[i] == ERR.PASSED and GateErrorT4[i] == ERR.PASSED and SourceErrorT5[i] == ERR.PASSED  and SourceErrorT6[i] == ERR.PASSED:
-							self.DUTSTATUS[i] = ERR.PASSED
-							self.TotalDUTsPassed += 1
-						elif GateErrorT4[i] == ERR.VLOW and SourceErrorT4[i] == ERR.VHIGH and GateErrorT5[i] == ERR.VLOW:
-							self.DUTSTATUS[i] = ERR.GS_SHORT
-							self.TotalDUTsFailed += 1
-							self.TotalDUTsGSShort += 1
-						elif PhaseErrorT3[i] == ERR.VLOW and SourceErrorT3[i] == ERR.VHIGH and SourceErrorT5[i] == ERR.VLOW:
-							self.DUTSTATUS[i] = ERR.NOT_BONDED
-							self.TotalDUTsNotBonded += 1
-							#dont increase TotalDUTsTested counter: the number of unbonded parts can be calculated by: total - passed - failed
-						elif SourceErrorT6[i] == ERR.VHIGH:
-							self.DUTSTATUS[i] = ERR.DS_SHORT
-							self.TotalDUTsFailed += 1
-							self.TotalDUTsDSShort += 1
-						else:
-							self.DUTSTATUS[i] = ERR.UNKNOWN
-							self.TotalDUTsFailed += 1
-						self.LoggingFile.write('Auftragsnummer: %s\n' % (self.LOTCODE))
-						self.LoggingFile.write('Ausgewählte SN: %s\n' % (self.SERIAL))
-						
-						self.LoggingFile.write("DUT Error Code Module%i: %i\n" % (i+1, self.DUTSTATUS[i]))
-
-					#put statistics to LoggingFile if verbose mode is enabled (self.OUTPUT_MODE = MODE.DEBUG)
-					if self.OUTPUT_MODE == MODE.DEBUG:
-						self.LoggingFile.write("\n")
-						self.LoggingFile.write("Statistics:\n")
-						self.LoggingFile.write("Total DUTs Passed %i\n" % self.TotalDUTsPassed)
-						self.LoggingFile.write("Total DUTs Failed %i\n" % self.TotalDUTsFailed)
-						self.LoggingFile.write("Total DUTs with GS-Short %i\n" % self.TotalDUTsGSShort)
-						self.LoggingFile.write("Total DUTs with DS-Short %i\n" % self.TotalDUTsDSShort)
-						self.LoggingFile.write("Total DUTs not bonded %i\n" % self.TotalDUTsNotBonded)
-					#write Testtime to LoggingFile
-					self.LoggingFile.write("Total test time: %2.2f sec" % (self.TIME_RUNSTOP - self.TIME_RUNSTART))
-					self.LoggingFile.close()		#close logging file after all date has been stored
-					
-					#Reset serial number to default value so that the input is done once if self.REQ_SN was set in cmd_args
-					if self.REQ_SN == states.SET:
-						self.SERIAL = "0"
-					
-					#Check if an error occured repeatadely for MEMCYC (default 3) times in succession
-					for i in range(0, NDUT):
-						#Reset counter restmp each time a new module is checked for repetition error
-						restmp = 0
-						#The Repetition error includes only Test fails (not NORES and not PASS), optional: not bonded parts could be excluded if there are too many
-						if (self.DUTSTATUS[i] != ERR.PASSED) and (self.DUTSTATUS[i] != ERR.NORES): #and (self.DUTSTATUS[i] != ERR.NOT_BONDED):
-							for m in range(0, MEMCYC-1):
-								if(self.DUTSTATUSMEM[m*NDUT + i] == self.DUTSTATUS[i]):
-									restmp = restmp + 1 
-									self.debug_output("Repetition Error m = %i" % m)
-
-						#Tester-Error problably in Needle adapter
-						#self.TESTER_STATUS = STATUS.ERROR
-						if restmp == MEMCYC-1:
-							#Tester-Status is set to Error at the first occurrance of a repetition error 
-							#root cause might be a the Needle adapter (needle fault, cable connection, power supply, etc.)
-							self.TESTER_STATUS = STATUS.ERROR
-							self.debug_output("Repetition Error: Position %i is %s" % (i+1, repr(self.TESTER_STATUS)))
-
-						
-					
-					for i in range(0,NDUT):
-						self.debug_output("STATE.EVALUATE: GateErrorT4 Mo %i is %s" % (i+1, repr(GateErrorT4[i])))
-
-					#write result to GUI-queue
-					self.qObj[QGUI.Dutstatus] = self.DUTSTATUS	#Index with the errorcodes
-					self.qObj[QGUI.Ntot] = self.TotalDUTsTested
-					self.qObj[QGUI.Npass] = self.TotalDUTsPassed
-					self.qObj[QGUI.Nfail] = self.TotalDUTsFailed
-					self.qObj[QGUI.Ngs_short] = self.TotalDUTsGSShort
-					self.qObj[QGUI.Nnot_bonded] = self.TotalDUTsNotBonded
-					self.qObj[QGUI.Nds_short] = self.TotalDUTsDSShort
-					
-					self.guiqueue.put(self.qObj)
+					#evaluation of the errors occurred during STATE.TESTING (see EvaluateShuttle)
+					self.ApplyEvaluation(self.RunEvaluation(self.EvalJob))
+					self.EvalJob = None
 					
 					#Go to idle state and Wait for next shuttle
 					self.schedule(STATE.IDLE)
 
 			if self.Next_State == STATE.EXIT:
-				#close the Labjack Modules only if they have been opened
+				if self.evalworker is not None:
+					self.evalqueue.put(None)		#the queued shuttles are evaluated before the files are closed
+					self.evalworker.join()
+					self.ApplyEvaluations()
+				self.DumpTiming()
+				if self.metrics is not None:
+					self.metrics.stop()
+				if self.acq is not None:
+					self.acq.stop()
+				if self.Results is not None:
+					self.Results.close()
+				if self.ShuttleLogFile is not None:
+					self.ShuttleLogFile.close()
+				self.logwriter.close()
+				self.db.close()
+				#close the Labjack Modules only if they have been opened, the relays are cleaned up before (the handles are invalid afterwards)
 				if self.LabjacksOpened == states.SET:
+					#clean up...
+					self.SetRelay(Ports.DOUT_3V3ISO_ON, states.CLEAR)	#3V3ISO OFF
+					self.SetRelay(Ports.DOUT_VGATE_ON, states.CLEAR)	#VGate OFF
+					self.SetRelay(Ports.DOUT_VPHASE_ON, states.CLEAR)	#VPhase OFF
+					self.SetRelay(Ports.DOUT_VPHASE_REV_OFF, states.CLEAR)	#VPhase in Reverse State
+					self.SetRelay(Ports.SHUTTLE_VALVE, position.DOWN)		#Set Shuttle Valve to position down
+					self.SetRelay(Ports.STOPPER_VALVE, position.DOWN)	#Set StopperValve to position down (let Shuttles pass)
 					self.CloseLabjack(1)	#Close Labjack Module 1
 					self.CloseLabjack(2)	#Close Labjack Module 2
-				#clean up...
-				self.SetRelay(Ports.DOUT_3V3ISO_ON, states.CLEAR)	#3V3ISO OFF
-				self.SetRelay(Ports.DOUT_VGATE_ON, states.CLEAR)	#VGate OFF
-				self.SetRelay(Ports.DOUT_VPHASE_ON, states.CLEAR)	#VPhase OFF
-				self.SetRelay(Ports.DOUT_VPHASE_REV_OFF, states.CLEAR)	#VPhase in Reverse State
-				self.SetRelay(Ports.SHUTTLE_VALVE, position.DOWN)		#Set Shuttle Valve to position down
-				self.SetRelay(Ports.STOPPER_VALVE, position.DOWN)	#Set StopperValve to position down (let Shuttles pass)
 
 				self.debug_output("Inline statemachine: exit code executed")
-				self.master.destroy()
+				self.Exited.set()
 				sys.exit(1)			
 
 
-root = tkinter.Tk()
-InlineTest = InlineStateMachine(root)
-print("Test has been started")		
-root.mainloop()
-print("Test has been stopped")		
+def run_gui(tester):
+	"""
+	GUI in the main thread as subscriber of the snapshots of the state machine, tkinter is only imported here
+	the window is closed after STATE.EXIT of the state machine, closing the window exits the test
+	"""
+	import tkinter
+	from InlineGUI import ShuttleGUI
+	#the layout of the GUI depends on PROG_MODE, which is known after the logon
+	while not tester.LoggedOn.wait(0.1):
+		if not tester.thread1.is_alive():
+			return
+	root = tkinter.Tk()
+	gui = ShuttleGUI(root, tester.snapshots, tester.startCommand, tester.haltCommand, tester.exitCommand, tester.gui_shuttlevalve_up, tester.gui_shuttlevalve_down, tester.gui_vphase_on, tester.gui_vphase_off, tester.gui_vphase_rev_off, tester.gui_vphase_rev_on, tester.gui_gate_on, tester.gui_vgate_off, tester.GetVGate, tester.GetVPhase, tester.GetVSource, tester.GUI_MAXFPS)
+	root.protocol("WM_DELETE_WINDOW", tester.exitCommand)
+	def watch():
+		if tester.thread1.is_alive():
+			root.after(200, watch)
+		else:
+			root.destroy()
+	watch()
+	root.mainloop()
+
+
+def run_headless(tester):
+	#no GUI: the main thread waits until STATE.EXIT, Ctrl+C exits the test (the snapshots can be read by other subscribers, e.g. -metrics)
+	#Ctrl+C only sets the exit request, a KeyboardInterrupt within Thread.join could mark the running state machine as finished
+	signal.signal(signal.SIGINT, lambda signum, frame: tester.exitCommand())
+	while tester.thread1.is_alive():
+		time.sleep(0.5)
+	tester.thread1.join()
+
+
+def main():
+	#the hardware backend has to be chosen before the state machine is constructed, therefore -sim isn't evaluated in eval_cmdargs
+	if "-sim" in sys.argv:
+		hw = SimT7Backend()
+	else:
+		hw = LJMBackend()
+	InlineTest = InlineStateMachine(hw)
+	install_dump_signal(InlineTest.DumpRequest.set)
+	print("Test has been started")		
+	if "-headless" in sys.argv:
+		run_headless(InlineTest)
+	else:
+		run_gui(InlineTest)
+	print("Test has been stopped")		
+
+
+if __name__ == "__main__":
+	main()
 #------------------------------------------------------------------------Inline Tester State Machine-----------------------------------------------------------------------
@@ -0,0 +1,173 @@
+"""
+Company: 				HE-System Electronic
+ModuleName: 			InlineAcq
+Path: 					C:\Python34
+Python version: 		Python 3.4
+Content:				Acquisition engine for the analog inputs of the Labjack modules
+
+Each Labjack module is served by its own worker thread, so that module 1 and module 2 are read at the same time.
+The latency of one acquisition is therefore bounded by the slower module and not by the sum of both modules.
+
+Acquisition modes (ACQ in InlineClasses):
+	SINGLE:	one sample per channel, all channels of a module are read with a single eReadAddresses
+	STREAM:	hardware timed stream of all scanned channels of a module, SCANS scans with SCANRATE scans/sec
+			the stream is started, read once (SCANS scans) and stopped in each acquisition, independent of the number of samples
+			the samples are reduced to mean, min, max and noise (standard deviation) of each channel
+
+Calibration: the gain / offset tables of each module (see InlineCal) are applied to every acquisition in the worker of the module,
+in STREAM mode to the reduced values (mean / min / max / noise) instead of each sample
+
+Settling detection: settle() polls all channels in SINGLE mode until every channel is inside a stability band
+and returns as soon as the inputs are stable, at the latest after the given maximum time
+"""
+from InlineClasses import ACQ
+from InlineCal import apply_calibration
+from array import array
+from collections import deque
+import threading
+import queue
+import time
+
+
+class AcqEngine:
+	"""
+	hw is the hardware backend (see InlineHW), modules is a list with one entry (handle, addresses, datatypes) per Labjack module
+	the addresses / datatypes are the precomputed scan list of the module (see InlineStateMachine.__init__)
+
+	acquire() triggers all workers simultaneously and waits until every module has been read
+	the return value is a list with the AIN values of each module (in the order of modules)
+	and a list with the timestamp (seconds since epoch, as time.time()) at which each module has been read
+	in STREAM mode the AIN values are the mean values, min / max / noise of each channel are in
+	self.minimum[m], self.maximum[m], self.noise[m] (only updated in STREAM mode)
+	"""
+	def __init__(self, hw, modules, mode = ACQ.SINGLE, scans = 50, scanrate = 2000):
+		self.hw = hw
+		self.modules = modules
+		self.NMOD = len(modules)
+		self.MODE = mode
+		self.SCANS = scans					#scans per acquisition in STREAM mode
+		self.SCANRATE = scanrate			#scans / sec in STREAM mode
+		self.results = [None] * self.NMOD
+		self.timestamps = [float(0)] * self.NMOD
+		#result buffers of the stream reduction are allocated once per module
+		self.mean = [array("d", [0.0]) * len(modules[m][1]) for m in range(0, self.NMOD)]
+		self.minimum = [array("d", [0.0]) * len(modules[m][1]) for m in range(0, self.NMOD)]
+		self.maximum = [array("d", [0.0]) * len(modules[m][1]) for m in range(0, self.NMOD)]
+		self.noise = [array("d", [0.0]) * len(modules[m][1]) for m in range(0, self.NMOD)]
+		self.cal = [None] * self.NMOD		#(gain, offset) of each module, None: raw values
+		self.requests = [queue.Queue(maxsize = 1) for m in range(0, self.NMOD)]
+		self.done = queue.Queue()
+		self.workers = list(range(0, self.NMOD))
+		for m in range(0, self.NMOD):
+			self.workers[m] = threading.Thread(target=self._worker, args=(m,), daemon=True)
+			self.workers[m].start()
+
+	def _worker(self, m):
+		handle, addresses, datatypes = self.modules[m]
+		nframes = len(addresses)
+		while 1 == 1:
+			mode = self.requests[m].get()
+			if mode is None:
+				break
+			error = None
+			try:
+				if mode == ACQ.STREAM:
+					self.results[m] = self._stream(m, handle, nframes, addresses)
+				else:
+					self.results[m] = apply_calibration(self.hw.eReadAddresses(handle, nframes, addresses, datatypes), self.cal[m])
+			except Exception as e:
+				#the exception is handed over to the thread which called acquire()
+				error = e
+			self.timestamps[m] = time.time()
+			self.done.put((m, error))
+
+	def _stream(self, m, handle, nframes, addresses):
+		"""one hardware timed burst of SCANS scans of all channels of module m
+		the data of eStreamRead is interleaved: scan0 [ch0, ch1, ...], scan1 [ch0, ch1, ...], ...
+		"""
+		self.hw.eStreamStart(handle, self.SCANS, nframes, addresses, self.SCANRATE)
+		try:
+			data = self.hw.eStreamRead(handle)[0]
+		finally:
+			self.hw.eStreamStop(handle)
+		mean = self.mean[m]
+		for c in range(0, nframes):
+			samples = data[c::nframes]
+			n = len(samples)
+			mean[c] = sum(samples) / n
+			self.minimum[m][c] = min(samples)
+			self.maximum[m][c] = max(samples)
+			self.noise[m][c] = (sum([(x - mean[c]) * (x - mean[c]) for x in samples]) / n) ** 0.5
+		if self.cal[m] is not None:
+			#the calibration is linear, therefore it is applied to the reduced values
+			gain, offset = self.cal[m]
+			for c in range(0, nframes):
+				mean[c] = mean[c] * gain[c] + offset[c]
+				low = self.minimum[m][c] * gain[c] + offset[c]
+				high = self.maximum[m][c] * gain[c] + offset[c]
+				self.minimum[m][c] = min(low, high)
+				self.maximum[m][c] = max(low, high)
+				self.noise[m][c] = self.noise[m][c] * abs(gain[c])
+		return mean
+
+	def set_calibration(self, tables):
+		#tables: one (gain, offset) tuple per module (see InlineCal.load_calibration), None: raw values of all modules
+		#the tables are replaced as a whole, so that a running acquisition uses either the old or the new table
+		if tables is None:
+			tables = [None] * self.NMOD
+		self.cal = list(tables)
+
+	def acquire(self, mode = None, modules = None):
+		#mode overrides self.MODE for this acquisition, e.g. fast SINGLE polls during settling in STREAM mode
+		#modules: indices of the modules which are read, default all modules (results of the other modules are not updated)
+		if mode is None:
+			mode = self.MODE
+		if modules is None:
+			modules = range(0, self.NMOD)
+		for m in modules:
+			self.requests[m].put(mode)
+		error = None
+		for m in modules:
+			module, moderror = self.done.get()
+			if moderror is not None:
+				error = moderror
+		if error is not None:
+			raise error
+		return self.results, self.timestamps
+
+	def settle(self, maxtime, band, poll, npoll, mintime):
+		"""
+		wait until all channels of all modules are settled, but not longer than maxtime (sec)
+		the channels are polled every poll sec (one batched SINGLE acquisition of all modules)
+		a channel is settled if the last npoll values are within band (V) i.e. max - min <= band
+		mintime: the inputs are not regarded as settled before mintime, e.g. operate time of the relays
+		returns the measured settle time in sec and True / False whether the channels settled within maxtime
+		"""
+		tstart = time.perf_counter()
+		history = deque(maxlen = npoll)
+		while 1 == 1:
+			tpoll = time.perf_counter()
+			results, timestamps = self.acquire(ACQ.SINGLE)
+			history.append([v for r in results for v in r])
+			elapsed = time.perf_counter() - tstart
+			if elapsed >= mintime and len(history) == npoll:
+				settled = True
+				for c in range(0, len(history[0])):
+					values = [h[c] for h in history]
+					if max(values) - min(values) > band:
+						settled = False
+						break
+				if settled:
+					return elapsed, True
+			if elapsed >= maxtime:
+				return elapsed, False
+			wait = min(poll - (time.perf_counter() - tpoll), maxtime - elapsed)
+			if wait > 0:
+				time.sleep(wait)
+
+	def stop(self):
+		#stop all workers, the engine can't be used afterwards
+		for m in range(0, self.NMOD):
+			self.requests[m].put(None)
+		for m in range(0, self.NMOD):
+			self.workers[m].join()
@@ -0,0 +1,226 @@
+"""
+Company: 				HE-System Electronic
+ModuleName: 			InlineBench
+Path: 					C:\Python34
+Python version: 		Python 3.4
+Content:				Reproducible cycle time benchmark of the inline tester
+
+The benchmark runs InlineStateMachine (without GUI) against the simulated Labjack modules (SimT7Backend)
+with a virtual clock: sleep() doesn't wait but advances the clock, the computing time between the sleeps is counted in real time.
+Thereby a run of 100 shuttles takes seconds instead of minutes and the result doesn't depend on the load of the computer,
+only on the test plan, the settling, the simulated USB latency and the computing time of the program.
+Note: sleeps of threads which run at the same time (e.g. the USB transfers of module 1 and 2) are added, not overlapped.
+
+Report: shuttles per hour, cycle time, dwell time per state (see InlineStateMachine.schedule), time per test step, latency of the tester operations
+(incl. GUI publish and log writes, see InlineTiming) and log throughput.
+The results can be saved as JSON baseline and compared with a later run, e.g.
+	python InlineBench.py -n 100 -save bench_base.json
+	python InlineBench.py -n 100 -args="-pl" -compare bench_base.json
+all files of the tester (logs, spool, results, database, calibration file) are written to a temporary directory (-dir),
+the production paths (L:\, C:\InlineSpool, C:\InlineData) are not used
+"""
+from InlineClasses import ERR, NDUT
+from InlineHW import SimT7Backend
+from InlineTiming import TIMING
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_VERSION = 1
+MAX_WALLTIME = 600.0		#sec, a run is aborted if the shuttles haven't been tested within this time
+FLOOR_MS = 0.5				#ms, smaller differences of the times are not rated (noise of the computing time)
+
+
+class VirtualClock:
+	"""
+	replaces the time module of the tester modules: time(), perf_counter(), monotonic(), sleep(), other functions are those of the time module
+	"""
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.skipped = float(0)				#sum of all sleeps in sec
+		self.epoch = time.time() - time.perf_counter()
+
+	def perf_counter(self):
+		return time.perf_counter() + self.skipped
+
+	def monotonic(self):
+		return self.perf_counter()
+
+	def time(self):
+		return self.epoch + self.perf_counter()
+
+	def sleep(self, seconds):
+		if seconds > 0:
+			with self.lock:
+				self.skipped += seconds
+		time.sleep(0)						#let the other threads run
+
+	def __getattr__(self, name):
+		return getattr(time, name)
+
+
+def parse_defects(text):
+	#e.g. "GS_SHORT=0.01,DS_SHORT=0.005,NOT_BONDED=0.02"
+	defects = {}
+	for item in text.split(","):
+		if item.strip() != "":
+			name, value = item.split("=")
+			defects[ERR[name.strip()]] = float(value)
+	return defects
+
+
+def _ms(h):
+	return {"count": h.count, "mean": 1000.0 * h.total / h.count, "p50": 1000.0 * h.percentile(0.5),
+			"p90": 1000.0 * h.percentile(0.9), "p99": 1000.0 * h.percentile(0.99), "max": 1000.0 * h.max}
+
+
+def run(shuttles = 50, usb_latency = 0.001, defects = None, seed = 1, args = (), workdir = None):
+	"""
+	tests shuttles shuttles with the simulated tester and returns the results (dict, see report)
+	args: additional command line arguments of the tester, e.g. ["-pl"] or ["-a", "STREAM"]
+	"""
+	import Inline
+	import InlineAcq
+	import InlineTiming
+	if workdir is None:
+		workdir = tempfile.mkdtemp(prefix = "InlineBench")
+	clock = VirtualClock()
+	patched = [(module, module.time) for module in (Inline, InlineAcq, InlineTiming)]
+	for module, t in patched:
+		module.time = clock
+	TIMING.reset()
+	cwd = os.getcwd()
+	argv = sys.argv
+	os.chdir(workdir)
+	sys.argv = ["Inline.py", "-nl", "start", "Y"] + list(args)
+	hw = SimT7Backend(usb_latency = usb_latency, defects = defects, seed = seed, clock = clock)
+	try:
+		with open("Inline.out", "w") as out, contextlib.redirect_stdout(out):
+			wallstart = time.perf_counter()
+			paths = {"log": os.path.join(workdir, ""), "spool": os.path.join(workdir, "spool"), "db": os.path.join(workdir, "InlineResults.db"),
+					"cal": os.path.join(workdir, "InlineCal.json")}
+			tester = Inline.InlineStateMachine(hw, paths = paths)
+			while tester.TotalDUTsTested < shuttles * NDUT and tester.thread1.is_alive():
+				if time.perf_counter() - wallstart > MAX_WALLTIME:
+					break
+				time.sleep(0.01)
+			tester.exitCommand()
+			tester.thread1.join(MAX_WALLTIME)
+			walltime = time.perf_counter() - wallstart
+	finally:
+		os.chdir(cwd)
+		sys.argv = argv
+		for module, t in patched:
+			module.time = t
+
+	results = {"shuttles": tester.TotalDUTsTested // NDUT, "walltime": walltime, "workdir": workdir}
+	cycle = TIMING.histogram("Cycle")
+	if cycle is not None:
+		results["shuttles_per_hour"] = 3600.0 * cycle.count / cycle.total
+		results["cycle"] = _ms(cycle)
+	results["states"] = {}
+	for name in TIMING.names():
+		if name.startswith("State "):
+			h = TIMING.histogram(name)
+			results["states"][name[6:]] = {"count": h.count, "total": h.total, "mean": 1000.0 * h.total / h.count}
+	results["steps"] = dict([(name, _ms(TIMING.histogram(name))) for name in TIMING.names() if name.startswith("TS")])
+	results["operations"] = dict([(name, _ms(TIMING.histogram(name))) for name in TIMING.names() if not name.startswith("TS") and not name.startswith("State ")])
+	stats = tester.logwriter.stats()
+	results["log"] = {"writes": stats["writes"], "spooled": stats["spooled"], "highwater": stats["highwater"],
+						"blocktime": stats["blocktime"], "writes_per_sec": stats["writes"] / walltime, "bytes_per_sec": stats["spooled"] / walltime}
+	results["passed"] = tester.TotalDUTsPassed
+	results["failed"] = tester.TotalDUTsFailed
+	return results
+
+
+def report(results):
+	lines = ["Shuttles: %i in %2.1f sec (wall time)" % (results["shuttles"], results["walltime"])]
+	if "cycle" in results:
+		lines.append("Shuttles per hour: %2.1f, cycle time mean %2.1f ms, p90 %2.1f ms" % (results["shuttles_per_hour"], results["cycle"]["mean"], results["cycle"]["p90"]))
+	lines.append("State dwell time:")
+	for name in sorted(results["states"], key = lambda name: -results["states"][name]["total"]):
+		d = results["states"][name]
+		lines.append("	%-10s %6i x %10.1f ms = %8.2f sec" % (name, d["count"], d["mean"], d["total"]))
+	for title, group in (("Test steps", "steps"), ("Operations", "operations")):
+		lines.append("%s:%s" % (title, " " * (20 - len(title)) + "   count    mean ms     p90 ms     p99 ms     max ms"))
+		for name in sorted(results[group]):
+			h = results[group][name]
+			lines.append("	%-20s %6i %10.3f %10.3f %10.3f %10.3f" % (name, h["count"], h["mean"], h["p90"], h["p99"], h["max"]))
+	log = results["log"]
+	lines.append("Log: %i writes, %i bytes, %2.0f writes/sec, %2.0f bytes/sec, max. queue %i, blocked %2.3f sec" % (log["writes"], log["spooled"],
+				log["writes_per_sec"], log["bytes_per_sec"], log["highwater"], log["blocktime"]))
+	return "\n".join(lines)
+
+
+def key_figures(results):
+	"""
+	figures which are compared with the baseline: name -> (value, True if higher is better), the times are in ms
+	"""
+	figures = {}
+	if "shuttles_per_hour" in results:
+		figures["shuttles_per_hour"] = (results["shuttles_per_hour"], True)
+		figures["cycle.p90"] = (results["cycle"]["p90"], False)
+	for name, d in results["states"].items():
+		figures["state.%s" % name] = (d["mean"], False)
+	for group in ("steps", "operations"):
+		for name, h in results[group].items():
+			figures["%s.%s" % (group, name)] = (h["mean"], False)
+	return figures
+
+
+def compare(baseline, results, tolerance):
+	"""
+	returns the comparison as text and the list of figures which are worse than the baseline by more than tolerance (in %)
+	(times: and by more than FLOOR_MS)
+	"""
+	base = key_figures(baseline["results"])
+	current = key_figures(results)
+	lines = ["%-36s %12s %12s %8s" % ("figure", "baseline", "current", "delta")]
+	worse = []
+	for name in sorted(set(base) & set(current)):
+		b, higher = base[name]
+		c = current[name][0]
+		delta = 100.0 * (c - b) / b if b != 0 else 0.0
+		flag = ""
+		if (delta < -tolerance and higher) or (delta > tolerance and not higher and c - b > FLOOR_MS):
+			worse.append(name)
+			flag = "  worse"
+		lines.append("%-36s %12.3f %12.3f %+7.1f%%%s" % (name, b, c, delta, flag))
+	return "\n".join(lines), worse
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = "cycle time benchmark of the inline tester with simulated Labjack modules")
+	parser.add_argument("-n", type = int, default = 50, help = "number of shuttles")
+	parser.add_argument("-usb", type = float, default = 0.001, help = "USB latency per ljm call in sec")
+	parser.add_argument("-defects", default = "GS_SHORT=0.01,DS_SHORT=0.005,NOT_BONDED=0.02", help = "defect mix, probability per DUT and error class")
+	parser.add_argument("-seed", type = int, default = 1, help = "seed of the simulated DUT population and noise")
+	parser.add_argument("-args", default = "", help = "additional command line arguments of the tester, e.g. -args=\"-pl -fs\"")
+	parser.add_argument("-dir", default = None, help = "working directory of the tester (default: new temporary directory)")
+	parser.add_argument("-save", default = None, help = "save the results as baseline (JSON)")
+	parser.add_argument("-compare", default = None, help = "compare the results with a baseline (JSON)")
+	parser.add_argument("-tol", type = float, default = 5.0, help = "tolerance in %% for the comparison")
+	opts = parser.parse_args()
+
+	config = {"shuttles": opts.n, "usb_latency": opts.usb, "defects": opts.defects, "seed": opts.seed, "args": opts.args}
+	results = run(opts.n, opts.usb, parse_defects(opts.defects), opts.seed, opts.args.split(), opts.dir)
+	print(report(results))
+	if opts.save is not None:
+		with open(opts.save, "w") as f:
+			json.dump({"version": BENCH_VERSION, "date": time.strftime("%Y-%m-%d %H:%M:%S"), "config": config, "results": results}, f, indent = 1, sort_keys = True)
+		print("Baseline saved: %s" % opts.save)
+	if opts.compare is not None:
+		with open(opts.compare, "r") as f:
+			baseline = json.load(f)
+		if baseline["config"] != config:
+			print("Note: configuration differs from the baseline %s" % repr(baseline["config"]))
+		text, worse = compare(baseline, results, opts.tol)
+		print(text)
+		if worse:
+			print("%i figures worse than the baseline by more than %2.1f %%" % (len(worse), opts.tol))
+			sys.exit(1)
@@ -0,0 +1,144 @@
+"""
+Company: 				HE-System Electronic
+ModuleName: 			InlineCal
+Path: 					C:\Python34
+Python version: 		Python 3.4
+Content:				Calibration tables of the analog inputs
+
+The calibration file (JSON, CAL_FILE) contains one calibration table per Labjack module, identified by its serial number:
+	{"version": 1,
+	 "modules": {"470011540": {"revision": 2, "date": "2026-10-18 07:30:00", "user": "...", "gain": [1.0, ...], "offset": [0.0, ...]},
+	             "470011571": {...}}}
+	one gain / offset per AIN of the module (AIN0 ... AINn), calibrated value = AINmeasured * gain + offset
+	the gain is relative to the nominal voltage divider (DIV_GATE / DIV_PHASE / DIV_SOURCE in InlineStateMachine),
+	therefore the limits of the test plan remain valid, e.g. AIN_GATEMO9 with a divider of 2.8184 instead of 2.6027: gain = 2.8184 / 2.6027
+	a module without a table in the file (or a missing file) is not corrected (gain 1.0, offset 0.0)
+	each saved table gets a new revision, the previous file is kept as CAL_FILE + ".bak"
+
+The tables are read once and kept until the file is changed (see load_calibration), the acquisition engine applies
+the gain / offset arrays of each module to the complete acquisition (see AcqEngine.set_calibration)
+"""
+from array import array
+import json
+import os
+import time
+
+CAL_VERSION = 1								#format version of the calibration file
+CAL_FILE = "C:\\Python34\\InlineCal.json"
+
+_cache = {}		#filename -> (modification time, content of the file)
+
+
+def identity(nchannels):
+	#calibration table without correction
+	return array("d", [1.0]) * nchannels, array("d", [0.0]) * nchannels
+
+
+def read_file(filename = CAL_FILE):
+	"""
+	returns the content of the calibration file, an empty calibration if the file doesn't exist
+	the file is only parsed again if it has been modified since the last call
+	"""
+	try:
+		mtime = os.stat(filename).st_mtime
+	except OSError:
+		return {"version": CAL_VERSION, "modules": {}}
+	if filename in _cache and _cache[filename][0] == mtime:
+		return _cache[filename][1]
+	with open(filename, "r") as f:
+		content = json.load(f)
+	if not isinstance(content, dict) or content.get("version") != CAL_VERSION:
+		raise ValueError("%s: unsupported calibration file version %s" % (filename, repr(content.get("version") if isinstance(content, dict) else None)))
+	_cache[filename] = (mtime, content)
+	return content
+
+
+def _channels(filename, serial, table, key, nchannels):
+	#gain or offset list of a calibration table as array("d"), raises ValueError if it isn't a list of nchannels numbers
+	values = table.get(key) if isinstance(table, dict) else None
+	if not isinstance(values, list) or len(values) != nchannels:
+		raise ValueError("%s: %s of module %s is not a list of %i channels" % (filename, key, serial, nchannels))
+	for value in values:
+		if isinstance(value, bool) or not isinstance(value, (int, float)) or value != value or abs(value) == float("inf"):
+			raise ValueError("%s: %s of module %s contains the invalid value %s" % (filename, key, serial, repr(value)))
+	return array("d", values)
+
+
+def load_calibration(serials, nchannels, filename = CAL_FILE):
+	"""
+	serials: serial number of each Labjack module, nchannels: number of AINs of each module
+	returns a list with one (gain, offset) tuple of array("d") per module and a list with the revision of each table (0: no table)
+	a table with missing or non-numeric entries raises ValueError
+	"""
+	modules = read_file(filename)["modules"]
+	if not isinstance(modules, dict):
+		raise ValueError("%s: modules is not an object" % filename)
+	tables = []
+	revisions = []
+	for m in range(0, len(serials)):
+		table = modules.get(str(serials[m]))
+		if table is None:
+			tables.append(identity(nchannels[m]))
+			revisions.append(0)
+			continue
+		tables.append((_channels(filename, serials[m], table, "gain", nchannels[m]), _channels(filename, serials[m], table, "offset", nchannels[m])))
+		revisions.append(table.get("revision", 0))
+	return tables, revisions
+
+
+def save_calibration(serials, tables, user, filename = CAL_FILE):
+	"""
+	writes the (gain, offset) tables of the given modules with a new revision, the tables of other modules in the file are kept
+	returns the new revision of each table
+	"""
+	content = read_file(filename)
+	modules = dict(content["modules"])
+	revisions = []
+	for m in range(0, len(serials)):
+		gain, offset = tables[m]
+		revision = modules.get(str(serials[m]), {}).get("revision", 0) + 1
+		modules[str(serials[m])] = {"revision": revision,
+									"date": time.strftime("%Y-%m-%d %H:%M:%S"),
+									"user": user,
+									"gain": list(gain),
+									"offset": list(offset)}
+		revisions.append(revision)
+	#write to a temporary file first, so that an interrupted write doesn't destroy the calibration
+	tmpname = filename + ".tmp"
+	with open(tmpname, "w") as f:
+		json.dump({"version": CAL_VERSION, "modules": modules}, f, indent = 1, sort_keys = True)
+	if os.path.exists(filename):
+		if os.path.exists(filename + ".bak"):
+			os.remove(filename + ".bak")
+		os.rename(filename, filename + ".bak")
+	os.rename(tmpname, filename)
+	return revisions
+
+
+def fit_channel(points, gain):
+	"""
+	least squares fit of gain and offset of one channel, reference = gain * measured + offset
+	points: list of (measured AIN, reference AIN) tuples
+	if the points don't contain two different references only the offset is fitted and the given gain is kept
+	returns gain, offset
+	"""
+	n = len(points)
+	mx = sum([p[0] for p in points]) / n
+	my = sum([p[1] for p in points]) / n
+	sxx = sum([(p[0] - mx) * (p[0] - mx) for p in points])
+	sxy = sum([(p[0] - mx) * (p[1] - my) for p in points])
+	refs = set([p[1] for p in points])
+	if len(refs) > 1 and sxx > 0:
+		gain = sxy / sxx
+	return gain, my - gain * mx
+
+
+def apply_calibration(values, table, first = 0):
+	"""
+	returns the calibrated values of AIN<first> ... AIN<first + len(values) - 1> of a module
+	table: (gain, offset) of the module, None: the values are returned unchanged
+	"""
+	if table is None:
+		return values
+	gain, offset = table
+	return [v * g + o for v, g, o in zip(values, gain[first:first + len(values)], offset[first:first + len(values)])]
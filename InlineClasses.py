@@ -8,7 +8,6 @@ Python version: 		Python 3.4
 Content:				Definitions of Classes and initializations of global variables
 
 """
-from labjack import ljm
 from array import array
 import ctypes
 from enum import IntEnum
@@ -18,6 +17,7 @@ import time
 #Number of DUTs per shuttle
 NDUT = 9
 #Number of test-data is to be stored to compare errors in order to assess repetitive errors such as broken needles
+#default depth / repetition rule of the position history (see InlineHistory), can be changed at runtime with -mem / -rep
 MEMCYC	= 3		
 #------------------------------------------------Definition of Classes-----------------------------------------------------------------------------------------
 #Order in which the qObj is handed from the InlineTester to the InlineGUI
@@ -36,6 +36,7 @@ class QGUI(IntEnum):
 	Nds_short = 11
 	State = 12
 	Mode = 13
+	Spc = 14			#yield / SPC alarms as text lines (see InlineSPC)
 
 class MODE(IntEnum):
 	# 	something like this is not possible from the outside: 
@@ -52,6 +53,23 @@ class MODE(IntEnum):
 									#Setting is controlled by user and implemented in debug_output
 
 
+#Acquisition mode of the analog inputs (see InlineAcq)
+class ACQ(IntEnum):
+	SINGLE = 0		#one sample per channel and test step
+	STREAM = 1		#hardware timed stream per test step, reduced to mean / min / max / noise per channel
+
+
+#Operations of the test plan and of the compiled execution schedule (see InlineTestPlan)
+class OP(IntEnum):
+	STEP = 0		#start of a test step
+	RELAY = 1		#set relay / valve
+	WAIT = 2		#fixed wait time
+	SETTLE = 3		#wait until the inputs are settled
+	MEASURE = 4		#acquire the analog inputs
+	EVAL = 5		#evaluate a channel group
+	END = 6			#end of a test step
+
+
 class LIMIT(IntEnum):
 	MAX_PHASE = 0
 	NOM_PHASE = 1
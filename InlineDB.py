@@ -0,0 +1,223 @@
+"""
+Company: 				HE-System Electronic
+ModuleName: 			InlineDB
+Path: 					C:\Python34
+Python version: 		Python 3.4
+Content:				Traceability database (SQLite) of the shuttle and DUT results
+
+Tables:
+	shuttle:	one row per tested shuttle (timestamp, shuttle number of the day, lot code, serial number, test time, tester status,
+				raw voltages of the evaluated test steps as packed float32 [step][VGate, VPhase, VSource][DUT], see InlineStore)
+	dut:		one row per DUT (shuttle, position 1 ... NDUT, error code), lot code and timestamp are repeated from the shuttle,
+				so that the statistics per lot / position / error code are answered from the indexes alone
+The database is on the local disk (SQLite must not be used on a network drive).
+The results are written by a background thread, several shuttles are written in one transaction (BATCH_SIZE / BATCH_TIME).
+The shuttles of a failed transaction (e.g. database locked, disk full) are kept and written again with the next batch,
+the error is printed and returned once by take_error() (alarm of the state machine, see EvaluateShuttle).
+If the database can't be opened, the tester keeps testing: the connection is tried again with each batch.
+At most MAX_PENDING shuttles are kept, the oldest are dropped (counted in dropped, reported by take_error()).
+
+Queries, e.g. GS-short rate of position 6 in lot 123456:
+	python C:\Python34\InlineDB.py C:\InlineData\InlineResults.db 123456 6
+Raw voltages of a shuttle (e.g. drift of a channel over a lot): raw_voltages(db, shuttle_id)
+"""
+from InlineClasses import ERR
+from InlineTiming import TIMING
+from array import array
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+BATCH_SIZE = 20			#max. number of shuttles per transaction
+BATCH_TIME = 10.0		#max. sec until a tested shuttle is written
+MAX_PENDING = 5000		#max. number of kept shuttles while the database can't be written
+
+SCHEMA = [
+	"""CREATE TABLE IF NOT EXISTS shuttle (
+		id INTEGER PRIMARY KEY,
+		timestamp REAL NOT NULL,
+		shuttle INTEGER,
+		lotcode TEXT,
+		serial TEXT,
+		testtime REAL,
+		testerstatus INTEGER,
+		raw BLOB)""",
+	"""CREATE TABLE IF NOT EXISTS dut (
+		shuttle_id INTEGER NOT NULL REFERENCES shuttle(id),
+		position INTEGER NOT NULL,
+		errcode INTEGER NOT NULL,
+		lotcode TEXT,
+		timestamp REAL NOT NULL)""",
+	"CREATE INDEX IF NOT EXISTS idx_shuttle_lotcode ON shuttle (lotcode, timestamp)",
+	"CREATE INDEX IF NOT EXISTS idx_shuttle_serial ON shuttle (serial)",
+	"CREATE INDEX IF NOT EXISTS idx_shuttle_timestamp ON shuttle (timestamp)",
+	"CREATE INDEX IF NOT EXISTS idx_dut_shuttle ON dut (shuttle_id)",
+	"CREATE INDEX IF NOT EXISTS idx_dut_lotcode ON dut (lotcode, position, errcode)",
+	"CREATE INDEX IF NOT EXISTS idx_dut_position ON dut (position, errcode, timestamp)",
+	"CREATE INDEX IF NOT EXISTS idx_dut_errcode ON dut (errcode, timestamp)",
+]
+
+
+def connect(filename):
+	#connection with the schema of the results database, the tables / indexes are created if they don't exist
+	db = sqlite3.connect(filename)
+	db.execute("PRAGMA journal_mode=WAL")		#readers (queries) don't block the writer
+	for statement in SCHEMA:
+		db.execute(statement)
+	#databases of older versions don't have the raw voltages
+	if "raw" not in [row[1] for row in db.execute("PRAGMA table_info(shuttle)")]:
+		db.execute("ALTER TABLE shuttle ADD COLUMN raw BLOB")
+	db.commit()
+	return db
+
+
+class ResultDB:
+	"""
+	writes the results of the tested shuttles to the database filename
+	add() only queues the results, the state machine doesn't wait for the database
+	errors (including a database which can't be opened) don't raise, they are returned by take_error()
+	"""
+	def __init__(self, filename, batchsize = BATCH_SIZE, batchtime = BATCH_TIME, maxpending = MAX_PENDING):
+		self.filename = filename
+		self.BATCH_SIZE = batchsize
+		self.BATCH_TIME = batchtime
+		self.MAX_PENDING = maxpending
+		self.queue = queue.Queue()
+		self.written = 0				#number of shuttles written to the database
+		self.transactions = 0			#number of transactions
+		self.error = None				#last error of the writer thread, not yet taken (see take_error)
+		self.unwritten = 0				#number of shuttles of the failed transactions which are kept for the next batch
+		self.dropped = 0				#number of shuttles dropped after MAX_PENDING kept shuttles
+		self.lock = threading.Lock()
+		self.writer = threading.Thread(target=self._write, daemon=True)
+		self.writer.start()
+
+	def add(self, timestamp, shuttle, lotcode, serial, testtime, testerstatus, dutstatus, raw = None):
+		#dutstatus: error code of each DUT, position = index + 1, raw: array("f") of the raw voltages (None: not stored)
+		self.queue.put((timestamp, shuttle, lotcode, serial, testtime, int(testerstatus), [int(e) for e in dutstatus],
+						None if raw is None else raw.tobytes()))
+
+	def take_error(self):
+		#last error of the writer thread since the previous call (None: no error)
+		with self.lock:
+			error, self.error = self.error, None
+			return error
+
+	def _connect(self):
+		directory = os.path.dirname(self.filename)
+		if directory != "":
+			os.makedirs(directory, exist_ok = True)
+		return connect(self.filename)
+
+	def _failed(self, e, batch):
+		#error of the writer thread, returns the shuttles kept for the next batch (the oldest beyond MAX_PENDING are dropped)
+		dropped = max(len(batch) - self.MAX_PENDING, 0)
+		print("ResultDB: %i shuttles not written to %s: %s%s" % (len(batch), self.filename, repr(e),
+																"" if dropped == 0 else ", %i shuttles dropped" % dropped))
+		with self.lock:
+			self.dropped += dropped
+			self.error = e
+		return batch[dropped:]
+
+	def _write(self):
+		#the connection is used only in this thread (sqlite3 connections are bound to the thread which created them)
+		db = None
+		try:
+			db = self._connect()
+		except Exception as e:
+			#tried again with the next batch
+			self._failed(e, [])
+		pending = []				#shuttles of a failed transaction
+		running = True
+		while running:
+			batch = [self.queue.get()]
+			deadline = time.time() + self.BATCH_TIME
+			while batch[-1] is not None and len(batch) < self.BATCH_SIZE:
+				try:
+					batch.append(self.queue.get(timeout = max(deadline - time.time(), 0)))
+				except queue.Empty:
+					break
+			if batch[-1] is None:
+				running = False
+				batch.pop()
+			batch = pending + batch
+			if len(batch) == 0:
+				continue
+			try:
+				if db is None:
+					db = self._connect()
+				tstart = time.perf_counter()
+				with db:		#one transaction per batch
+					for timestamp, shuttle, lotcode, serial, testtime, testerstatus, dutstatus, raw in batch:
+						cursor = db.execute("INSERT INTO shuttle (timestamp, shuttle, lotcode, serial, testtime, testerstatus, raw) VALUES (?, ?, ?, ?, ?, ?, ?)",
+											(timestamp, shuttle, lotcode, serial, testtime, testerstatus, raw))
+						shuttle_id = cursor.lastrowid
+						db.executemany("INSERT INTO dut (shuttle_id, position, errcode, lotcode, timestamp) VALUES (?, ?, ?, ?, ?)",
+										[(shuttle_id, i + 1, dutstatus[i], lotcode, timestamp) for i in range(0, len(dutstatus))])
+				self.written += len(batch)
+				self.transactions += 1
+				pending = []
+				TIMING.record("DBCommit", time.perf_counter() - tstart)
+			except Exception as e:
+				#the transaction is rolled back, the shuttles are written again with the next batch
+				pending = self._failed(e, batch)
+			self.unwritten = len(pending)
+		if db is not None:
+			db.close()
+
+	def close(self, timeout = 10.0):
+		#writes the queued shuttles and closes the database, returns the number of shuttles which couldn't be written
+		self.queue.put(None)
+		self.writer.join(timeout)
+		if self.unwritten > 0:
+			print("ResultDB: %i shuttles not written to %s" % (self.unwritten, self.filename))
+		return self.unwritten
+
+
+def error_rates(db, lotcode, position = None):
+	"""
+	number of DUTs per error code of a lot (and a position 1 ... NDUT), returns {error code: count} and the total number of DUTs
+	"""
+	if position is None:
+		rows = db.execute("SELECT errcode, COUNT(*) FROM dut WHERE lotcode = ? GROUP BY errcode", (lotcode,)).fetchall()
+	else:
+		rows = db.execute("SELECT errcode, COUNT(*) FROM dut WHERE lotcode = ? AND position = ? GROUP BY errcode", (lotcode, position)).fetchall()
+	counts = dict(rows)
+	return counts, sum(counts.values())
+
+
+def failures(db, lotcode = None, serial = None):
+	#failed DUTs (error code not PASSED / NORES) of a lot or of the shuttle with the given serial number: (timestamp, lot code, serial, position, error code)
+	query = "SELECT s.timestamp, s.lotcode, s.serial, d.position, d.errcode FROM shuttle s JOIN dut d ON d.shuttle_id = s.id WHERE d.errcode NOT IN (?, ?)"
+	args = [int(ERR.PASSED), int(ERR.NORES)]
+	if lotcode is not None:
+		query += " AND s.lotcode = ?"
+		args.append(lotcode)
+	if serial is not None:
+		query += " AND s.serial = ?"
+		args.append(serial)
+	return db.execute(query + " ORDER BY s.timestamp", args).fetchall()
+
+
+def raw_voltages(db, shuttle_id):
+	#raw voltages of a shuttle as array("f") [step][VGate, VPhase, VSource][DUT] (None if they weren't stored)
+	row = db.execute("SELECT raw FROM shuttle WHERE id = ?", (shuttle_id,)).fetchone()
+	if row is None or row[0] is None:
+		return None
+	values = array("f")
+	values.frombytes(row[0])		#float32 little endian (x86)
+	return values
+
+
+if __name__ == "__main__":
+	#python InlineDB.py database lotcode [position]
+	db = connect(sys.argv[1])
+	position = int(sys.argv[3]) if len(sys.argv) > 3 else None
+	counts, total = error_rates(db, sys.argv[2], position)
+	print("Lot %s%s: %i DUTs" % (sys.argv[2], "" if position is None else ", position %i" % position, total))
+	for errcode in sorted(counts):
+		print("	%-12s %8i  %6.2f %%" % (ERR(errcode).name, counts[errcode], 100.0 * counts[errcode] / total))
+	db.close()
@@ -0,0 +1,85 @@
+"""
+Company: 				HE-System Electronic
+ModuleName: 			InlineEval
+Path: 					C:\Python34
+Python version: 		Python 3.4
+Content:				Limit evaluation of a complete test step
+
+A test step is evaluated as a matrix: one row per channel group (VGate, VPhase, VSource), one column per DUT.
+The limits are arrays with one value per row and channel, so that the number of DUTs per shuttle is not fixed to NDUT
+and each channel may get its own limits. All error codes of a step are computed by one call of evaluate_step,
+tester faults are returned as a mask of the same shape. The evaluation is not vectorized (no numpy on the tester PCs):
+each value is still compared in Python (list comprehensions), the gain is one call per step instead of one per channel group.
+The classification of the DUTs of a shuttle (classify) only depends on the error codes of the test steps,
+so that it can run outside of the state machine (e.g. on the evaluation worker, see InlineStateMachine.PIPELINE).
+"""
+from InlineClasses import ERR
+from array import array
+
+
+def limit_arrays(limits, nchannels):
+	"""
+	converts the limits of a test step (see InlineTestPlan) into per-channel arrays
+	limits is a list of (group, low limit, error on low, high limit, error on high, store)
+	a low / high limit may be a single value (same limit for all channels) or a sequence with one value per channel
+	returns groups, low, erronlow, high, erronhigh, stores (low / high as list of array("d") with nchannels values per group)
+	"""
+	groups = tuple([limit[0] for limit in limits])
+	low = [_channel_array(limit[1], nchannels) for limit in limits]
+	erronlow = tuple([limit[2] for limit in limits])
+	high = [_channel_array(limit[3], nchannels) for limit in limits]
+	erronhigh = tuple([limit[4] for limit in limits])
+	stores = tuple([limit[5] for limit in limits])
+	return groups, low, erronlow, high, erronhigh, stores
+
+
+def _channel_array(value, nchannels):
+	if isinstance(value, (int, float)):
+		return array("d", [value]) * nchannels
+	return array("d", value)
+
+
+def evaluate_step(matrix, low, erronlow, high, erronhigh):
+	"""
+	matrix: measured values, one row per channel group
+	low / high: limit arrays with the same shape as matrix
+	erronlow / erronhigh: error code per row if the low / high limit is violated
+	returns the error codes (same shape as matrix, ERR.PASSED if the value is within the limits)
+	and the tester fault mask (True where a limit with the error code ERR.TESTER_FAULT is violated)
+	plain Python comprehensions, one comparison per value
+	"""
+	PASSED = ERR.PASSED
+	codes = [[el if v < lo else (eh if v > hi else PASSED) for v, lo, hi in zip(row, lrow, hrow)]
+			for row, lrow, hrow, el, eh in zip(matrix, low, high, erronlow, erronhigh)]
+	fault = [[c == ERR.TESTER_FAULT for c in row] for row in codes]
+	return codes, fault
+
+
+def classify(errors, ndut):
+	"""
+	classification of the DUTs of a shuttle from the error codes of the test steps (see STATE.EVALUATE)
+	the classification includes only the DUT-relevant test steps (possible errors are Voltage high / low)
+	and not those which evaluate the tester (possible error code is ERR.TESTER_FAULT)
+	errors: error code list per store name, e.g. errors["GateErrorT4"] (see InlineTestPlan)
+	returns the error code of each DUT (ERR.PASSED / GS_SHORT / NOT_BONDED / DS_SHORT / UNKNOWN)
+	"""
+	PhaseErrorT3 = errors["PhaseErrorT3"]
+	SourceErrorT3 = errors["SourceErrorT3"]
+	GateErrorT4 = errors["GateErrorT4"]
+	SourceErrorT4 = errors["SourceErrorT4"]
+	GateErrorT5 = errors["GateErrorT5"]
+	SourceErrorT5 = errors["SourceErrorT5"]
+	SourceErrorT6 = errors["SourceErrorT6"]
+	status = []
+	for i in range(0, ndut):
+		if PhaseErrorT3[i] == ERR.PASSED and SourceErrorT3[i] == ERR.PASSED and GateErrorT4[i] == ERR.PASSED and SourceErrorT5[i] == ERR.PASSED and SourceErrorT6[i] == ERR.PASSED:
+			status.append(ERR.PASSED)
+		elif GateErrorT4[i] == ERR.VLOW and SourceErrorT4[i] == ERR.VHIGH and GateErrorT5[i] == ERR.VLOW:
+			status.append(ERR.GS_SHORT)
+		elif PhaseErrorT3[i] == ERR.VLOW and SourceErrorT3[i] == ERR.VHIGH and SourceErrorT5[i] == ERR.VLOW:
+			status.append(ERR.NOT_BONDED)
+		elif SourceErrorT6[i] == ERR.VHIGH:
+			status.append(ERR.DS_SHORT)
+		else:
+			status.append(ERR.UNKNOWN)
+	return status
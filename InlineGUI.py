@@ -1,18 +1,27 @@
 from InlineClasses import MODE, STATUS, ERR, QGUI, NDUT, MEMCYC
 import re, tkinter, os, unicodedata, time
+from InlineTiming import timed
 
 class ShuttleGUI:
 	"""
-	tkinter is not threadsafe therefore the Inline statemachine and the Inline GUI share data via a queue
-	the queue is a class member of the statemachine class
-	the statemachine hands the queue over to the gui
-	the statemachine initializes an update in the gui by starting the function processIncoming
+	tkinter is not threadsafe therefore the Inline statemachine and the Inline GUI share data via a snapshot channel (see InlineSnapshot)
+	the snapshot channel is a class member of the statemachine class
+	the gui is built in the main thread after the logon (see run_gui in Inline.py), the statemachine doesn't know the gui
+	each new snapshot sets a flag, the tkinter thread polls the flag maxfps times per second and updates the display via processIncoming
 	"""
-	def __init__(self, Inmaster, inqueue, startTest, haltTest, exitTest, shuttle_up, shuttle_down, vphase_on, vphase_off, vphase_rev_off, vphase_rev_on, vgate_on, vgate_off, get_vgate, get_vphase, get_vsource):
+	def __init__(self, Inmaster, snapshots, startTest, haltTest, exitTest, shuttle_up, shuttle_down, vphase_on, vphase_off, vphase_rev_off, vphase_rev_on, vgate_on, vgate_off, get_vgate, get_vphase, get_vsource, maxfps = 10):
 		self.master = Inmaster
 		self.master.title("Inline Function Test SSSPR")
-		self.queue = inqueue
-		self.qObj = self.queue.get(0)
+		self.snapshots = snapshots
+		self.qObj = self.snapshots.latest()[1]
+		self.version = None			#version of the displayed snapshot, nothing displayed yet
+		#rendered state of the display: only labels whose text / colour changed are configured (see SetLabel)
+		self.rendered = {}			#label -> {"text": ..., "bg": ...}
+		self.renderedGrid = {}		#id of a label grid -> error codes shown in the grid
+		self.renderedStats = None	#counters shown in the statistics labels
+		#the display is only updated after a new snapshot has been published (see notify / poll)
+		self.MIN_FRAME = 1.0 / maxfps	#min. time in sec between two updates of the display (poll period)
+		self.notified = False			#an update is pending, set by the publishing thread
 		self.GateList = self.qObj[QGUI.Gate]
 		self.PhaseList = self.qObj[QGUI.Phase]
 		self.SourceList = self.qObj[QGUI.Source]
@@ -27,6 +36,8 @@ class ShuttleGUI:
 		self.Nds_short = self.qObj[QGUI.Nds_short]
 		self.State = self.qObj[QGUI.State]
 		self.PRG_MODE = self.qObj[QGUI.Mode]
+		self.Spc = self.qObj[QGUI.Spc]
+		self.SPC_LINES = 5				#lines of the SPC label (yield and the first alarms)
 
 		row = 3	#rows in a shuttle
 		col = 3 #colums in a shuttle
@@ -66,6 +77,8 @@ class ShuttleGUI:
 			self.tst_status.grid(row=0, column=3,  sticky="N", pady=PADy, padx =2*PADx)				
 			self.state_lbl = tkinter.Label(Inmaster, text = "TESTER STATE:", bg = "white", fg = "black", width = Lwidth, height = Lheight)
 			self.state_lbl.grid(row=1, column=3,  sticky="N", pady=PADy, padx =2*PADx)
+			self.spc_lbl = tkinter.Label(Inmaster, text = "SPC", bg = "grey", fg = "white", width = Lwidth, height = Lheight)
+			self.spc_lbl.grid(row=2, column=3,  sticky="N", pady=PADy, padx =2*PADx)
 
 				
 			#----------------------Start Programm--------------------------------------------------------------------------------------------				
@@ -166,6 +179,8 @@ class ShuttleGUI:
 				self.tst_status.grid(row=0, column=7,  sticky="N", pady=PADy, padx =2*PADx)				
 				self.state_lbl = tkinter.Label(Inmaster, text = "TESTER STATE:", bg = "white", fg = "black", width = Lwidth, height = Lheight)
 				self.state_lbl.grid(row=1, column=7,  sticky="N", pady=PADy, padx =2*PADx)
+				self.spc_lbl = tkinter.Label(Inmaster, text = "SPC", bg = "grey", fg = "white", width = Lwidth, height = Lheight)
+				self.spc_lbl.grid(row=2, column=7,  sticky="N", pady=PADy, padx =2*PADx)
 				self.stat_tot = tkinter.Label(Inmaster, text = "DUTs TOTAL: ", bg = "yellow", fg = "black", width = Lwidth, height = Lheight)
 				self.stat_tot.grid(row=3, column=7, sticky="N", pady=PADy, padx = 2*PADx)
 				self.stat_pass = tkinter.Label(Inmaster, text = "DUTs PASSED: ", bg = "green", fg = "white", width = Lwidth, height = Lheight)
@@ -191,12 +206,44 @@ class ShuttleGUI:
 				self.exitbutton = tkinter.Button(Inmaster, text="Exit Test", command=exitTest, width = Lwidth, height = Lheight)
 				self.exitbutton.grid(row=8, column=2,  sticky="N", pady=PADy, padx =PADx)
 		#Buttons for Service and Production 
+
+		self.snapshots.subscribe(self.notify)
+		self.processIncoming()
+		self.master.after(int(self.MIN_FRAME * 1000), self.poll)
+
+	#called in the thread which publishes a snapshot: only the flag is set, tkinter is not called from other threads
+	#(event_generate can raise in a non-tkinter thread, e.g. while the window is closed)
+	def notify(self, version):
+		self.notified = True
+
+	#update of the display in the tkinter thread, the flag is polled maxfps times per second,
+	#several snapshots published between two polls are coalesced into one update
+	def poll(self):
+		if self.notified:
+			self.notified = False
+			self.processIncoming()
+		self.master.after(int(self.MIN_FRAME * 1000), self.poll)
 			
+	#configure text / background of a label only if they differ from the rendered state
+	def SetLabel(self, label, **options):
+		shown = self.rendered.setdefault(label, {})
+		changed = {}
+		for key in options:
+			if shown.get(key) != options[key]:
+				changed[key] = options[key]
+		if changed:
+			label.configure(**changed)
+			shown.update(changed)
+
 	#ResVec contains pass / fail for each DUT (of current shuttle, N-1, N-2, N-3, etc. shuttle)
 	#UpGrid is the Label-Grid whose colours, values etc. are to be updated ( current shuttle, N-1, N-2, N-3, etc. shuttle)
 	def UpdConLbl(self, ResVec, UpGrid):
 		row = 3
 		col = 3
+		#nothing to do if the grid shows these error codes already
+		if self.renderedGrid.get(id(UpGrid)) == tuple(ResVec):
+			return
+		self.renderedGrid[id(UpGrid)] = tuple(ResVec)
 		for r in range(0, row):
 			for c in range(0, col):
 				index = int(r*row + c + 1)
@@ -226,35 +273,40 @@ class ShuttleGUI:
 				else:
 					c_back = "red"
 
-				UpGrid[r*row + c].configure(text ="\nMo%i\nError Code: %i" % (index, ResVec[index-1]))
-				UpGrid[r*row + c].configure(bg = c_back)
+				self.SetLabel(UpGrid[r*row + c], text ="\nMo%i\nError Code: %i" % (index, ResVec[index-1]), bg = c_back)
 
 	
+	@timed("GUIRender")
 	def processIncoming(self):
 		"""
-		Function is called periodically
-		job: Update Inline Test data by getting the qObject out of the queue, assigning it to the correct variable
+		Function is called after a new snapshot has been published (see poll)
+		job: Update Inline Test data with the newest snapshot, assigning it to the correct variable
 		and after that update the display
+		the display is only updated if a new snapshot has been published since the last call
 		"""
 		row = 3
 		col = 3
 		
-		while not self.queue.empty():
-			msg = self.queue.get(0)
-			self.GateList = msg[QGUI.Gate]
-			self.PhaseList = msg[QGUI.Phase]
-			self.SourceList = msg[QGUI.Source]
-			self.EvalRes = msg[QGUI.Dutstatus]
-			self.EvalRes_Old = msg[QGUI.Dutstati_Old]
-			self.TesterState = msg[QGUI.TesterState]
-			self.Ntot = msg[QGUI.Ntot]
-			self.Npass = msg[QGUI.Npass]
-			self.Nfail = msg[QGUI.Nfail]
-			self.Ngs_short = self.qObj[QGUI.Ngs_short]
-			self.Nnot_bonded = self.qObj[QGUI.Nnot_bonded]
-			self.Nds_short = self.qObj[QGUI.Nds_short]			
-			self.State = self.qObj[QGUI.State]
-			self.PRG_MODE = self.qObj[QGUI.Mode]
+		version, msg = self.snapshots.latest()
+		if version == self.version:
+			return
+		self.version = version
+		self.qObj = msg
+		self.GateList = msg[QGUI.Gate]
+		self.PhaseList = msg[QGUI.Phase]
+		self.SourceList = msg[QGUI.Source]
+		self.EvalRes = msg[QGUI.Dutstatus]
+		self.EvalRes_Old = msg[QGUI.Dutstati_Old]
+		self.TesterState = msg[QGUI.TesterState]
+		self.Ntot = msg[QGUI.Ntot]
+		self.Npass = msg[QGUI.Npass]
+		self.Nfail = msg[QGUI.Nfail]
+		self.Ngs_short = msg[QGUI.Ngs_short]
+		self.Nnot_bonded = msg[QGUI.Nnot_bonded]
+		self.Nds_short = msg[QGUI.Nds_short]
+		self.State = msg[QGUI.State]
+		self.PRG_MODE = msg[QGUI.Mode]
+		self.Spc = msg[QGUI.Spc]
 
 		#Update the Error Vectors
 		if self.PRG_MODE == MODE.PRODUCTION:
@@ -289,28 +341,38 @@ class ShuttleGUI:
 						index = 6
 					elif (r*row + c + 1) == 6:
 						index = 4
-					self.console[index-1].configure(text ="Mo%i:\n\tVGate: %2.3f V\n\tVPhase: %2.3f V\n\tVSource: %2.3f V\n\tErrorCode: %i" % (index, self.GateList[index-1], self.PhaseList[index-1], self.SourceList[index-1], self.EvalRes[index-1]))
-					self.console[index-1].configure(bg = c_back)
+					self.SetLabel(self.console[index-1], text ="Mo%i:\n\tVGate: %2.3f V\n\tVPhase: %2.3f V\n\tVSource: %2.3f V\n\tErrorCode: %i" % (index, self.GateList[index-1], self.PhaseList[index-1], self.SourceList[index-1], self.EvalRes[index-1]), bg = c_back)
 
 		#--------------Configure tester status------------------------------
 		if self.TesterState == STATUS.PASSED:
 			c_back = "green"
 		else: #self.TesterState == STATUS.ERROR / STATUS.NORES:
 			c_back = "red"
-		self.tst_status.configure(bg = c_back)
+		self.SetLabel(self.tst_status, bg = c_back)
 		#--------------Configure tester status------------------------------
 		
 		#-------------Configure State Info----------------------------------
-		self.state_lbl.configure(text = "TESTER STATE:\n %s" % repr(self.State))
+		self.SetLabel(self.state_lbl, text = "TESTER STATE:\n %s" % repr(self.State))
 		
 		#-------------Configure State Info----------------------------------
+
+		#-------------Configure SPC-----------------------------------------
+		#first line: yield of the line, further lines: active alarms (red)
+		lines = list(self.Spc[0:self.SPC_LINES])
+		if len(self.Spc) > self.SPC_LINES:
+			lines[-1] = "+%i alarms" % (len(self.Spc) - self.SPC_LINES + 1)
+		self.SetLabel(self.spc_lbl, text = "\n".join(lines), bg = "red" if len(self.Spc) > 1 else "green")
+		#-------------Configure SPC-----------------------------------------
 		
 		#--------------Configure Stats--------------------------------------
-		self.stat_tot.configure(text = "DUTs TOTAL: \n %i" % self.Ntot)
-		self.stat_pass.configure(text ="DUTs PASSED: \n %i" % self.Npass)
-		self.stat_fail.configure(text ="DUTs FAILED: \n %i" % self.Nfail)
-		self.stat_gsshort.configure(text = "DUTs GS Short: \n %i" % self.Ngs_short)
-		self.stat_dsshort.configure(text = "DUTs DS Short: \n %i" % self.Nds_short)
-		self.stat_notbonded.configure(text = "DUTs Not Bonded: \n %i" % self.Nnot_bonded)
+		stats = (self.Ntot, self.Npass, self.Nfail, self.Ngs_short, self.Nds_short, self.Nnot_bonded)
+		if stats != self.renderedStats:
+			self.renderedStats = stats
+			self.SetLabel(self.stat_tot, text = "DUTs TOTAL: \n %i" % self.Ntot)
+			self.SetLabel(self.stat_pass, text ="DUTs PASSED: \n %i" % self.Npass)
+			self.SetLabel(self.stat_fail, text ="DUTs FAILED: \n %i" % self.Nfail)
+			self.SetLabel(self.stat_gsshort, text = "DUTs GS Short: \n %i" % self.Ngs_short)
+			self.SetLabel(self.stat_dsshort, text = "DUTs DS Short: \n %i" % self.Nds_short)
+			self.SetLabel(self.stat_notbonded, text = "DUTs Not Bonded: \n %i" % self.Nnot_bonded)
 		#--------------Configure Stats--------------------------------------
 	
\ No newline at end of file
@@ -0,0 +1,360 @@
+"""
+Company: 				HE-System Electronic
+ModuleName: 			InlineHW
+Path: 					C:\Python34
+Python version: 		Python 3.4
+Content:				Hardware access layer of the inline tester
+
+The state machine does not call the ljm library directly but a backend object with the same function names:
+	LJMBackend:		real Labjack T7 modules via the ljm library (production)
+	SimT7Backend:	simulated Labjack T7 modules and tester mechanics (offline runs, profiling, benchmarking)
+
+The simulated backend models
+	1. USB latency per ljm call
+	2. settling curves of the analog inputs after a relay has been switched or the needles have been contacted
+	3. travel time of the shuttle valve, read by SHUTTLE_VALVE_UPPER_POS / SHUTTLE_VALVE_LOWER_POS
+	4. arrival of shuttles at the inductive sensor SHUTTLE_AVLBL
+	5. a configurable population of defective DUTs (GS short, DS short, not bonded)
+"""
+try:
+	from labjack import ljm
+except ImportError:
+	ljm = None		#Labjack drivers are not installed, only SimT7Backend can be used
+from InlineClasses import Ports, ERR, NDUT, states, position
+import threading
+import random
+import math
+import time
+
+
+class LJMBackend:
+	"""
+	Real Labjack T7 modules, the calls are handed directly to the ljm library
+	"""
+	def __init__(self):
+		if ljm is None:
+			raise ImportError("LJMBackend: the labjack ljm library is not installed, use SimT7Backend for offline runs")
+
+	def openS(self, deviceType, connectionType, identifier):
+		return ljm.openS(deviceType, connectionType, identifier)
+
+	def getHandleInfo(self, handle):
+		return ljm.getHandleInfo(handle)
+
+	def close(self, handle):
+		return ljm.close(handle)
+
+	def namesToAddresses(self, numFrames, aNames):
+		return ljm.namesToAddresses(numFrames, aNames)
+
+	def eReadName(self, handle, name):
+		return ljm.eReadName(handle, name)
+
+	def eWriteName(self, handle, name, value):
+		return ljm.eWriteName(handle, name, value)
+
+	def eReadAddresses(self, handle, numFrames, aAddresses, aDataTypes):
+		return ljm.eReadAddresses(handle, numFrames, aAddresses, aDataTypes)
+
+	def eStreamStart(self, handle, scansPerRead, numAddresses, aScanList, scanRate):
+		return ljm.eStreamStart(handle, scansPerRead, numAddresses, aScanList, scanRate)
+
+	def eStreamRead(self, handle):
+		return ljm.eStreamRead(handle)
+
+	def eStreamStop(self, handle):
+		return ljm.eStreamStop(handle)
+
+
+#Modbus addresses and data types of the T7 registers which are used by the tester
+AIN_ADDR = 0			#AINn: address 2*n, FLOAT32
+DIO_ADDR = 2000			#DIOn: address 2000+n, UINT16
+DIO_STATE_ADDR = 2800	#DIO_STATE: all digital IOs as bitmask, UINT32
+UINT16 = 0
+UINT32 = 1
+FLOAT32 = 3
+
+
+class SimT7Backend:
+	"""
+	Simulated Labjack T7 modules of one inline tester
+
+	the first opened handle is module 1 (relays, valves, sensors, AIN_GATEMO / AIN_PHASEMO1..5)
+	the second opened handle is module 2 (AIN_PHASEMO6..9, AIN_SOURCEMO)
+	this is the order in which InlineStateMachine opens SN_LJM1 and SN_LJM2
+
+	usb_latency:	time in sec per ljm call (one USB round trip)
+	frame_time:		additional time in sec per frame of a batched call
+	travel_time:	time in sec the shuttle valve needs from one end position to the other
+	arrival_time:	time in sec from releasing a shuttle (stopper down) to the arrival of the next shuttle
+	relay_tau:		time constant in sec of the analog inputs after switching a relay
+	contact_tau:	time constant in sec of the analog inputs after the needles have contacted the DUTs
+	noise:			standard deviation in V of the analog inputs
+	defects:		probability per DUT for each error class, e.g. {ERR.GS_SHORT: 0.01, ERR.DS_SHORT: 0.005, ERR.NOT_BONDED: 0.02}
+	seed:			seed for the random generator, the same seed reproduces the same DUT population and noise
+	clock:			object with the functions time() and sleep(), default is the time module
+	"""
+	def __init__(self, usb_latency = 0.001, frame_time = 0.00002, travel_time = 0.25, arrival_time = 1.0, relay_tau = 0.02, contact_tau = 0.1, noise = 0.0005, defects = None, seed = None, clock = time):
+		self.usb_latency = usb_latency
+		self.frame_time = frame_time
+		self.travel_time = travel_time
+		self.arrival_time = arrival_time
+		self.relay_tau = relay_tau
+		self.contact_tau = contact_tau
+		self.noise = noise
+		if defects is None:
+			defects = {ERR.GS_SHORT: 0.01, ERR.DS_SHORT: 0.005, ERR.NOT_BONDED: 0.02}
+		self.defects = defects
+		self.rng = random.Random(seed)
+		self.clock = clock
+		self.lock = threading.Lock()
+
+		self.handles = {}				#handle -> module number 1 / 2
+		self.serials = {}				#handle -> serial number
+		self.streams = {}				#handle -> [scansPerRead, scan list, scanRate, time of the next scan]
+		self.nexthandle = 1
+
+		now = self.clock.time()
+		self.dio = [states.CLEAR] * 23	#output states of module 1
+		self.valve_pos = position.DOWN		#target position of the shuttle valve
+		self.valve_t0 = now - travel_time	#time at which the shuttle valve was switched
+		self.contacted = False			#needles are contacted if the shuttle valve has reached its upper position
+		self.shuttle = False			#a shuttle is at the inductive sensor
+		self.next_arrival = now + arrival_time
+		self.shuttles = 0				#number of shuttles which have arrived
+		self.DUTCLASS = [ERR.PASSED] * NDUT
+
+		#analog signals: VGate[0..8], VPhase[9..17], VSource[18..26] first order response from start to target since t0
+		self.sig_start = [float(0)] * 3 * NDUT
+		self.sig_target = [float(0)] * 3 * NDUT
+		self.sig_t0 = now
+		self.sig_tau = relay_tau
+
+	#------------------------------------------------model of the tester------------------------------------------------------
+	def _dut_targets(self, err, G, P, R, U):
+		"""steady state voltages (VGate, VPhase, VSource) at the AINs of one DUT
+		G: VGate on, P: VPhase on, R: VPhase reverse off (phase in correct direction), U: needles contacted
+		the values are the nominal values of the test steps in InlineStateMachine.state_machine
+		"""
+		if not U:
+			#needles are not contacted, only the tester voltages are measured
+			gate = 5.75 if G else 0.0
+			phase = (7.8 if R else -7.8) if P else 0.0
+			return gate, phase, 0.0
+		if P and not R:
+			#phase reversed: MOSFETs are used as intrinsic diodes
+			gate, phase, source = (5.22 if G else -0.185), -7.5, -0.67
+			if err == ERR.NOT_BONDED:
+				phase, source = -7.8, -0.3
+		elif P and R:
+			if G:
+				gate, phase, source = 5.3, 7.5, 0.765
+				if err == ERR.GS_SHORT:
+					gate, source = 0.5, 0.16
+			else:
+				gate, phase, source = 0.07, 7.77, 0.16
+				if err == ERR.DS_SHORT:
+					source = 0.765
+			if err == ERR.NOT_BONDED:
+				source = 0.0
+		else:
+			gate, phase, source = (5.22, 0.04, 0.07) if G else (0.0, 0.0, 0.0)
+			if err == ERR.GS_SHORT and G:
+				gate, source = 0.5, 0.5
+		return gate, phase, source
+
+	def _value(self, i, t):
+		dt = max(t - self.sig_t0, 0.0)
+		start = self.sig_start[i]
+		target = self.sig_target[i]
+		if dt > 20 * self.sig_tau:
+			return target
+		return target + (start - target) * math.exp(-dt / self.sig_tau)
+
+	def _transition(self, t, tau):
+		#freeze the analog signals at time t and let them settle to the targets of the new tester state
+		G = self.dio[Ports.DOUT_VGATE_ON] == states.SET
+		P = self.dio[Ports.DOUT_VPHASE_ON] == states.SET
+		R = self.dio[Ports.DOUT_VPHASE_REV_OFF] == states.SET
+		U = self.contacted
+		for i in range(0, 3 * NDUT):
+			self.sig_start[i] = self._value(i, t)
+		for i in range(0, NDUT):
+			gate, phase, source = self._dut_targets(self.DUTCLASS[i], G, P, R, U)
+			self.sig_target[i] = gate
+			self.sig_target[NDUT + i] = phase
+			self.sig_target[2 * NDUT + i] = source
+		self.sig_t0 = t
+		self.sig_tau = tau
+
+	def _update(self, now):
+		#events which happen without a call: valve reaches its end position, next shuttle arrives
+		reached = now - self.valve_t0 >= self.travel_time
+		contacted = reached and self.valve_pos == position.UP
+		if contacted != self.contacted:
+			self.contacted = contacted
+			self._transition(min(now, self.valve_t0 + self.travel_time), self.contact_tau if contacted else self.relay_tau)
+		if not self.shuttle and now >= self.next_arrival:
+			self.shuttle = True
+			self.shuttles += 1
+			self._new_population()
+			self._transition(now, self.relay_tau)
+
+	def _new_population(self):
+		for i in range(0, NDUT):
+			self.DUTCLASS[i] = ERR.PASSED
+			p = self.rng.random()
+			for err in self.defects:
+				if p < self.defects[err]:
+					self.DUTCLASS[i] = err
+					break
+				p -= self.defects[err]
+
+	def _digital(self, dioport):
+		now = self.clock.time()
+		reached = now - self.valve_t0 >= self.travel_time
+		#the sensors are low active: CLEAR = shuttle valve is in this end position / shuttle is available
+		if dioport == Ports.SHUTTLE_VALVE_UPPER_POS:
+			return states.CLEAR if (reached and self.valve_pos == position.UP) else states.SET
+		if dioport == Ports.SHUTTLE_VALVE_LOWER_POS:
+			return states.CLEAR if (reached and self.valve_pos == position.DOWN) else states.SET
+		if dioport == Ports.SHUTTLE_AVLBL:
+			return states.CLEAR if self.shuttle else states.SET
+		return self.dio[dioport]
+
+	def _analog(self, module, ain, now):
+		if module == 1:
+			if ain < NDUT:
+				i = ain						#AIN_GATEMO1..9
+			elif ain < 14:
+				i = NDUT + ain - 9			#AIN_PHASEMO1..5
+			else:
+				return 0.0
+		else:
+			if ain < 4:
+				i = NDUT + 5 + ain			#AIN_PHASEMO6..9
+			elif ain < 4 + NDUT:
+				i = 2 * NDUT + ain - 4		#AIN_SOURCEMO1..9
+			else:
+				return 0.0
+		return self._value(i, now) + self.rng.gauss(0.0, self.noise)
+
+	def _write_dio(self, module, dioport, value):
+		if module != 1:
+			return
+		now = self.clock.time()
+		self.dio[dioport] = int(value)
+		if dioport == Ports.SHUTTLE_VALVE:
+			if int(value) != self.valve_pos:
+				self.valve_pos = int(value)
+				self.valve_t0 = now
+				if self.contacted:
+					#needles are released as soon as the shuttle valve moves down
+					self.contacted = False
+					self._transition(now, self.relay_tau)
+		elif dioport == Ports.STOPPER_VALVE:
+			if int(value) == position.DOWN and self.shuttle:
+				#shuttle is released, the next one arrives after arrival_time
+				self.shuttle = False
+				self.next_arrival = now + self.arrival_time
+		elif dioport in (Ports.DOUT_VGATE_ON, Ports.DOUT_VPHASE_ON, Ports.DOUT_VPHASE_REV_OFF):
+			self._transition(now, self.relay_tau)
+
+	def _usb(self, numFrames):
+		self.clock.sleep(self.usb_latency + numFrames * self.frame_time)
+
+	def _read_address(self, module, address, now):
+		if address == DIO_STATE_ADDR:
+			if module != 1:
+				return 0
+			mask = 0
+			for p in range(0, len(self.dio)):
+				if self._digital(p):
+					mask |= 1 << p
+			return mask
+		if address >= DIO_ADDR:
+			return self._digital(address - DIO_ADDR) if module == 1 else states.SET
+		return self._analog(module, (address - AIN_ADDR) // 2, now)
+
+	def _address(self, name):
+		if name == "DIO_STATE":
+			return DIO_STATE_ADDR, UINT32
+		if name.startswith("DIO"):
+			return DIO_ADDR + int(name[3:]), UINT16
+		if name.startswith("AIN"):
+			return AIN_ADDR + 2 * int(name[3:]), FLOAT32
+		raise ValueError("SimT7Backend: register %s is not simulated" % name)
+
+	#------------------------------------------------ljm functions-------------------------------------------------------------
+	def openS(self, deviceType, connectionType, identifier):
+		self._usb(0)
+		with self.lock:
+			handle = self.nexthandle
+			self.nexthandle += 1
+			self.handles[handle] = len(self.handles) + 1
+			self.serials[handle] = int(identifier)
+		return handle
+
+	def getHandleInfo(self, handle):
+		#deviceType T7, connectionType USB, serial number, IP address, port, max bytes per Modbus packet
+		return 7, 1, self.serials[handle], 0, 0, 64
+
+	def close(self, handle):
+		with self.lock:
+			del self.handles[handle]
+		return None
+
+	def namesToAddresses(self, numFrames, aNames):
+		addresses = list(range(0, numFrames))
+		datatypes = list(range(0, numFrames))
+		for i in range(0, numFrames):
+			addresses[i], datatypes[i] = self._address(aNames[i])
+		return addresses, datatypes
+
+	def eReadName(self, handle, name):
+		address, datatype = self._address(name)
+		return self.eReadAddresses(handle, 1, [address], [datatype])[0]
+
+	def eWriteName(self, handle, name, value):
+		address, datatype = self._address(name)
+		self._usb(1)
+		with self.lock:
+			self._update(self.clock.time())
+			if address >= DIO_ADDR and address < DIO_STATE_ADDR:
+				self._write_dio(self.handles[handle], address - DIO_ADDR, value)
+		return None
+
+	def eReadAddresses(self, handle, numFrames, aAddresses, aDataTypes):
+		self._usb(numFrames)
+		with self.lock:
+			module = self.handles[handle]
+			now = self.clock.time()
+			self._update(now)
+			return [self._read_address(module, aAddresses[i], now) for i in range(0, numFrames)]
+
+	def eStreamStart(self, handle, scansPerRead, numAddresses, aScanList, scanRate):
+		self._usb(numAddresses)
+		with self.lock:
+			self.streams[handle] = [scansPerRead, list(aScanList[0:numAddresses]), float(scanRate), self.clock.time()]
+		return scanRate
+
+	def eStreamRead(self, handle):
+		"""returns scansPerRead scans (interleaved), the call blocks until the scans have been sampled by the device"""
+		scans, scanlist, rate, tnext = self.streams[handle]
+		tend = tnext + scans / rate
+		wait = tend - self.clock.time()
+		if wait > 0:
+			self.clock.sleep(wait)
+		self._usb(0)
+		with self.lock:
+			module = self.handles[handle]
+			self._update(self.clock.time())
+			data = [self._read_address(module, address, tnext + k / rate) for k in range(0, scans) for address in scanlist]
+			self.streams[handle][3] = tend
+		return data, 0, 0
+
+	def eStreamStop(self, handle):
+		self._usb(0)
+		with self.lock:
+			del self.streams[handle]
+		return None
@@ -0,0 +1,119 @@
+"""
+Company: 				HE-System Electronic
+ModuleName: 			InlineHistory
+Path: 					C:\Python34
+Python version: 		Python 3.4
+Content:				Error history of the shuttle positions and repetition error check
+
+The error codes of the last shuttles are kept in a ring buffer of depth shuttles x ndut positions,
+a new shuttle overwrites the oldest one instead of shifting the complete history.
+For each position the error code of the last shuttle and the number of successive shuttles with this error code are kept (run counter),
+in addition the number of occurrences of each error code within the ring buffer is counted (window counter).
+Both counters are updated when a shuttle is added, the repetition check costs one comparison per DUT.
+
+Repetition error (broken needle, cable connection, etc.): the same error code at the same position in rules[code] successive shuttles
+	e.g. rules = {ERR.GS_SHORT: 3, ...}: three GS-shorts in succession at position 6 stop the tester
+	a code without rule (or rule 0) is not checked, by default all error codes except PASSED / NORES are checked with MEMCYC
+The depth and the rules can be changed at runtime (set_depth / set_rule), e.g. via the command line -mem / -rep.
+"""
+from InlineClasses import ERR, NDUT, MEMCYC
+
+
+def default_rules(count = MEMCYC):
+	#repetition rule for all error codes of a failed DUT
+	rules = {}
+	for code in ERR:
+		if code != ERR.PASSED and code != ERR.NORES:
+			rules[code] = count
+	return rules
+
+
+class PositionHistory:
+	"""
+	ndut: positions per shuttle, depth: number of shuttles kept in the ring buffer
+	rules: {error code: number of successive shuttles}, default see default_rules
+	"""
+	def __init__(self, ndut = NDUT, depth = MEMCYC, rules = None):
+		self.NDUT = ndut
+		self.rules = default_rules() if rules is None else dict(rules)
+		self.last = [ERR.NORES] * ndut			#error code of the newest shuttle per position
+		self.run = [0] * ndut					#number of successive shuttles with the error code self.last per position
+		self.count = [dict() for i in range(0, ndut)]		#occurrences of each error code per position within the ring buffer
+		self.shuttles = 0						#number of added shuttles
+		self._alloc(depth)
+
+	def _alloc(self, depth):
+		self.depth = depth
+		self.ring = [ERR.NORES] * (depth * self.NDUT)
+		self.head = 0							#slot of the next shuttle
+		self.filled = 0							#number of shuttles in the ring buffer
+		for counts in self.count:
+			counts.clear()
+
+	def set_depth(self, depth):
+		#the newest shuttles (at most depth) are kept, the run counters are not affected
+		if depth < 1:
+			raise ValueError("depth of the position history must be at least 1")
+		kept = [self.shuttle(n) for n in range(min(depth, self.filled), 0, -1)]
+		self._alloc(depth)
+		for status in kept:
+			self._store(status)
+
+	def set_rule(self, code, count):
+		#count: number of successive shuttles with the error code code at the same position, 0: not checked
+		if count > 0:
+			self.rules[code] = count
+		else:
+			self.rules.pop(code, None)
+
+	def _store(self, status):
+		ndut = self.NDUT
+		base = self.head * ndut
+		for i in range(0, ndut):
+			counts = self.count[i]
+			if self.filled == self.depth:
+				old = self.ring[base + i]
+				counts[old] -= 1
+			code = status[i]
+			self.ring[base + i] = code
+			counts[code] = counts.get(code, 0) + 1
+		self.head = (self.head + 1) % self.depth
+		self.filled = min(self.filled + 1, self.depth)
+
+	def add(self, status):
+		"""
+		adds the error codes of a shuttle (one per position)
+		returns the positions (0 ... ndut - 1) with a repetition error
+		"""
+		self._store(status)
+		self.shuttles += 1
+		repeated = []
+		for i in range(0, self.NDUT):
+			code = status[i]
+			if code == self.last[i]:
+				self.run[i] += 1
+			else:
+				self.last[i] = code
+				self.run[i] = 1
+			rule = self.rules.get(code, 0)
+			if rule > 0 and self.run[i] >= rule:
+				repeated.append(i)
+		return repeated
+
+	def shuttle(self, n):
+		#error codes of shuttle N-n (n = 1: newest shuttle), NORES for shuttles which aren't in the ring buffer
+		if n < 1 or n > self.filled:
+			return [ERR.NORES] * self.NDUT
+		base = ((self.head - n) % self.depth) * self.NDUT
+		return self.ring[base:base + self.NDUT]
+
+	def recent(self, n):
+		#flat list of the error codes of shuttle N-1 ... N-n (n * ndut values, see QGUI.Dutstati_Old)
+		flat = []
+		for m in range(1, n + 1):
+			flat.extend(self.shuttle(m))
+		return flat
+
+	def occurrences(self, position, code):
+		#number of shuttles within the ring buffer with the error code code at the position (0 ... ndut - 1)
+		return self.count[position].get(code, 0)
@@ -0,0 +1,314 @@
+"""
+Company: 				HE-System Electronic
+ModuleName: 			InlineLog
+Path: 					C:\Python34
+Python version: 		Python 3.4
+Content:				Asynchronous logging to the network drive L:\ via a local spool
+
+The state machine must not wait for the network drive. All log data goes through two background threads:
+	1. spooler:		takes the writes from a bounded queue and appends them to a local spool file per target (local disk)
+	2. forwarder:	copies the new bytes of each spool file to its target on the network drive every FORWARD_PERIOD sec,
+					several writes are forwarded with one open / write / close of the target
+					if the network drive is not available the data stays in the spool and is forwarded later (retry with backoff)
+The forwarded position of each spool file is kept in the spool directory (forward.json), so that data isn't forwarded twice after a restart.
+The spool files remain as local copy of the logs.
+
+Backpressure: if the queue is full (the spooler can't keep up with the local disk) write() blocks until there is space again,
+at most MAX_BLOCK sec, then the write is dropped; the number of full events, the time the callers were blocked
+and the dropped writes are counted (see stats())
+Errors of the local disk (spool) or of the forward state file don't stop the threads: the write is lost, the error is counted,
+printed and returned once by take_error() (alarm of the state machine, see EvaluateShuttle).
+"""
+from InlineTiming import timed
+import json
+import ntpath
+import os
+import queue
+import threading
+import time
+
+FORWARD_PERIOD = 1.0		#sec between two forward cycles
+MAX_BACKOFF = 30.0			#max. sec between two forward attempts while the network drive isn't available
+MAX_BLOCK = 2.0				#max. sec a write waits for space in a full queue, the write is dropped afterwards
+
+
+class SpooledFile:
+	"""
+	file like object for text logs (write / flush / close / name), returned by LogWriter.open()
+	the data is written asynchronously, flush() and close() don't wait for the network drive
+	"""
+	def __init__(self, writer, target):
+		self.writer = writer
+		self.name = target
+
+	def write(self, data):
+		self.writer.write(self.name, data)
+
+	def flush(self):
+		#the spooler flushes the local files as soon as the queue is empty
+		pass
+
+	def close(self):
+		pass
+
+
+class LogWriter:
+	"""
+	spooldir: local directory of the spool files (created if it doesn't exist)
+	maxqueue: max. number of pending writes
+	"""
+	def __init__(self, spooldir, maxqueue = 1000, period = FORWARD_PERIOD):
+		self.spooldir = spooldir
+		os.makedirs(spooldir, exist_ok = True)
+		self.PERIOD = period
+		self.queue = queue.Queue(maxsize = maxqueue)
+		self.lock = threading.Lock()			#protects self.targets / self.forwarded and the counters
+		self.targets = {}						#local spool file -> target on the network drive
+		self.forwarded = {}						#local spool file -> number of bytes forwarded to the target
+		self.statefile = os.path.join(spooldir, "forward.json")
+		if os.path.exists(self.statefile):
+			with open(self.statefile, "r") as f:
+				state = json.load(f)
+			#spool files which have been forwarded completely and haven't been changed for a day are no longer watched
+			for localfile in state["targets"]:
+				try:
+					if state["forwarded"][localfile] == os.path.getsize(localfile) and os.path.getmtime(localfile) < time.time() - 86400:
+						continue
+				except OSError:
+					continue
+				self.targets[localfile] = state["targets"][localfile]
+				self.forwarded[localfile] = state["forwarded"][localfile]
+		self.files = {}							#open spool files of the spooler thread
+		#backpressure metrics
+		self.writes = 0							#number of writes
+		self.highwater = 0						#max. number of pending writes
+		self.fullcount = 0						#number of writes which found the queue full
+		self.blocktime = float(0)				#total time in sec the callers were blocked by a full queue
+		self.dropped = 0						#writes dropped after MAX_BLOCK sec in a full queue
+		self.spooled = 0						#bytes written to the spool
+		self.spoolerrors = 0					#writes which failed on the local disk
+		self.stateerrors = 0					#failed saves of the forward state file
+		self.error = None						#last error, not yet taken (see take_error)
+		self.forwardedbytes = 0					#bytes forwarded to the network drive since start
+		self.forwarderrors = 0					#number of failed forward attempts
+		self.forwardtime = float(0)				#duration of the last successful forward cycle in sec
+		self.shareok = True						#False while the network drive isn't available
+		self.wakeup = threading.Event()
+		self.stopping = False
+		self.spooler = threading.Thread(target=self._spool, daemon=True)
+		self.forwarder = threading.Thread(target=self._forward, daemon=True)
+		self.spooler.start()
+		self.forwarder.start()
+
+	def local(self, target):
+		#spool file of a target, e.g. L:\2026-10-18_Shuttles.ascii -> <spooldir>\2026-10-18_Shuttles.ascii
+		return os.path.join(self.spooldir, ntpath.basename(target))
+
+	def open(self, target, mode = "a"):
+		#mode "w": the target is overwritten, "a": the data is appended to the target
+		if mode == "w":
+			self._put(("truncate", target, None))
+		return SpooledFile(self, target)
+
+	def write(self, target, data):
+		self._put(("write", target, data))
+
+	def mirror(self, localfile, target):
+		"""
+		forward a file which is written by another writer (e.g. the results file) from the local disk to target
+		the file must only be appended, a file which gets shorter is forwarded again from the beginning
+		"""
+		with self.lock:
+			if self.targets.get(localfile) != target:
+				self.targets[localfile] = target
+				self.forwarded[localfile] = -1		#complete copy at the first forward
+
+	@timed("LogWrite")
+	def _put(self, item):
+		#called by the state machine and the evaluation worker, the counters are protected by the lock
+		try:
+			self.queue.put_nowait(item)
+			full = False
+		except queue.Full:
+			full = True
+		if full:
+			tblock = time.perf_counter()
+			try:
+				self.queue.put(item, timeout = MAX_BLOCK)
+				dropped = 0
+			except queue.Full:
+				dropped = 1
+			tblock = time.perf_counter() - tblock
+			if dropped > 0:
+				self._error("LogWriter: queue full for %2.1f sec, write to %s dropped" % (MAX_BLOCK, item[1]), None)
+		with self.lock:
+			self.writes += 1
+			if full:
+				self.fullcount += 1
+				self.blocktime += tblock
+				self.dropped += dropped
+			self.highwater = max(self.highwater, self.queue.qsize())
+
+	def _error(self, text, count):
+		#count: name of the error counter or None
+		print(text)
+		with self.lock:
+			if count is not None:
+				setattr(self, count, getattr(self, count) + 1)
+			self.error = text
+
+	def take_error(self):
+		#last error since the previous call (None: no error)
+		with self.lock:
+			error, self.error = self.error, None
+			return error
+
+	def _spool(self):
+		running = True
+		while running:
+			#all pending writes are spooled before the spool files are flushed
+			batch = [self.queue.get()]
+			while 1 == 1:
+				try:
+					batch.append(self.queue.get_nowait())
+				except queue.Empty:
+					break
+			for item in batch:
+				if item is None:
+					running = False
+					break
+				try:
+					self._spool_item(*item)
+				except OSError as e:
+					#the write is lost, the spool file is opened again with the next write
+					self._error("LogWriter: spool write to %s failed: %s" % (self.local(item[1]), repr(e)), "spoolerrors")
+					self._discard(self.local(item[1]))
+			#make the data visible for the forwarder
+			for localfile in list(self.files.keys()):
+				try:
+					self.files[localfile].flush()
+				except OSError as e:
+					self._error("LogWriter: spool flush of %s failed: %s" % (localfile, repr(e)), "spoolerrors")
+					self._discard(localfile)
+		for localfile in list(self.files.keys()):
+			self._discard(localfile)
+
+	def _discard(self, localfile):
+		#closes a spool file of the spooler thread
+		f = self.files.pop(localfile, None)
+		if f is not None:
+			try:
+				f.close()
+			except OSError:
+				pass
+
+	def _spool_item(self, command, target, data):
+		localfile = self.local(target)
+		if command == "truncate":
+			self._discard(localfile)
+			self.files[localfile] = open(localfile, "w")
+			with self.lock:
+				self.targets[localfile] = target
+				self.forwarded[localfile] = -1		#target is overwritten at the next forward
+		else:
+			if localfile not in self.files:
+				self.files[localfile] = open(localfile, "a")
+				with self.lock:
+					if localfile not in self.targets:
+						self.targets[localfile] = target
+						self.forwarded[localfile] = 0
+			self.files[localfile].write(data)
+			with self.lock:
+				self.spooled += len(data)
+
+	def _forward(self):
+		wait = self.PERIOD
+		while not self.stopping:
+			self.wakeup.wait(wait)
+			try:
+				forwarded = self._forward_all()
+			except Exception as e:
+				#the forwarder keeps running, the cycle is retried with backoff
+				self._error("LogWriter: forward failed: %s" % repr(e), "forwarderrors")
+				forwarded = False
+			if forwarded:
+				wait = self.PERIOD
+			else:
+				wait = min(wait * 2, MAX_BACKOFF)
+
+	@timed("LogForward")
+	def _forward_all(self):
+		"""copies the new data of all spool files to the targets, returns False if the network drive isn't available"""
+		tstart = time.perf_counter()
+		with self.lock:
+			jobs = [(localfile, self.targets[localfile], self.forwarded[localfile]) for localfile in self.targets]
+		changed = False
+		for localfile, target, start in jobs:
+			position = start
+			try:
+				size = os.path.getsize(localfile)
+			except OSError:
+				continue
+			if position >= 0 and size == position:
+				continue
+			try:
+				if position < 0 or size < position:
+					mode, position = "wb", 0
+				else:
+					mode = "ab"
+				with open(localfile, "rb") as src:
+					src.seek(position)
+					data = src.read(size - position)
+				with open(target, mode) as dst:
+					dst.write(data)
+			except OSError:
+				with self.lock:
+					self.forwarderrors += 1
+				self.shareok = False
+				return False
+			with self.lock:
+				#the target might have been truncated in the meantime, then it is forwarded again in the next cycle
+				if self.forwarded.get(localfile) == start:
+					self.forwarded[localfile] = size
+				self.forwardedbytes += len(data)
+			changed = True
+		self.shareok = True
+		if changed:
+			self.forwardtime = time.perf_counter() - tstart
+			try:
+				self._save_state()
+			except OSError as e:
+				#the data is forwarded, after a restart it might be forwarded again
+				self._error("LogWriter: forward state %s not saved: %s" % (self.statefile, repr(e)), "stateerrors")
+		return True
+
+	def _save_state(self):
+		with self.lock:
+			state = {"targets": dict(self.targets), "forwarded": dict(self.forwarded)}
+		with open(self.statefile + ".tmp", "w") as f:
+			json.dump(state, f)
+		if os.path.exists(self.statefile):
+			os.remove(self.statefile)
+		os.rename(self.statefile + ".tmp", self.statefile)
+
+	def stats(self):
+		#backpressure metrics, backlog: bytes in the spool which haven't been forwarded yet
+		with self.lock:
+			backlog = 0
+			for localfile in self.targets:
+				try:
+					backlog += max(os.path.getsize(localfile) - max(self.forwarded[localfile], 0), 0)
+				except OSError:
+					pass
+			return {"writes": self.writes, "pending": self.queue.qsize(), "highwater": self.highwater, "fullcount": self.fullcount,
+					"blocktime": self.blocktime, "dropped": self.dropped, "spooled": self.spooled, "spoolerrors": self.spoolerrors,
+					"forwarded": self.forwardedbytes, "backlog": backlog, "forwarderrors": self.forwarderrors, "stateerrors": self.stateerrors,
+					"forwardtime": self.forwardtime, "shareok": self.shareok}
+
+	def close(self, timeout = 5.0):
+		#writes the pending data to the spool and waits at most timeout sec for the last forward cycle, the writer can't be used afterwards
+		self.queue.put(None)
+		self.spooler.join()
+		self.stopping = True
+		self.wakeup.set()
+		self.forwarder.join(timeout)
@@ -0,0 +1,139 @@
+"""
+Company: 				HE-System Electronic
+ModuleName: 			InlineMetrics
+Path: 					C:\Python34
+Python version: 		Python 3.4
+Content:				Local HTTP endpoint with the tester metrics (Prometheus text format)
+
+python Inline.py -metrics 9100, then e.g. http://localhost:9100/metrics in a browser or as Prometheus scrape target
+	inline_shuttles_total / inline_duts_total{class=...}	counters since the start of the program
+	inline_shuttles_per_hour / inline_duts_per_hour		throughput within the last RATE_WINDOW sec
+	inline_state{state=...} / inline_tester_status{status=...}	current state of the state machine / tester status
+	inline_cycle_seconds / inline_shuttle_seconds			start to start time / test time of the shuttles, percentiles
+	inline_operation_seconds{operation=...}				latency of the tester operations (see InlineTiming), percentiles
+	inline_snapshots_total								published snapshots (changes of the tester data)
+The server runs in its own thread and only reads the newest snapshot (see InlineSnapshot) and copies of the timing histograms,
+the state machine and the GUI are never accessed. Only connections from the local computer are accepted (HOST).
+"""
+from InlineClasses import QGUI, NDUT, STATE, STATUS
+from InlineTiming import TIMING
+from collections import deque
+from http.server import HTTPServer, BaseHTTPRequestHandler
+import threading
+import time
+
+HOST = "127.0.0.1"
+RATE_WINDOW = 3600.0		#sec, throughput window
+SAMPLE_PERIOD = 10.0		#sec between two samples of the counters
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class _Handler(BaseHTTPRequestHandler):
+	def do_GET(self):
+		if self.path.split("?")[0] not in ("/", "/metrics"):
+			self.send_error(404)
+			return
+		body = self.server.metrics.render().encode("utf-8")
+		self.send_response(200)
+		self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, format, *args):
+		#no output to the console of the tester
+		pass
+
+
+class _Server(HTTPServer):
+	def service_actions(self):
+		#called by serve_forever() between the requests
+		self.metrics.sample()
+
+
+class MetricsServer:
+	"""
+	snapshots: SnapshotChannel of the state machine, port: TCP port on HOST
+	"""
+	def __init__(self, snapshots, port, ndut = NDUT, timing = TIMING, host = HOST):
+		self.snapshots = snapshots
+		self.NDUT = ndut
+		self.timing = timing
+		self.samples = deque()				#(monotonic time, number of DUTs tested)
+		self.lastsample = None
+		self.server = _Server((host, port), _Handler)
+		self.server.metrics = self
+		self.thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 1.0}, daemon=True)
+
+	def start(self):
+		self.thread.start()
+
+	def stop(self):
+		self.server.shutdown()
+		self.server.server_close()
+
+	def sample(self):
+		now = time.monotonic()
+		if self.lastsample is not None and now - self.lastsample < SAMPLE_PERIOD:
+			return
+		self.lastsample = now
+		version, snapshot = self.snapshots.latest()
+		self.samples.append((now, snapshot[QGUI.Ntot]))
+		while now - self.samples[0][0] > RATE_WINDOW:
+			self.samples.popleft()
+
+	def duts_per_hour(self):
+		#DUTs per hour within the samples of the last RATE_WINDOW sec (0 until two samples are available)
+		if len(self.samples) < 2:
+			return float(0)
+		(t0, n0), (t1, n1) = self.samples[0], self.samples[-1]
+		if t1 <= t0:
+			return float(0)
+		return (n1 - n0) * 3600.0 / (t1 - t0)
+
+	def render(self):
+		self.sample()
+		version, snapshot = self.snapshots.latest()
+		lines = []
+		def metric(name, kind, text, values):
+			#values: list of (labels, value)
+			lines.append("# HELP %s %s" % (name, text))
+			lines.append("# TYPE %s %s" % (name, kind))
+			for labels, value in values:
+				lines.append("%s%s %s" % (name, labels, repr(float(value))))
+
+		ntot = snapshot[QGUI.Ntot]
+		metric("inline_shuttles_total", "counter", "Tested shuttles", [("", ntot // self.NDUT)])
+		metric("inline_duts_total", "counter", "Tested DUTs per class", [
+			('{class="all"}', ntot),
+			('{class="passed"}', snapshot[QGUI.Npass]),
+			('{class="failed"}', snapshot[QGUI.Nfail]),
+			('{class="gs_short"}', snapshot[QGUI.Ngs_short]),
+			('{class="ds_short"}', snapshot[QGUI.Nds_short]),
+			('{class="not_bonded"}', snapshot[QGUI.Nnot_bonded])])
+		duts = self.duts_per_hour()
+		metric("inline_shuttles_per_hour", "gauge", "Shuttles per hour within the last %i sec" % RATE_WINDOW, [("", duts / self.NDUT)])
+		metric("inline_duts_per_hour", "gauge", "DUTs per hour within the last %i sec" % RATE_WINDOW, [("", duts)])
+		metric("inline_state", "gauge", "Current state of the state machine", [('{state="%s"}' % s.name, 1 if s == snapshot[QGUI.State] else 0) for s in STATE])
+		metric("inline_tester_status", "gauge", "Current tester status", [('{status="%s"}' % s.name, 1 if s == snapshot[QGUI.TesterState] else 0) for s in STATUS])
+		metric("inline_snapshots_total", "counter", "Number of published snapshots", [("", version)])
+
+		for name, op, text in (("inline_cycle_seconds", "Cycle", "Start to start time of successive shuttles"),
+								("inline_shuttle_seconds", "Shuttle", "Test time per shuttle")):
+			h = self.timing.histogram(op)
+			metric(name, "summary", text, self._summary("", h))
+		values = []
+		for op in self.timing.names():
+			values.extend(self._summary('operation="%s"' % op, self.timing.histogram(op)))
+		metric("inline_operation_seconds", "summary", "Latency of the tester operations", values)
+		return "\n".join(lines) + "\n"
+
+	def _summary(self, labels, h):
+		#quantiles (upper bounds of the histogram buckets), _sum and _count as in a Prometheus summary
+		if h is None:
+			return []
+		sep = "," if labels else ""
+		values = [('{%s%squantile="%s"}' % (labels, sep, q), h.percentile(q)) for q in QUANTILES]
+		values.append(('_sum{%s}' % labels if labels else "_sum", h.total))
+		values.append(('_count{%s}' % labels if labels else "_count", h.count))
+		return values
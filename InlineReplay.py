@@ -0,0 +1,277 @@
+"""
+Company: 				HE-System Electronic
+ModuleName: 			InlineReplay
+Path: 					C:\Python34
+Python version: 		Python 3.4
+Content:				Offline re-evaluation of recorded shuttles with candidate limits (what-if yield)
+
+The daily results files (see InlineStore) contain the raw voltages of each test step and the DUTSTATUS of each shuttle.
+The replay evaluates the raw voltages again with a candidate limit set (evaluate_step of each test step, classify as in STATE.EVALUATE)
+and compares the new classification of each DUT with the recorded one:
+	yield and number of DUTs per class (recorded / candidate / delta) per day or per lot
+	the DUTs which changed their class (recorded class -> candidate class)
+The candidate limits are those of TESTPLAN with changed low / high limits of single channel groups, e.g.
+	python InlineReplay.py -set "Fct G-ON Ph-OFF" Gate 5.15 5.30 L:\
+	python InlineReplay.py -limits candidate.json -by lot -from 2026-10-01 -to 2026-10-18 L:\
+	candidate.json: {"Fct G-ON Ph-OFF": {"Gate": [5.15, 5.30]}, ...}, a limit may be a list with one value per channel
+The files are split into blocks of CHUNK shuttles which are evaluated by a pool of processes (-p, default: number of CPUs),
+so that a large file or a single lot is distributed as well as many days. Only the test steps which store error codes
+for the classification are evaluated, the tester faults (selftest steps) are not replayed.
+The raw voltages are stored after the calibration, i.e. the replay uses the calibration which was active during the test.
+"""
+from InlineClasses import ERR, QGUI
+from InlineTestPlan import TESTPLAN
+from InlineEval import limit_arrays, evaluate_step, classify
+from InlineStore import ResultReader, NGROUPS
+import argparse
+import copy
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+CHUNK = 20000			#shuttles per task of the process pool
+RAW_GROUP = {QGUI.Gate: 0, QGUI.Phase: 1, QGUI.Source: 2}		#order of the channel groups in the raw voltages (see InlineStateMachine.RAW_GROUP)
+CLASSES = (ERR.PASSED, ERR.GS_SHORT, ERR.NOT_BONDED, ERR.DS_SHORT, ERR.UNKNOWN)
+
+
+def candidate_plan(changes, plan = TESTPLAN):
+	"""
+	copy of the test plan with changed limits
+	changes: {step name: {group name ("Gate", "Phase", "Source"): (low, high)}}, None keeps the limit, e.g. (None, 5.30)
+	"""
+	plan = copy.deepcopy(plan)
+	steps = dict([(step["name"], step) for step in plan])
+	for name, groups in changes.items():
+		if name not in steps:
+			raise ValueError("test step %s not in the test plan" % name)
+		limits = steps[name]["limits"]
+		for group, (low, high) in groups.items():
+			k = [n for n in range(0, len(limits)) if limits[n][0] == QGUI[group]]
+			if len(k) == 0:
+				raise ValueError("test step %s has no limits for %s" % (name, group))
+			limit = list(limits[k[0]])
+			if low is not None:
+				limit[1] = low
+			if high is not None:
+				limit[3] = high
+			limits[k[0]] = tuple(limit)
+	return plan
+
+
+def replay_steps(plan, ndut):
+	"""
+	limits of the test steps which are required for the classification, with the offset of the raw voltages of each group
+	returns the number of evaluated steps (steps with limits, index of the raw voltages) and a list of
+	(offsets, low, erronlow, high, erronhigh, stores) per step (only the groups with a store)
+	"""
+	steps = []
+	nsteps = 0
+	for step in plan:
+		if len(step["limits"]) == 0:
+			continue
+		stored = [limit for limit in step["limits"] if limit[5] is not None]
+		if len(stored) > 0:
+			groups, low, erronlow, high, erronhigh, stores = limit_arrays(stored, ndut)
+			offsets = tuple([(nsteps * NGROUPS + RAW_GROUP[group]) * ndut for group in groups])
+			steps.append((offsets, low, erronlow, high, erronhigh, stores))
+		nsteps += 1
+	return nsteps, steps
+
+
+def _new_counts():
+	return {"shuttles": 0, "duts": 0, "recorded": {}, "candidate": {}, "moved": {}}
+
+
+def _add(counts, key, n):
+	counts[key] = counts.get(key, 0) + n
+
+
+def replay_block(task):
+	"""
+	evaluates the shuttles first ... last of a results file (worker of the process pool)
+	task: (filename, first, last, plan, by, lots), by: "day" or "lot", lots: set of lot codes or None (all lots)
+	returns {day or lot: counts}, the error codes are counted as int
+	"""
+	filename, first, last, plan, by, lots = task
+	results = {}
+	with ResultReader(filename) as reader:
+		nsteps, steps = replay_steps(plan, reader.NDUT)
+		if nsteps != reader.NSTEPS:
+			raise ValueError("%s: %i test steps recorded, %i in the test plan" % (filename, reader.NSTEPS, nsteps))
+		ndut = reader.NDUT
+		nraw = reader.NRAW
+		day = results_day(filename)
+		unpack = reader.record.unpack_from
+		size = reader.record.size
+		offset = reader.HEADER_SIZE + (first - 1) * size
+		for shuttle in range(first, last + 1):
+			values = unpack(reader.map, offset)
+			offset += size
+			lot = values[2].rstrip(b"\0").decode("utf-8", "replace")
+			if lots is not None and lot not in lots:
+				continue
+			raw = values[6:6 + nraw]
+			recorded = values[6 + nraw:]
+			errors = {}
+			for offsets, low, erronlow, high, erronhigh, stores in steps:
+				matrix = [raw[o:o + ndut] for o in offsets]
+				codes, fault = evaluate_step(matrix, low, erronlow, high, erronhigh)
+				for k in range(0, len(stores)):
+					errors[stores[k]] = codes[k]
+			status = classify(errors, ndut)
+			key = day if by == "day" else lot
+			counts = results.get(key)
+			if counts is None:
+				counts = results[key] = _new_counts()
+			counts["shuttles"] += 1
+			for i in range(0, ndut):
+				if recorded[i] == ERR.NORES:
+					continue
+				new = int(status[i])
+				counts["duts"] += 1
+				_add(counts["recorded"], recorded[i], 1)
+				_add(counts["candidate"], new, 1)
+				if new != recorded[i]:
+					_add(counts["moved"], (recorded[i], new), 1)
+	return results
+
+
+def merge(total, results):
+	for key, counts in results.items():
+		t = total.get(key)
+		if t is None:
+			t = total[key] = _new_counts()
+		t["shuttles"] += counts["shuttles"]
+		t["duts"] += counts["duts"]
+		for name in ("recorded", "candidate", "moved"):
+			for code, n in counts[name].items():
+				_add(t[name], code, n)
+	return total
+
+
+def results_day(filename):
+	#day of a results file incl. the station ID of the supervisor, e.g. "2026-10-18" or "L1_2026-10-18" (see InlineSupervisor)
+	#the parts of a day (_Results_2.bin, ... after a change of the test plan, see ResultWriter) belong to the same day
+	return os.path.basename(filename).rsplit("_Results", 1)[0]
+
+
+def find_files(paths, first = None, last = None):
+	#results files of the paths (files or directories), optionally only the days first ... last (YYYY-MM-DD)
+	files = []
+	for path in paths:
+		if os.path.isdir(path):
+			files.extend(glob.glob(os.path.join(path, "*_Results*.bin")))
+		else:
+			files.append(path)
+	files = [f for f in files if (first is None or results_day(f)[-10:] >= first) and (last is None or results_day(f)[-10:] <= last)]
+	return sorted(files, key = os.path.basename)
+
+
+def tasks(files, plan, by, lots, chunk = CHUNK):
+	#one task per block of chunk shuttles
+	blocks = []
+	for filename in files:
+		with ResultReader(filename) as reader:
+			count = len(reader)
+		for first in range(1, count + 1, chunk):
+			blocks.append((filename, first, min(first + chunk - 1, count), plan, by, lots))
+	return blocks
+
+
+def replay(files, plan, by = "day", lots = None, processes = None):
+	#evaluates all files with the test plan plan, returns {day or lot: counts}
+	blocks = tasks(files, plan, by, lots)
+	total = {}
+	if processes == 1:
+		for block in blocks:
+			merge(total, replay_block(block))
+		return total
+	pool = multiprocessing.Pool(processes)
+	try:
+		for results in pool.imap_unordered(replay_block, blocks):
+			merge(total, results)
+	finally:
+		pool.close()
+		pool.join()
+	return total
+
+
+def _yield(counts, name):
+	if counts["duts"] == 0:
+		return 0.0
+	return 100.0 * counts[name].get(ERR.PASSED, 0) / counts["duts"]
+
+
+def report(total, by = "day"):
+	names = [ERR(code).name for code in CLASSES]
+	lines = ["%-16s %8s %9s %9s %9s %9s  %s" % (by, "shuttles", "DUTs", "yield rec", "yield new", "delta", "  ".join(["%s rec/new/delta" % name for name in names]))]
+	keys = sorted(total.keys())
+	if len(keys) > 1:
+		keys.append(None)
+	for key in keys:
+		counts = total[key] if key is not None else _sum(total)
+		cells = []
+		for code in CLASSES:
+			rec = counts["recorded"].get(code, 0)
+			new = counts["candidate"].get(code, 0)
+			cells.append("%i/%i/%+i" % (rec, new, new - rec))
+		yrec = _yield(counts, "recorded")
+		ynew = _yield(counts, "candidate")
+		lines.append("%-16s %8i %9i %8.2f%% %8.2f%% %+8.2f%%  %s" % ("total" if key is None else key, counts["shuttles"], counts["duts"], yrec, ynew, ynew - yrec, "  ".join(cells)))
+	moved = _sum(total)["moved"]
+	if len(moved) > 0:
+		lines.append("Changed classification (recorded -> candidate):")
+		for (rec, new), n in sorted(moved.items(), key = lambda item: -item[1]):
+			lines.append("	%-12s -> %-12s %9i" % (ERR(rec).name, ERR(new).name, n))
+	else:
+		lines.append("No DUT changed its classification")
+	return "\n".join(lines)
+
+
+def _sum(total):
+	#counts of all days / lots
+	counts = {"total": _new_counts()}
+	for key in total:
+		merge(counts, {"total": total[key]})
+	return counts["total"]
+
+
+def parse_changes(limitfile, sets):
+	#changes of the limits from a JSON file and the -set arguments (step group low high, "-" keeps the limit)
+	changes = {}
+	if limitfile is not None:
+		with open(limitfile, "r") as f:
+			for name, groups in json.load(f).items():
+				changes[name] = dict([(group, tuple(value)) for group, value in groups.items()])
+	for name, group, low, high in sets:
+		changes.setdefault(name, {})[group] = (None if low == "-" else float(low), None if high == "-" else float(high))
+	return changes
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = "re-evaluation of the recorded shuttles with candidate limits")
+	parser.add_argument("paths", nargs = "+", help = "results files or directories with results files (*_Results.bin)")
+	parser.add_argument("-set", nargs = 4, action = "append", default = [], metavar = ("STEP", "GROUP", "LOW", "HIGH"),
+						help = "candidate limits of a channel group (Gate, Phase, Source) of a test step, - keeps the limit")
+	parser.add_argument("-limits", default = None, help = "candidate limits (JSON): {step: {group: [low, high]}}")
+	parser.add_argument("-by", choices = ("day", "lot"), default = "day", help = "report per day or per lot")
+	parser.add_argument("-lot", action = "append", default = None, help = "only the shuttles of this lot (repeatable)")
+	parser.add_argument("-from", dest = "first", default = None, help = "first day (YYYY-MM-DD)")
+	parser.add_argument("-to", dest = "last", default = None, help = "last day (YYYY-MM-DD)")
+	parser.add_argument("-p", type = int, default = None, help = "number of processes (default: number of CPUs)")
+	opts = parser.parse_args()
+
+	plan = candidate_plan(parse_changes(opts.limits, opts.set))
+	files = find_files(opts.paths, opts.first, opts.last)
+	if len(files) == 0:
+		print("No results files found")
+		sys.exit(1)
+	tstart = time.perf_counter()
+	total = replay(files, plan, opts.by, None if opts.lot is None else set(opts.lot), opts.p)
+	elapsed = time.perf_counter() - tstart
+	print(report(total, opts.by))
+	duts = sum([counts["duts"] for counts in total.values()])
+	print("%i files, %i DUTs in %2.1f sec" % (len(files), duts, elapsed))
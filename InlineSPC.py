@@ -0,0 +1,159 @@
+"""
+Company: 				HE-System Electronic
+ModuleName: 			InlineSPC
+Path: 					C:\Python34
+Python version: 		Python 3.4
+Content:				Online statistical process control of the yield and of the error classes per shuttle position
+
+The counters TotalDUTs... only show the totals since the start. In order to react to an increased amount of e.g. GS-shorts
+the SPC engine follows the recent rates of each error class (FAIL: all DUTs which aren't PASSED) per shuttle position and for the whole line:
+	window:	rate within the last WINDOW shuttles (ring buffer of the error codes, counters per class)
+	EWMA:	exponentially weighted moving average of the rate, alarm above the upper control limit
+			UCL = target + L * sigma * sqrt(lambda / (2 - lambda)), sigma of the target rate
+		(asymptotic limit, a single failed DUT at the start doesn't raise an alarm)
+	CUSUM:	upper Bernoulli / binomial CUSUM of the log likelihood ratio of the rates SHIFT * target and target, alarm above H
+The target rate of each class is the expected (in control) rate, the line is one sample of NDUT DUTs per shuttle.
+The memory doesn't depend on the number of tested shuttles. update() is called once per shuttle (STATE.EVALUATE)
+and returns the new alarms, summary() the text lines for the GUI (QGUI.Spc).
+"""
+from InlineClasses import ERR, NDUT
+from array import array
+import math
+
+SPC_WINDOW = 200				#shuttles in the rolling window
+EWMA_LAMBDA = 0.02				#weight of the newest shuttle
+EWMA_L = 3.5					#width of the EWMA control limits in sigma
+CUSUM_SHIFT = 3.0				#rate which the CUSUM is tuned to detect (factor to the target rate)
+CUSUM_H = 5.0					#decision interval of the CUSUM
+FAIL = "FAIL"					#class of all DUTs which aren't PASSED (yield loss)
+SPC_TARGETS = {FAIL: 0.05, ERR.GS_SHORT: 0.01, ERR.DS_SHORT: 0.005, ERR.NOT_BONDED: 0.02}	#expected rate of each class
+
+
+def _name(cls):
+	return cls if cls == FAIL else cls.name
+
+
+class SPCEngine:
+	"""
+	ndut: positions per shuttle, the line (all positions) is kept as position ndut
+	targets: {class: expected rate}, the classes are FAIL and the error codes of ERR
+	"""
+	def __init__(self, ndut = NDUT, targets = SPC_TARGETS, window = SPC_WINDOW, lam = EWMA_LAMBDA, L = EWMA_L, shift = CUSUM_SHIFT, h = CUSUM_H):
+		self.NDUT = ndut
+		self.classes = list(targets.keys())
+		self.targets = dict(targets)
+		self.WINDOW = window
+		self.LAMBDA = lam
+		self.L = L
+		self.SHIFT = shift
+		self.H = h
+		self.reset()
+
+	def reset(self):
+		npos = self.NDUT + 1
+		ncls = len(self.classes)
+		self.shuttles = 0													#number of shuttles since reset
+		self.ring = array("B", [ERR.NORES]) * (self.WINDOW * self.NDUT)		#error codes of the last WINDOW shuttles
+		self.head = 0
+		self.filled = 0
+		self.samples = array("l", [0]) * npos								#evaluated DUTs per position within the window
+		self.window = [array("l", [0]) * ncls for p in range(0, npos)]		#DUTs per position and class within the window
+		self.ewma = [array("d", self._targets()) for p in range(0, npos)]	#EWMA per position and class, starting at the target
+		self.cusum = [array("d", [0.0]) * ncls for p in range(0, npos)]	#CUSUM per position and class
+		self.active = {}													#active alarms: (position, class, "EWMA" / "CUSUM") -> (value, limit)
+
+	def _targets(self):
+		return [self.targets[cls] for cls in self.classes]
+
+	def _hit(self, code, cls):
+		if cls == FAIL:
+			return code != ERR.PASSED
+		return code == cls
+
+	def update(self, status):
+		"""
+		status: error code of each position of the shuttle, NORES is not counted
+		returns the new alarms as list of (position, class, kind, value, limit), position ndut is the line
+		"""
+		self.shuttles += 1
+		ndut = self.NDUT
+		base = self.head * ndut
+		#rolling window: the oldest shuttle leaves the window
+		for i in range(0, ndut):
+			if self.filled == self.WINDOW:
+				self._count(i, self.ring[base + i], -1)
+			self.ring[base + i] = int(status[i])
+			self._count(i, status[i], 1)
+		self.head = (self.head + 1) % self.WINDOW
+		self.filled = min(self.filled + 1, self.WINDOW)
+		#EWMA / CUSUM per position (one DUT) and for the line (all evaluated DUTs of the shuttle)
+		alarms = []
+		line = [0] * len(self.classes)
+		nline = 0
+		for i in range(0, ndut):
+			if status[i] == ERR.NORES:
+				continue
+			hits = [1 if self._hit(status[i], cls) else 0 for cls in self.classes]
+			self._chart(i, hits, 1, alarms)
+			line = [a + b for a, b in zip(line, hits)]
+			nline += 1
+		if nline > 0:
+			self._chart(ndut, line, nline, alarms)
+		return alarms
+
+	def _count(self, i, code, delta):
+		if code == ERR.NORES:
+			return
+		self.samples[i] += delta
+		self.samples[self.NDUT] += delta
+		for c in range(0, len(self.classes)):
+			if self._hit(code, self.classes[c]):
+				self.window[i][c] += delta
+				self.window[self.NDUT][c] += delta
+
+	def _chart(self, p, hits, n, alarms):
+		#hits: number of DUTs of each class within n DUTs
+		lam = self.LAMBDA
+		for c in range(0, len(self.classes)):
+			target = self.targets[self.classes[c]]
+			rate = hits[c] / n
+			self.ewma[p][c] = lam * rate + (1.0 - lam) * self.ewma[p][c]
+			sigma = math.sqrt(target * (1.0 - target) / n * lam / (2.0 - lam))
+			self._check(p, c, "EWMA", self.ewma[p][c], target + self.L * sigma, alarms)
+			shifted = min(self.SHIFT * target, 0.999)
+			llr = hits[c] * math.log(shifted / target) + (n - hits[c]) * math.log((1.0 - shifted) / (1.0 - target))
+			self.cusum[p][c] = max(0.0, self.cusum[p][c] + llr)
+			self._check(p, c, "CUSUM", self.cusum[p][c], self.H, alarms)
+
+	def _check(self, p, c, kind, value, limit, alarms):
+		key = (p, self.classes[c], kind)
+		if value > limit:
+			if key not in self.active:
+				alarms.append((p, self.classes[c], kind, value, limit))
+			self.active[key] = (value, limit)
+		else:
+			self.active.pop(key, None)
+
+	def rate(self, position, cls):
+		#rate of a class within the window, position ndut: line
+		if self.samples[position] == 0:
+			return 0.0
+		return self.window[position][self.classes.index(cls)] / self.samples[position]
+
+	def yield_rate(self, position = None):
+		#yield (PASSED / evaluated DUTs) within the window of a position or of the line
+		return 1.0 - self.rate(self.NDUT if position is None else position, FAIL)
+
+	def describe(self, alarm):
+		p, cls, kind, value, limit = alarm
+		where = "Line" if p == self.NDUT else "Mo%i" % (p + 1)
+		if kind == "EWMA":
+			return "%s %s %s %2.1f%% > %2.1f%%" % (where, _name(cls), kind, 100.0 * value, 100.0 * limit)
+		return "%s %s %s %2.1f > %2.1f" % (where, _name(cls), kind, value, limit)
+
+	def summary(self):
+		#text lines for the GUI: yield of the line within the window, followed by the active alarms
+		lines = ["Yield (%i shuttles): %2.1f%%" % (self.filled, 100.0 * self.yield_rate())]
+		for key in sorted(self.active, key = lambda a: (a[0], _name(a[1]), a[2])):
+			lines.append(self.describe(key + self.active[key]))
+		return lines
@@ -0,0 +1,56 @@
+"""
+Company: 				HE-System Electronic
+ModuleName: 			InlineSnapshot
+Path: 					C:\Python34
+Python version: 		Python 3.4
+Content:				Exchange of the tester data between the state machine and the GUI
+
+The state machine publishes its data (the qObj, fields see QGUI in InlineClasses) as a snapshot:
+	the snapshot is an immutable copy (tuple, lists are copied to tuples) with a version number
+	only the newest snapshot is kept (latest wins), a new snapshot replaces the previous one, publish() never waits for the GUI
+The GUI reads the newest snapshot and can skip the update if the version hasn't changed since the last read.
+Subscribers are called by the publishing thread for each new snapshot, so they must only set a flag:
+the GUI sets a flag which its Tk thread polls at up to GUI_MAXFPS times per second (see InlineGUI.poll), then it reads the newest snapshot.
+A subscriber which raises an exception is removed, the publishing thread (state machine) is not affected.
+As the snapshot is a copy, the state machine can change its lists (e.g. VGateDUT) while the GUI is drawing.
+"""
+from InlineTiming import timed
+import threading
+
+
+class SnapshotChannel:
+	def __init__(self, initial):
+		self.lock = threading.Lock()		#publish() is called by the state machine and by the service buttons of the GUI
+		self.version = 0
+		self.snapshot = self.freeze(initial)
+		self.subscribers = []
+
+	def subscribe(self, callback):
+		#callback(version) is called in the publishing thread after each publish(), it must not block
+		self.subscribers.append(callback)
+
+	@staticmethod
+	def freeze(obj):
+		#immutable copy of the qObj
+		return tuple([tuple(v) if isinstance(v, list) else v for v in obj])
+
+	@timed("GUIPublish")
+	def publish(self, obj):
+		#obj: qObj of the state machine, returns the version of the new snapshot
+		snapshot = self.freeze(obj)
+		with self.lock:
+			self.version += 1
+			self.snapshot = snapshot
+			version = self.version
+		for callback in list(self.subscribers):
+			try:
+				callback(version)
+			except Exception as e:
+				print("SnapshotChannel: subscriber %s removed: %s" % (repr(callback), repr(e)))
+				self.subscribers.remove(callback)
+		return version
+
+	def latest(self):
+		#returns the version and the newest snapshot
+		with self.lock:
+			return self.version, self.snapshot
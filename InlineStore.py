@@ -0,0 +1,180 @@
+"""
+Company: 				HE-System Electronic
+ModuleName: 			InlineStore
+Path: 					C:\Python34
+Python version: 		Python 3.4
+Content:				Daily results file with fixed-size binary records
+
+All shuttles of a day are appended to one file <path><YYYY-MM-DD>_Results.bin instead of one ascii file per shuttle.
+The file starts with a header of HEADER_SIZE bytes, followed by one record per shuttle (little endian, no padding):
+	d		timestamp, start of the test (seconds since epoch)
+	I		shuttle number of the day (1, 2, ...), equal to the position of the record in the file
+	16s		lot code (utf-8, zero padded)
+	32s		serial number (utf-8, zero padded)
+	f		test time in sec
+	B		TESTER_STATUS after the test
+	nf		raw voltages of the test steps, n = nsteps * 3 * ndut:
+			[step][VGate, VPhase, VSource][DUT], channels which are not measured in a step are NaN
+	ndut B	DUTSTATUS (error code of each DUT, see ERR in InlineClasses)
+nsteps and ndut are stored in the header, so that the reader doesn't depend on the current test plan.
+As all records have the same size, shuttle n is found at HEADER_SIZE + (n - 1) * record size without an index.
+If the file of the day has another record layout (the test plan has changed during the day), the shuttles are appended
+to <YYYY-MM-DD>_Results_2.bin (_3, ...), the shuttle numbers start at 1 in each file.
+Version 1 of the header stored the record size as H (max. 65535 bytes), version 2 as I; both versions are read.
+"""
+from InlineClasses import NDUT
+from InlineTiming import timed
+from collections import namedtuple
+from datetime import date
+from array import array
+import mmap
+import os
+import struct
+
+STORE_MAGIC = b"INLR"
+STORE_VERSION = 2
+HEADER_SIZE = 64
+HEADER = struct.Struct("<4sHHIHH")		#magic, version, header size, record size, nsteps, ndut
+HEADERS = {1: struct.Struct("<4sHHHHH"), 2: HEADER}	#header of each version (see ResultReader)
+NGROUPS = 3								#VGate, VPhase, VSource
+RAW_OFFSET = struct.calcsize("<dI16s32sfB")	#offset of the raw voltages within a record
+
+ShuttleRecord = namedtuple("ShuttleRecord", ["shuttle", "timestamp", "lot", "serial", "testtime", "testerstatus", "raw", "dutstatus"])
+
+
+def record_struct(nsteps, ndut):
+	return struct.Struct("<dI16s32sfB%if%iB" % (nsteps * NGROUPS * ndut, ndut))
+
+
+def results_filename(path, day = None, part = 1):
+	#path: directory incl. separator, e.g. "L:\\", day: datetime.date, default today, part: 2, 3, ... after a change of the record layout
+	if day is None:
+		day = date.today()
+	if part > 1:
+		return path + str(day) + "_Results_%i.bin" % part
+	return path + str(day) + "_Results.bin"
+
+
+class ResultWriter:
+	"""
+	appends the results of each shuttle to the results file of the day
+	a new file is started automatically at the first shuttle after midnight
+	if the file of the day already exists (e.g. restart of the program) the records are appended,
+	a file of the day with another record layout is kept and the next part of the day is used
+	"""
+	def __init__(self, path, nsteps, ndut = NDUT):
+		self.path = path
+		self.NSTEPS = nsteps
+		self.NDUT = ndut
+		self.record = record_struct(nsteps, ndut)
+		self.day = None
+		self.file = None
+		self.filename = None
+		self.count = 0				#number of records in the current file
+
+	def _open(self, day):
+		self.close()
+		header = HEADER.pack(STORE_MAGIC, STORE_VERSION, HEADER_SIZE, self.record.size, self.NSTEPS, self.NDUT)
+		part = 1
+		while 1 == 1:
+			self.filename = results_filename(self.path, day, part)
+			if not os.path.exists(self.filename):
+				break
+			with open(self.filename, "rb") as f:
+				if f.read(HEADER.size) == header:
+					break
+			print("ResultWriter: %s has another record layout, the shuttles are written to the next file" % self.filename)
+			part += 1
+		if os.path.exists(self.filename):
+			self.file = open(self.filename, "r+b")
+			#an incomplete last record (e.g. power failure during the write) is removed
+			size = os.path.getsize(self.filename)
+			self.count = (size - HEADER_SIZE) // self.record.size
+			self.file.truncate(HEADER_SIZE + self.count * self.record.size)
+			self.file.seek(0, os.SEEK_END)
+		else:
+			self.file = open(self.filename, "wb")
+			self.file.write(header.ljust(HEADER_SIZE, b"\0"))
+			self.count = 0
+		self.day = day
+
+	@timed("ResultsAppend")
+	def append(self, timestamp, lot, serial, testtime, testerstatus, raw, dutstatus):
+		"""
+		raw: nsteps * 3 * ndut voltages (e.g. array("f")), dutstatus: ndut error codes
+		returns the shuttle number of the day (position of the record in the file)
+		"""
+		day = date.fromtimestamp(timestamp)
+		if day != self.day:
+			self._open(day)
+		self.file.write(self.record.pack(timestamp, self.count + 1, lot.encode("utf-8")[0:16], serial.encode("utf-8")[0:32], testtime, int(testerstatus), *(list(raw) + [int(e) for e in dutstatus])))
+		self.file.flush()
+		self.count += 1
+		return self.count
+
+	def close(self):
+		if self.file is not None:
+			self.file.close()
+			self.file = None
+			self.day = None
+
+
+class ResultReader:
+	"""
+	read access to a results file via mmap, e.g.
+		with ResultReader(results_filename("L:\\\\", day)) as results:
+			for rec in results: ...
+			rec = results[17]		#shuttle 17 of the day
+	"""
+	def __init__(self, filename):
+		self.filename = filename
+		self.file = open(filename, "rb")
+		start = self.file.read(HEADER.size)
+		magic, version = struct.unpack_from("<4sH", start)
+		if magic != STORE_MAGIC or version not in HEADERS:
+			self.file.close()
+			raise ValueError("%s: no results file of version %s" % (filename, "/".join([str(v) for v in sorted(HEADERS)])))
+		magic, version, headersize, recordsize, self.NSTEPS, self.NDUT = HEADERS[version].unpack_from(start)
+		self.record = record_struct(self.NSTEPS, self.NDUT)
+		self.HEADER_SIZE = headersize
+		self.NRAW = self.NSTEPS * NGROUPS * self.NDUT
+		self.map = None
+		self.count = (os.path.getsize(filename) - headersize) // recordsize
+		if self.count > 0:
+			self.map = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+
+	def __len__(self):
+		return self.count
+
+	def __getitem__(self, shuttle):
+		#shuttle: shuttle number of the day, 1 ... len(self)
+		if shuttle < 1 or shuttle > self.count:
+			raise IndexError("shuttle %i not in %s" % (shuttle, self.filename))
+		values = self.record.unpack_from(self.map, self.HEADER_SIZE + (shuttle - 1) * self.record.size)
+		return ShuttleRecord(values[1], values[0], values[2].rstrip(b"\0").decode("utf-8", "replace"), values[3].rstrip(b"\0").decode("utf-8", "replace"),
+							values[4], values[5], array("f", values[6:6 + self.NRAW]), list(values[6 + self.NRAW:]))
+
+	def __iter__(self):
+		for shuttle in range(1, self.count + 1):
+			yield self[shuttle]
+
+	def raw(self, shuttle, step, group):
+		#voltages of the NDUT channels of a group (0: VGate, 1: VPhase, 2: VSource) in a test step (0 ... nsteps - 1) of a shuttle
+		if shuttle < 1 or shuttle > self.count:
+			raise IndexError("shuttle %i not in %s" % (shuttle, self.filename))
+		offset = self.HEADER_SIZE + (shuttle - 1) * self.record.size + RAW_OFFSET + 4 * (step * NGROUPS + group) * self.NDUT
+		values = array("f")
+		values.frombytes(self.map[offset:offset + 4 * self.NDUT])		#float32 little endian (x86)
+		return values
+
+	def close(self):
+		if self.map is not None:
+			self.map.close()
+			self.map = None
+		self.file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
@@ -0,0 +1,257 @@
+"""
+Company: 				HE-System Electronic
+ModuleName: 			InlineSupervisor
+Path: 					C:\Python34
+Python version: 		Python 3.4
+Content:				Several independent tester stations on one PC
+
+Each station is an InlineStateMachine without GUI in its own process with its own Labjack modules (serial numbers),
+station ID, files (L:\<station ID>_YYYY-MM-DD_..., spool directory, database) and command line arguments.
+A station which hangs (e.g. USB) or crashes doesn't stall the other stations.
+	Aggregator:	the stations send the results of each shuttle, the state changes and the alarms (repetition errors, SPC) to the supervisor,
+				the aggregator counts the DUTs per class and station and for the whole line, the summary is printed every REPORT_PERIOD sec
+	Watchdog:	each station writes the time of each state change into a shared heartbeat value (see InlineStateMachine.schedule),
+				a station without heartbeat for more than HEARTBEAT_TIMEOUT sec is stuck and is terminated, a terminated or crashed station
+				is restarted (at most MAX_RESTARTS times)
+Each station has its own queue to the aggregator, so that a terminated station can't corrupt the results of the other stations.
+
+stations.json, e.g. two lines:
+	[{"id": "L1", "serials": ["470011540", "470011571"], "args": ["-nl", "start", "Y", "-pl"]},
+	 {"id": "L2", "serials": ["470011602", "470011613"], "args": ["-nl", "start", "Y", "-pl"]}]
+	python InlineSupervisor.py stations.json
+	python InlineSupervisor.py -sim 3		(three stations with simulated Labjack modules)
+The stations don't have a console input: serial numbers (-s) and lot codes (-LT) can't be entered, -l (password) is not possible.
+Ctrl+C (or SIGTERM) stops all stations (STATE.EXIT, the files are closed). The supervisor ends when all stations have ended
+regularly (STATE.EXIT) or are down after MAX_RESTARTS restarts.
+"""
+from InlineClasses import ERR
+from InlineHW import LJMBackend, SimT7Backend
+from InlineTiming import install_dump_signal
+import argparse
+import json
+import multiprocessing
+import queue
+import signal
+import sys
+import time
+
+HEARTBEAT_TIMEOUT = 60.0	#sec without state change until a station is regarded as stuck (a shuttle is tested in ~5 sec, HALT / IDLE: ~1 sec)
+REPORT_PERIOD = 60.0		#sec between two summaries
+MAX_RESTARTS = 3			#restarts per station after a crash / hang
+STOP_TIMEOUT = 30.0			#sec until a station has to be finished after the stop request
+CLASSES = (ERR.PASSED, ERR.GS_SHORT, ERR.NOT_BONDED, ERR.DS_SHORT, ERR.UNKNOWN)
+
+
+def run_station(station, aggregator, heartbeat, stop):
+	"""
+	process of a station: state machine without GUI until STATE.EXIT or the stop request of the supervisor
+	station: {"id", "serials", "args", "sim": True for simulated Labjack modules, "seed": seed of the simulation}
+	"""
+	import Inline
+	signal.signal(signal.SIGTERM, signal.SIG_DFL)		#inherited handler of the supervisor, terminate() has to kill a stuck station
+	if station.get("sim", False):
+		hw = SimT7Backend(seed = station.get("seed", 1))
+	else:
+		hw = LJMBackend()
+	tester = Inline.InlineStateMachine(hw, station, aggregator, heartbeat)
+	install_dump_signal(tester.DumpRequest.set)		#kill -USR1 <pid of the station>: timing table of the station
+	stopped = False
+	try:
+		while tester.thread1.is_alive():
+			if stop.wait(1.0):
+				stopped = True
+				break
+	except KeyboardInterrupt:
+		stopped = True
+	tester.exitCommand()
+	tester.thread1.join(STOP_TIMEOUT)
+	if not stopped and not tester.Exited.is_set():
+		#the state machine has ended without stop request and without STATE.EXIT (exception), the supervisor restarts the station
+		sys.exit(1)
+	aggregator.put(("exit", station["id"], None))
+
+
+class Aggregator:
+	"""
+	results and statistics of all stations, fed with the messages of the stations:
+		("shuttle", station ID, {"timestamp", "shuttle", "lot", "serial", "testtime", "status", "dutstatus"})
+		("state", station ID, (state name, tester status name))
+		("alarm", station ID, text)
+		("exit", station ID, None)
+	"""
+	def __init__(self):
+		self.stations = {}				#station ID -> counts
+		self.line = self._new_counts()	#all stations
+		self.started = time.time()
+
+	def _new_counts(self):
+		return {"shuttles": 0, "duts": 0, "classes": dict([(code, 0) for code in CLASSES]), "state": "", "status": "", "last": None, "alarms": 0}
+
+	def station(self, sid):
+		counts = self.stations.get(sid)
+		if counts is None:
+			counts = self.stations[sid] = self._new_counts()
+		return counts
+
+	def handle(self, message):
+		kind, sid, data = message
+		counts = self.station(sid)
+		if kind == "shuttle":
+			for c in (counts, self.line):
+				c["shuttles"] += 1
+				c["last"] = data["timestamp"]
+				for code in data["dutstatus"]:
+					if code == ERR.NORES:
+						continue
+					c["duts"] += 1
+					code = ERR(code)
+					c["classes"][code if code in c["classes"] else ERR.UNKNOWN] += 1
+		elif kind == "state":
+			counts["state"], counts["status"] = data
+		elif kind == "alarm":
+			counts["alarms"] += 1
+			self.line["alarms"] += 1
+			print("%s %s: %s" % (time.strftime("%H:%M:%S"), sid, data))
+		elif kind == "exit":
+			counts["state"] = "EXIT"
+
+	def summary(self):
+		elapsed = max(time.time() - self.started, 1.0)
+		lines = ["%-8s %-10s %-8s %8s %8s %8s %7s  %s" % ("station", "state", "status", "shuttles", "per hour", "DUTs", "yield", "  ".join([code.name for code in CLASSES]))]
+		for sid in sorted(self.stations) + [None]:
+			c = self.line if sid is None else self.stations[sid]
+			cells = "  ".join(["%*i" % (len(code.name), c["classes"][code]) for code in CLASSES])
+			yieldrate = 100.0 * c["classes"][ERR.PASSED] / c["duts"] if c["duts"] > 0 else 0.0
+			lines.append("%-8s %-10s %-8s %8i %8.1f %8i %6.2f%%  %s" % ("line" if sid is None else sid, c["state"], c["status"], c["shuttles"],
+						3600.0 * c["shuttles"] / elapsed, c["duts"], yieldrate, cells))
+		return "\n".join(lines)
+
+
+class Supervisor:
+	"""
+	starts the stations, feeds the aggregator with their messages and watches the heartbeats
+	"""
+	def __init__(self, stations, timeout = HEARTBEAT_TIMEOUT, report = REPORT_PERIOD, restarts = MAX_RESTARTS):
+		self.stations = stations
+		self.TIMEOUT = timeout
+		self.REPORT = report
+		self.RESTARTS = restarts
+		self.aggregator = Aggregator()
+		self.procs = {}					#station ID -> {"process", "queue", "heartbeat", "stop", "restarts"}
+		self.stopping = False			#stop requested (Ctrl+C, SIGTERM, see request_stop)
+
+	def start_station(self, station, restarts = 0):
+		sid = station["id"]
+		proc = {"queue": multiprocessing.Queue(), "heartbeat": multiprocessing.Value("d", time.time()), "stop": multiprocessing.Event(), "restarts": restarts}
+		proc["process"] = multiprocessing.Process(target = run_station, args = (station, proc["queue"], proc["heartbeat"], proc["stop"]), name = "Station " + sid)
+		proc["process"].start()
+		self.procs[sid] = proc
+		print("%s Station %s started (pid %i)" % (time.strftime("%H:%M:%S"), sid, proc["process"].pid))
+
+	def drain(self):
+		#messages of all stations to the aggregator, returns the number of messages
+		n = 0
+		for proc in self.procs.values():
+			while 1 == 1:
+				try:
+					self.aggregator.handle(proc["queue"].get_nowait())
+				except queue.Empty:
+					break
+				n += 1
+		return n
+
+	def watchdog(self):
+		#stuck stations are terminated, finished / crashed stations are restarted
+		for station in self.stations:
+			sid = station["id"]
+			proc = self.procs[sid]
+			process = proc["process"]
+			if isinstance(process, _Finished):
+				continue
+			if process.is_alive():
+				silent = time.time() - proc["heartbeat"].value
+				if silent <= self.TIMEOUT:
+					continue
+				print("%s Station %s stuck (no heartbeat for %2.0f sec), terminated" % (time.strftime("%H:%M:%S"), sid, silent))
+				process.terminate()
+				process.join()
+			else:
+				self.drain()		#the last messages of the finished station (e.g. "exit")
+				if self.aggregator.station(sid)["state"] == "EXIT" and process.exitcode == 0:
+					proc["process"] = _Finished()		#regular STATE.EXIT of the station, not restarted
+					continue
+				print("%s Station %s finished with exit code %s" % (time.strftime("%H:%M:%S"), sid, repr(process.exitcode)))
+			self.aggregator.station(sid)["state"] = "DOWN"
+			if proc["restarts"] < self.RESTARTS:
+				self.start_station(station, proc["restarts"] + 1)
+			else:
+				proc["process"] = _Finished()
+
+	def run(self):
+		for station in self.stations:
+			self.start_station(station)
+		lastreport = time.time()
+		try:
+			#the watchdog decides whether a station which isn't alive is restarted or finished
+			while not self.stopping and not all([isinstance(proc["process"], _Finished) for proc in self.procs.values()]):
+				if self.drain() == 0:
+					time.sleep(0.2)
+				self.watchdog()
+				if time.time() - lastreport >= self.REPORT:
+					lastreport = time.time()
+					print(self.aggregator.summary())
+		except KeyboardInterrupt:
+			pass
+		self.stop()
+		print(self.aggregator.summary())
+
+	def request_stop(self, *args):
+		#stop of all stations, e.g. signal handler of SIGTERM
+		self.stopping = True
+
+	def stop(self):
+		#the stop event of a terminated station is not used anymore (it might have been killed while waiting for the event)
+		for proc in self.procs.values():
+			if proc["process"].is_alive():
+				proc["stop"].set()
+		deadline = time.time() + STOP_TIMEOUT
+		for proc in self.procs.values():
+			while proc["process"].is_alive() and time.time() < deadline:
+				self.drain()
+				proc["process"].join(0.2)
+			if proc["process"].is_alive():
+				proc["process"].terminate()
+		self.drain()
+
+
+class _Finished:
+	#placeholder of a station which isn't restarted anymore
+	exitcode = None
+
+	def is_alive(self):
+		return False
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = "several inline tester stations on one PC")
+	parser.add_argument("config", nargs = "?", default = None, help = "stations (JSON): [{\"id\", \"serials\", \"args\"}, ...]")
+	parser.add_argument("-sim", type = int, default = 0, help = "number of stations with simulated Labjack modules (instead of config)")
+	parser.add_argument("-timeout", type = float, default = HEARTBEAT_TIMEOUT, help = "heartbeat timeout in sec")
+	parser.add_argument("-report", type = float, default = REPORT_PERIOD, help = "sec between two summaries")
+	opts = parser.parse_args()
+
+	if opts.config is not None:
+		with open(opts.config, "r") as f:
+			stations = json.load(f)
+	else:
+		stations = [{"id": "S%i" % (n + 1), "serials": [str(900000001 + 10 * n), str(900000002 + 10 * n)], "args": ["-nl", "start", "Y"], "sim": True, "seed": n + 1}
+					for n in range(0, opts.sim)]
+	if len(stations) == 0:
+		parser.print_help()
+		sys.exit(1)
+	if len(set([station["id"] for station in stations])) != len(stations):
+		print("The station IDs have to be unique")
+		sys.exit(1)
+	supervisor = Supervisor(stations, opts.timeout, opts.report)
+	signal.signal(signal.SIGTERM, supervisor.request_stop)
+	supervisor.run()
@@ -0,0 +1,181 @@
+"""
+Company: 				HE-System Electronic
+ModuleName: 			InlineTestPlan
+Path: 					C:\Python34
+Python version: 		Python 3.4
+Content:				Definition of the test steps in STATE.TESTING and the compiler for the execution schedule
+
+Each test step of TESTPLAN is a dictionary:
+	"name":		name of the test step for the protocol, the steps are numbered TS1, TS2, ... in the order of TESTPLAN
+	"actions":	actions prior to the measurement, executed in the given order:
+				(OP.RELAY, port, state)		set a relay / valve (InlineStateMachine.SetRelay)
+				(OP.WAIT, time)				fixed wait time in sec (e.g. ESD safety)
+				(OP.SETTLE, time)			wait until the inputs are settled, at most time sec (InlineStateMachine.Settle)
+									only where stable inputs mean that the step is ready: a needle without contact gives a stable but wrong value,
+									therefore the wait after the shuttle valve went up (contact of the needles) is a fixed OP.WAIT
+	"limits":	limits of the channel groups, evaluated in the given order:
+				(QGUI.Gate / QGUI.Phase / QGUI.Source, low limit, error on low, high limit, error on high, store)
+				store is the name under which the error codes of this evaluation are kept for STATE.EVALUATE, or None
+				channel groups without limits are neither acquired nor evaluated
+	"post":		actions after the evaluation (same format as "actions")
+
+compile_testplan() flattens TESTPLAN once (in STATE.INIT) into an execution schedule:
+	relay writes which don't change the state of the relay (known from the previous steps) are removed
+	a settle action without a preceding relay change is removed
+	only the Labjack modules which carry a channel group with limits are acquired
+	the limits of a step are converted into per-channel limit arrays, which are evaluated with one call per step (see InlineEval)
+"""
+from InlineClasses import OP, ERR, QGUI, Ports, states, position, NDUT
+from InlineEval import limit_arrays
+
+SettlingTime = 0.3		#fixed settling time in sec after switching relays, upper bound for adaptive settling
+
+TESTPLAN = [
+	#-----------------------------------TS001----------------------------------------------------------------------------
+	#if any of these voltages is out of range the TESTER_STATUS is set to STATUS.ERROR
+	#possible causes for voltages being out of range: voltage supply off, Labjack Module defective / not connected
+	{"name": "Selftest1",
+	"actions": [	(OP.RELAY, Ports.SHUTTLE_VALVE, position.DOWN),			#Set Shuttle Valve to position down
+					(OP.RELAY, Ports.DOUT_VPHASE_ON, states.CLEAR),			#VPhase OFF
+					(OP.RELAY, Ports.DOUT_VPHASE_REV_OFF, states.CLEAR),	#VPhase in Reverse State
+					(OP.RELAY, Ports.DOUT_VGATE_ON, states.SET),			#VGate ON
+					(OP.SETTLE, SettlingTime)],
+	"limits": [		(QGUI.Gate, 5.65, ERR.TESTER_FAULT, 5.85, ERR.TESTER_FAULT, None),
+					(QGUI.Phase, -0.03, ERR.TESTER_FAULT, 0.03, ERR.TESTER_FAULT, None),
+					(QGUI.Source, -0.03, ERR.TESTER_FAULT, 0.03, ERR.TESTER_FAULT, None)],		#determine whether Source is connected
+	"post": [		(OP.RELAY, Ports.DOUT_VGATE_ON, states.CLEAR)]},		#VGate OFF
+
+	#------------------------------------TS002-------------------------------------------------------------------------
+	{"name": "Selftest2",
+	"actions": [	(OP.RELAY, Ports.DOUT_VPHASE_ON, states.SET),			#VPhase ON
+					(OP.SETTLE, SettlingTime)],
+	"limits": [		(QGUI.Gate, -0.03, ERR.TESTER_FAULT, 0.03, ERR.TESTER_FAULT, None),
+					(QGUI.Phase, -8.0, ERR.TESTER_FAULT, -7.6, ERR.TESTER_FAULT, None),
+					(QGUI.Source, -0.03, ERR.TESTER_FAULT, 0.03, ERR.TESTER_FAULT, None)],		#determine whether Source is connected
+	"post": [		(OP.RELAY, Ports.DOUT_VPHASE_ON, states.CLEAR)]},		#VPhase OFF
+
+	#-------------------------------------TS003--------------------------------------------------------------------------------
+	#-----------This test step determines:
+	#-----------Needle Connection Phase, Source (and Gate) to DCB (Only a fault can be detected but not which one of the needle pairs caused the fault)
+	#-----------Source wire not bonded
+	{"name": "Phase Reverse",
+	"actions": [	(OP.RELAY, Ports.SHUTTLE_VALVE, position.UP),			#Set Shuttle Valve to position up
+					(OP.WAIT, SettlingTime*2),								#additional wait time for ESD safety to make sure the VGate is only applied after all needle contacted
+					(OP.RELAY, Ports.DOUT_VPHASE_ON, states.SET),			#VPhase ON, Rev Mode activated in previous tests
+					(OP.WAIT, SettlingTime*5)],								#Sufficient wait time after shuttle has reached its upper position is mandatory to avoid pseudo errors (contact of gate-needle / source needle is not recognized)
+	"limits": [		(QGUI.Gate, -0.200, ERR.VLOW, -0.170, ERR.VHIGH, None),
+					(QGUI.Phase, -7.6, ERR.VLOW, -7.4, ERR.VHIGH, "PhaseErrorT3"),
+					(QGUI.Source, -0.77, ERR.VLOW, -0.57, ERR.VHIGH, "SourceErrorT3")],
+	"post": [		(OP.WAIT, SettlingTime),
+					(OP.RELAY, Ports.DOUT_VPHASE_ON, states.CLEAR)]},		#VPhase OFF
+
+	#-------------------------------------TS004--------------------------------------------------------------------------------
+	#-----------This test step determines:
+	#-----------Gate and Source needle connection to DCB (it can't be differntiated between a fault of one or both of these needle pairs)
+	#-----------Gate Source functioning: Tomb Stone of Gate-Source Short, R1/2/3, Gate not bonded (Tomb Stone and Not-Bonded can't be differtiated in this step allone)
+	{"name": "Fct G-ON Ph-OFF",
+	"actions": [	(OP.RELAY, Ports.DOUT_VGATE_ON, states.SET),			#VGate ON
+					(OP.SETTLE, SettlingTime)],
+	"limits": [		(QGUI.Gate, 5.1, ERR.VLOW, 5.35, ERR.VHIGH, "GateErrorT4"),
+					(QGUI.Phase, 0.01, ERR.VLOW, 0.07, ERR.VHIGH, None),
+					(QGUI.Source, 0.06, ERR.VLOW, 0.08, ERR.VHIGH, "SourceErrorT4")],		#determine whether Source is connected
+	"post": []},
+
+	#-------------------------------------TS005--------------------------------------------------------------------------------
+	#-----------This test step determines:
+	#-----------DUT Function (even if a GS-short was detected, this test is performed): Gate-Source Function, Drain-Source Function, Bonded / Not Bonded
+	{"name": "Fct G-ON Ph-ON",
+	"actions": [	(OP.RELAY, Ports.DOUT_VPHASE_REV_OFF, states.SET),		#VPhase Reverse OFF
+					(OP.RELAY, Ports.DOUT_VPHASE_ON, states.SET),			#VPhase ON
+					(OP.SETTLE, SettlingTime)],
+	"limits": [		(QGUI.Gate, 5.19, ERR.VLOW, 5.4, ERR.VHIGH, "GateErrorT5"),
+					(QGUI.Phase, 7.35, ERR.VLOW, 7.65, ERR.VHIGH, None),
+					(QGUI.Source, 0.70, ERR.VLOW, 0.83, ERR.VHIGH, "SourceErrorT5")],
+	"post": []},
+
+	#-------------------------------------TS006--------------------------------------------------------------------------------
+	#-----------This test step determines:
+	#-----------Drain Source Function Test / DUT in OFF State
+	{"name": "Fct G-OFF Ph-ON",
+	"actions": [	(OP.RELAY, Ports.DOUT_VGATE_ON, states.CLEAR),			#VGate OFF
+					(OP.SETTLE, SettlingTime)],
+	"limits": [		(QGUI.Gate, 0.055, ERR.VLOW, 0.085, ERR.VHIGH, None),
+					(QGUI.Phase, 7.65, ERR.VLOW, 7.9, ERR.VHIGH, None),
+					(QGUI.Source, 0.14, ERR.VLOW, 0.18, ERR.VHIGH, "SourceErrorT6")],
+	"post": []},
+
+	#-------------------------------------TS007--------------------------------------------------------------------------------
+	{"name": "Fct G-OFF Ph-OFF",
+	"actions": [	(OP.RELAY, Ports.DOUT_VPHASE_ON, states.CLEAR),			#VPhase OFF
+					(OP.RELAY, Ports.DOUT_VPHASE_REV_OFF, states.CLEAR),	#VPhase Reverse, prepare to finish testing
+					(OP.SETTLE, SettlingTime)],
+	"limits": [		(QGUI.Gate, -0.03, ERR.TESTER_FAULT, 0.03, ERR.TESTER_FAULT, None),
+					(QGUI.Phase, -0.03, ERR.TESTER_FAULT, 0.03, ERR.TESTER_FAULT, None),
+					(QGUI.Source, -0.03, ERR.TESTER_FAULT, 0.03, ERR.TESTER_FAULT, None)],
+	"post": []},
+
+	#----------------------------------Test Finished-----------------------------------------------------------------------------
+	{"name": "Test Finished",
+	"actions": [	(OP.RELAY, Ports.DOUT_VGATE_ON, states.CLEAR),			#VGate OFF
+					(OP.RELAY, Ports.DOUT_VPHASE_ON, states.CLEAR),			#VPhase OFF
+					(OP.RELAY, Ports.DOUT_VPHASE_REV_OFF, states.CLEAR),	#VPhase in Reverse State
+					(OP.RELAY, Ports.STOPPER_VALVE, position.DOWN),			#1. Remove Stopper
+					(OP.RELAY, Ports.SHUTTLE_VALVE, position.DOWN)],		#2. Set Shuttle Valve to position down
+	"limits": [],
+	"post": []},
+]
+
+#Labjack modules (index of the acquisition engine) which carry the channels of a channel group
+GROUP_MODULES = {QGUI.Gate: (0,), QGUI.Phase: (0, 1), QGUI.Source: (1,)}
+
+
+def compile_testplan(plan):
+	"""
+	flatten the test plan into a list of operations:
+		(OP.STEP, name)										start of a test step
+		(OP.RELAY, port, state)
+		(OP.WAIT, time)
+		(OP.SETTLE, time)
+		(OP.MEASURE, modules)								acquire the given Labjack modules
+		(OP.EVAL, groups, low, erronlow, high, erronhigh, stores)	evaluate all channel groups of the step (see InlineEval.limit_arrays)
+		(OP.END, )											end of a test step
+	returns the schedule and the list of store names which are written by the schedule
+	the relay states at the beginning of the plan are unknown, therefore the first write of each relay is kept
+	"""
+	schedule = []
+	stores = []
+	relays = {}			#known state of each relay within the plan
+	for step in plan:
+		schedule.append((OP.STEP, step["name"]))
+		changed = False		#a relay has been switched since the last measurement
+		for action in step["actions"]:
+			changed = _compile_action(action, schedule, relays, changed)
+		if len(step["limits"]) > 0:
+			modules = set()
+			for limit in step["limits"]:
+				modules.update(GROUP_MODULES[limit[0]])
+			schedule.append((OP.MEASURE, tuple(sorted(modules))))
+			schedule.append((OP.EVAL,) + limit_arrays(step["limits"], NDUT))
+			for limit in step["limits"]:
+				if limit[5] is not None and limit[5] not in stores:
+					stores.append(limit[5])
+			changed = False
+		for action in step["post"]:
+			changed = _compile_action(action, schedule, relays, changed)
+		schedule.append((OP.END,))
+	return schedule, stores
+
+
+def _compile_action(action, schedule, relays, changed):
+	if action[0] == OP.RELAY:
+		port, state = action[1], action[2]
+		if relays.get(port) != state:
+			relays[port] = state
+			schedule.append(action)
+			changed = True
+	elif action[0] == OP.SETTLE:
+		if changed:
+			schedule.append(action)
+	else:
+		schedule.append(action)
+	return changed
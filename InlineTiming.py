@@ -0,0 +1,127 @@
+"""
+Company: 				HE-System Electronic
+ModuleName: 			InlineTiming
+Path: 					C:\Python34
+Python version: 		Python 3.4
+Content:				Latency histograms of the tester operations
+
+The operations of the tester (SetRelay, GetRelay, GetV..., Settle, Evaluate, log writes, GUI publish, etc.) are measured
+with the monotonic high resolution timer time.perf_counter(), either with the decorator @timed(name) or with TIMING.record(name, seconds).
+Each operation gets a histogram with logarithmic buckets (bucket k: 2^(k-1) ... 2^k microseconds), count, total, min and max,
+so that the memory doesn't depend on the number of calls. The percentiles are the upper bounds of the buckets (max. factor 2).
+The table of all operations (dump) is written at the end of the program (STATE.EXIT) and on demand:
+	Ctrl+Break in the console window (SIGBREAK, Windows) or kill -USR1 <pid> (SIGUSR1, Linux), see install_dump_signal
+"""
+from array import array
+import functools
+import signal
+import threading
+import time
+
+NBUCKETS = 40			#2^39 us = 6 days
+
+
+class Histogram:
+	def __init__(self):
+		self.count = 0
+		self.total = float(0)
+		self.min = None
+		self.max = float(0)
+		self.buckets = array("l", [0]) * NBUCKETS
+
+	def add(self, seconds):
+		self.count += 1
+		self.total += seconds
+		if self.min is None or seconds < self.min:
+			self.min = seconds
+		if seconds > self.max:
+			self.max = seconds
+		self.buckets[min(int(seconds * 1000000).bit_length(), NBUCKETS - 1)] += 1
+
+	def percentile(self, q):
+		#upper bound of the bucket which contains the q-quantile (0 < q <= 1) in sec, limited to max
+		if self.count == 0:
+			return float(0)
+		rank = q * self.count
+		n = 0
+		for k in range(0, NBUCKETS):
+			n += self.buckets[k]
+			if n >= rank:
+				return min((1 << k) / 1000000.0, self.max)
+		return self.max
+
+
+class Timing:
+	def __init__(self):
+		self.lock = threading.Lock()		#operations are recorded by the state machine, the GUI and the background threads
+		self.ops = {}						#operation -> Histogram
+		self.started = time.perf_counter()
+
+	def record(self, name, seconds):
+		with self.lock:
+			histogram = self.ops.get(name)
+			if histogram is None:
+				histogram = self.ops[name] = Histogram()
+			histogram.add(seconds)
+
+	def histogram(self, name):
+		#copy of the histogram of an operation (None if the operation hasn't been recorded yet)
+		with self.lock:
+			histogram = self.ops.get(name)
+			if histogram is None:
+				return None
+			copy = Histogram()
+			copy.count, copy.total, copy.min, copy.max = histogram.count, histogram.total, histogram.min, histogram.max
+			copy.buckets = array("l", histogram.buckets)
+			return copy
+
+	def names(self):
+		with self.lock:
+			return sorted(self.ops.keys())
+
+	def reset(self):
+		with self.lock:
+			self.ops = {}
+			self.started = time.perf_counter()
+
+	def dump(self):
+		#table of all operations, sorted by total time (where the seconds go)
+		elapsed = time.perf_counter() - self.started
+		rows = [(name, self.histogram(name)) for name in self.names()]
+		rows.sort(key = lambda row: row[1].total, reverse = True)
+		lines = ["Timing (%2.1f sec):" % elapsed,
+				"%-20s %8s %10s %6s %10s %10s %10s %10s %10s" % ("operation", "count", "total s", "%", "mean ms", "p50 ms", "p90 ms", "p99 ms", "max ms")]
+		for name, h in rows:
+			lines.append("%-20s %8i %10.3f %6.1f %10.3f %10.3f %10.3f %10.3f %10.3f" % (name, h.count, h.total, 100.0 * h.total / elapsed,
+						1000.0 * h.total / h.count, 1000.0 * h.percentile(0.5), 1000.0 * h.percentile(0.9), 1000.0 * h.percentile(0.99), 1000.0 * h.max))
+		return "\n".join(lines) + "\n"
+
+
+TIMING = Timing()		#histograms of the program
+
+
+def timed(name):
+	#decorator: the duration of each call of the function is recorded as operation name
+	def decorator(func):
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			tstart = time.perf_counter()
+			try:
+				return func(*args, **kwargs)
+			finally:
+				TIMING.record(name, time.perf_counter() - tstart)
+		return wrapper
+	return decorator
+
+
+def install_dump_signal(callback):
+	"""
+	callback() is called on Ctrl+Break (Windows) / SIGUSR1 (Linux), must be called in the main thread
+	the callback runs in the signal handler and should only set a flag (e.g. Event.set), the dump is written by the program
+	returns False if neither signal is available
+	"""
+	signum = getattr(signal, "SIGBREAK", getattr(signal, "SIGUSR1", None))
+	if signum is None:
+		return False
+	signal.signal(signum, lambda signum, frame: callback())
+	return True
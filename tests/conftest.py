@@ -0,0 +1,5 @@
+#the modules of the tester are in the parent directory (C:\Python34), not in a package
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
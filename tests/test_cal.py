@@ -0,0 +1,35 @@
+from InlineCal import CAL_VERSION, load_calibration, save_calibration, identity
+from array import array
+import json
+import pytest
+
+
+def write(filename, table):
+	with open(filename, "w") as f:
+		json.dump({"version": CAL_VERSION, "modules": {"1": table}}, f)
+
+
+def test_saved_tables_are_loaded(tmp_path):
+	filename = str(tmp_path / "cal.json")
+	gain, offset = identity(3)
+	gain[1] = 1.1
+	assert save_calibration([1], [(gain, offset)], "test", filename) == [1]
+	tables, revisions = load_calibration([1, 2], [3, 2], filename)
+	assert tables[0] == (array("d", [1.0, 1.1, 1.0]), array("d", [0.0, 0.0, 0.0]))
+	assert tables[1] == identity(2)
+	assert revisions == [1, 0]
+
+
+@pytest.mark.parametrize("gain", [None, [1.0, None], [1.0, "1.0"], [1.0, True], [1.0], 1.0])
+def test_invalid_entries_raise_value_error(tmp_path, gain):
+	filename = str(tmp_path / "cal.json")
+	write(filename, {"revision": 1, "gain": gain, "offset": [0.0, 0.0]})
+	with pytest.raises(ValueError):
+		load_calibration([1], [2], filename)
+
+
+def test_missing_offset_raises_value_error(tmp_path):
+	filename = str(tmp_path / "cal.json")
+	write(filename, {"revision": 1, "gain": [1.0, 1.0]})
+	with pytest.raises(ValueError):
+		load_calibration([1], [2], filename)
@@ -0,0 +1,50 @@
+from InlineClasses import ERR, STATUS
+from InlineDB import ResultDB, connect, error_rates
+import os
+
+
+def add(db, n):
+	for i in range(0, n):
+		db.add(float(i), i + 1, "LOT", "SN%i" % i, 4.0, STATUS.PASSED, [ERR.PASSED, ERR.GS_SHORT])
+
+
+def test_shuttles_are_written(tmp_path):
+	filename = str(tmp_path / "results.db")
+	db = ResultDB(filename, batchsize = 2, batchtime = 0.05)
+	add(db, 3)
+	assert db.close() == 0
+	assert db.take_error() is None
+	counts, total = error_rates(connect(filename), "LOT")
+	assert total == 6
+	assert counts[ERR.GS_SHORT] == 3
+
+
+def test_database_which_cant_be_opened_doesnt_raise(tmp_path):
+	#a directory in place of the database file
+	filename = str(tmp_path / "results.db")
+	os.makedirs(filename)
+	db = ResultDB(filename, batchsize = 2, batchtime = 0.05, maxpending = 3)
+	add(db, 5)
+	assert db.close() == 3
+	assert db.dropped == 2
+	assert db.take_error() is not None
+	assert db.take_error() is None
+
+
+def test_kept_shuttles_are_written_when_the_database_is_available(tmp_path, monkeypatch):
+	filename = str(tmp_path / "results.db")
+	attempts = []
+	connect_db = ResultDB._connect
+	def connect_third(self):
+		attempts.append(1)
+		if len(attempts) < 3:
+			raise OSError("disk not available")
+		return connect_db(self)
+	monkeypatch.setattr(ResultDB, "_connect", connect_third)
+	db = ResultDB(filename, batchsize = 2, batchtime = 0.05)
+	add(db, 2)
+	add(db, 1)
+	assert db.close() == 0
+	assert len(attempts) == 3
+	assert isinstance(db.take_error(), OSError)
+	assert error_rates(connect(filename), "LOT")[1] == 6
@@ -0,0 +1,47 @@
+from InlineClasses import ERR, QGUI
+from InlineEval import limit_arrays, evaluate_step, classify
+import pytest
+
+STORES = ("PhaseErrorT3", "SourceErrorT3", "GateErrorT4", "SourceErrorT4", "GateErrorT5", "SourceErrorT5", "SourceErrorT6")
+
+
+def test_limits_are_inclusive():
+	groups, low, erronlow, high, erronhigh, stores = limit_arrays([(QGUI.Gate, 1.0, ERR.VLOW, 2.0, ERR.VHIGH, "G")], 5)
+	codes, fault = evaluate_step([[0.999, 1.0, 1.5, 2.0, 2.001]], low, erronlow, high, erronhigh)
+	assert codes == [[ERR.VLOW, ERR.PASSED, ERR.PASSED, ERR.PASSED, ERR.VHIGH]]
+	assert fault == [[False] * 5]
+
+
+def test_limits_per_channel_and_tester_fault():
+	limits = [(QGUI.Gate, [0.0, 1.0], ERR.VLOW, [1.0, 2.0], ERR.VHIGH, None),
+			(QGUI.Source, -0.03, ERR.TESTER_FAULT, 0.03, ERR.TESTER_FAULT, None)]
+	groups, low, erronlow, high, erronhigh, stores = limit_arrays(limits, 2)
+	assert groups == (QGUI.Gate, QGUI.Source)
+	codes, fault = evaluate_step([[0.5, 0.5], [0.0, 0.05]], low, erronlow, high, erronhigh)
+	assert codes == [[ERR.PASSED, ERR.VLOW], [ERR.PASSED, ERR.TESTER_FAULT]]
+	assert fault == [[False, False], [False, True]]
+
+
+def errors(**codes):
+	#error codes of one DUT, all stores PASSED except the given ones
+	result = dict([(store, [ERR.PASSED]) for store in STORES])
+	for store, code in codes.items():
+		result[store] = [code]
+	return result
+
+
+@pytest.mark.parametrize("codes, expected", [
+	({}, ERR.PASSED),
+	#SourceErrorT4 / GateErrorT5 alone don't fail a DUT
+	({"SourceErrorT4": ERR.VHIGH, "GateErrorT5": ERR.VLOW}, ERR.PASSED),
+	({"GateErrorT4": ERR.VLOW, "SourceErrorT4": ERR.VHIGH, "GateErrorT5": ERR.VLOW}, ERR.GS_SHORT),
+	({"PhaseErrorT3": ERR.VLOW, "SourceErrorT3": ERR.VHIGH, "SourceErrorT5": ERR.VLOW}, ERR.NOT_BONDED),
+	({"SourceErrorT6": ERR.VHIGH}, ERR.DS_SHORT),
+	({"SourceErrorT6": ERR.VLOW}, ERR.UNKNOWN),
+	({"GateErrorT4": ERR.VLOW, "SourceErrorT4": ERR.VHIGH}, ERR.UNKNOWN),
+	#GS short takes precedence over the other classes
+	({"GateErrorT4": ERR.VLOW, "SourceErrorT4": ERR.VHIGH, "GateErrorT5": ERR.VLOW, "SourceErrorT6": ERR.VHIGH}, ERR.GS_SHORT),
+	({"PhaseErrorT3": ERR.NORES}, ERR.UNKNOWN),
+])
+def test_classify(codes, expected):
+	assert classify(errors(**codes), 1) == [expected]
@@ -0,0 +1,78 @@
+from InlineClasses import ERR
+from InlineHistory import PositionHistory
+
+NDUT = 4
+
+
+def shuttle(code = ERR.PASSED, **positions):
+	#error codes of a shuttle, e.g. shuttle(p2 = ERR.GS_SHORT)
+	status = [code] * NDUT
+	for name, value in positions.items():
+		status[int(name[1:])] = value
+	return status
+
+
+def test_repetition_error_at_the_rule_count():
+	history = PositionHistory(NDUT, 3)
+	assert history.add(shuttle(p2 = ERR.GS_SHORT)) == []
+	assert history.add(shuttle(p2 = ERR.GS_SHORT)) == []
+	assert history.add(shuttle(p2 = ERR.GS_SHORT)) == [2]
+	assert history.run[2] == 3
+	#the error is reported as long as the run continues
+	assert history.add(shuttle(p2 = ERR.GS_SHORT)) == [2]
+
+
+def test_other_code_or_passed_resets_the_run():
+	history = PositionHistory(NDUT, 3)
+	history.add(shuttle(p1 = ERR.GS_SHORT))
+	history.add(shuttle(p1 = ERR.GS_SHORT))
+	assert history.add(shuttle(p1 = ERR.DS_SHORT)) == []
+	assert history.run[1] == 1
+	history.add(shuttle(p1 = ERR.DS_SHORT))
+	assert history.add(shuttle()) == []
+	assert history.run[1] == 1
+	assert history.last[1] == ERR.PASSED
+
+
+def test_passed_and_nores_are_not_checked():
+	history = PositionHistory(NDUT, 2)
+	for n in range(0, 5):
+		assert history.add(shuttle(p0 = ERR.NORES)) == []
+	assert history.run[0] == 5
+
+
+def test_set_rule():
+	history = PositionHistory(NDUT, 3)
+	history.set_rule(ERR.NOT_BONDED, 0)
+	history.set_rule(ERR.GS_SHORT, 1)
+	for n in range(0, 4):
+		assert history.add(shuttle(p3 = ERR.NOT_BONDED)) == []
+	assert history.add(shuttle(p0 = ERR.GS_SHORT)) == [0]
+
+
+def test_ring_buffer_and_window_counter():
+	history = PositionHistory(NDUT, 2)
+	history.add(shuttle(p0 = ERR.GS_SHORT))
+	history.add(shuttle(p0 = ERR.DS_SHORT))
+	history.add(shuttle(p0 = ERR.NOT_BONDED))
+	assert history.shuttle(1)[0] == ERR.NOT_BONDED
+	assert history.shuttle(2)[0] == ERR.DS_SHORT
+	assert history.shuttle(3) == [ERR.NORES] * NDUT
+	assert history.occurrences(0, ERR.GS_SHORT) == 0
+	assert history.occurrences(0, ERR.DS_SHORT) == 1
+	assert history.occurrences(1, ERR.PASSED) == 2
+	assert history.recent(2)[0:NDUT] == shuttle(p0 = ERR.NOT_BONDED)
+	assert len(history.recent(3)) == 3 * NDUT
+
+
+def test_set_depth_keeps_the_newest_shuttles():
+	history = PositionHistory(NDUT, 3)
+	for code in (ERR.GS_SHORT, ERR.DS_SHORT, ERR.NOT_BONDED):
+		history.add(shuttle(p0 = code))
+	history.set_depth(2)
+	assert history.shuttle(1)[0] == ERR.NOT_BONDED
+	assert history.shuttle(2)[0] == ERR.DS_SHORT
+	assert history.occurrences(0, ERR.GS_SHORT) == 0
+	history.set_depth(4)
+	assert history.filled == 2
+	assert history.shuttle(1)[0] == ERR.NOT_BONDED
@@ -0,0 +1,61 @@
+import InlineLog
+from InlineLog import LogWriter
+import os
+import threading
+import time
+
+
+def wait(condition, timeout = 5.0):
+	tend = time.time() + timeout
+	while not condition() and time.time() < tend:
+		time.sleep(0.01)
+	return condition()
+
+
+def test_spool_error_is_counted_and_the_spooler_keeps_running(tmp_path):
+	writer = LogWriter(str(tmp_path / "spool"), period = 0.05)
+	target = str(tmp_path / "share" / "a.txt")
+	os.makedirs(os.path.dirname(target))
+	spool_item = writer._spool_item
+	def failing(*item):
+		raise OSError("disk full")
+	writer._spool_item = failing
+	writer.write(target, "lost\n")
+	assert wait(lambda: writer.stats()["spoolerrors"] == 1)
+	assert "disk full" in writer.take_error()
+	assert writer.take_error() is None
+	writer._spool_item = spool_item
+	writer.write(target, "kept\n")
+	writer.close()
+	with open(target) as f:
+		assert f.read() == "kept\n"
+
+
+def test_state_error_doesnt_stop_the_forwarder(tmp_path):
+	writer = LogWriter(str(tmp_path / "spool"), period = 0.05)
+	target = str(tmp_path / "a.txt")
+	def failing():
+		raise OSError("state")
+	writer._save_state = failing
+	writer.write(target, "one\n")
+	assert wait(lambda: writer.stats()["stateerrors"] > 0)
+	writer.write(target, "two\n")
+	assert wait(lambda: os.path.exists(target) and open(target).read() == "one\ntwo\n")
+	writer.close()
+
+
+def test_full_queue_drops_after_max_block(tmp_path, monkeypatch):
+	monkeypatch.setattr(InlineLog, "MAX_BLOCK", 0.05)
+	writer = LogWriter(str(tmp_path / "spool"), maxqueue = 2)
+	release = threading.Event()
+	writer._spool_item = lambda *item: release.wait()
+	target = str(tmp_path / "a.txt")
+	for i in range(0, 6):
+		writer.write(target, "%i\n" % i)
+	stats = writer.stats()
+	assert stats["dropped"] > 0
+	assert stats["fullcount"] >= stats["dropped"]
+	assert stats["writes"] == 6
+	assert "dropped" in writer.take_error()
+	release.set()
+	writer.close()
@@ -0,0 +1,86 @@
+from InlineClasses import OP, ERR, STATUS, NDUT
+from InlineEval import evaluate_step, classify
+from InlineStore import ResultWriter
+from InlineTestPlan import TESTPLAN, compile_testplan
+from InlineReplay import candidate_plan, replay, RAW_GROUP
+from array import array
+import os
+import pytest
+import random
+import time
+
+SHUTTLES = 50
+
+
+def record(path, shuttles = SHUTTLES, seed = 1):
+	"""
+	results file of shuttles with random voltages around the limits, classified like STATE.TESTING / STATE.EVALUATE:
+	the raw voltages of the n-th step with limits are stored at [n][group][DUT]
+	"""
+	rnd = random.Random(seed)
+	schedule, stores = compile_testplan(TESTPLAN)
+	evals = [op for op in schedule if op[0] == OP.EVAL]
+	writer = ResultWriter(path, len(evals))
+	recorded = []
+	for n in range(0, shuttles):
+		raw = array("f", [float("nan")]) * (len(evals) * 3 * NDUT)
+		errors = dict([(store, [ERR.NORES] * NDUT) for store in stores])
+		for k in range(0, len(evals)):
+			groups, low, erronlow, high, erronhigh, names = evals[k][1:]
+			matrix = []
+			for g in range(0, len(groups)):
+				base = (k * 3 + RAW_GROUP[groups[g]]) * NDUT
+				span = max(high[g][0] - low[g][0], 0.1)
+				raw[base:base + NDUT] = array("f", [rnd.uniform(low[g][0] - 0.2 * span, high[g][0] + 0.2 * span) for i in range(0, NDUT)])
+				matrix.append(list(raw[base:base + NDUT]))		#float32 as stored
+			codes, fault = evaluate_step(matrix, low, erronlow, high, erronhigh)
+			for g in range(0, len(names)):
+				if names[g] is not None:
+					errors[names[g]] = codes[g]
+		status = classify(errors, NDUT)
+		recorded.extend(status)
+		writer.append(time.time(), "LOT%i" % (n % 2), "SN%i" % n, 4.0, STATUS.PASSED, raw, status)
+	filename = writer.filename
+	writer.close()
+	return filename, recorded
+
+
+def test_unchanged_limits_reclassify_nothing(tmp_path):
+	filename, recorded = record(str(tmp_path) + os.sep)
+	total = replay([filename], TESTPLAN, processes = 1)
+	assert len(total) == 1
+	counts = list(total.values())[0]
+	assert counts["shuttles"] == SHUTTLES
+	assert counts["duts"] == SHUTTLES * NDUT
+	assert counts["moved"] == {}
+	assert counts["candidate"] == counts["recorded"]
+	assert sum(counts["recorded"].values()) == len(recorded)
+	assert counts["recorded"].get(ERR.PASSED, 0) == recorded.count(ERR.PASSED)
+
+
+def test_replay_by_lot(tmp_path):
+	filename, recorded = record(str(tmp_path) + os.sep)
+	total = replay([filename], TESTPLAN, by = "lot", lots = set(["LOT1"]), processes = 1)
+	assert list(total.keys()) == ["LOT1"]
+	assert total["LOT1"]["shuttles"] == SHUTTLES // 2
+
+
+def test_changed_limits_reclassify(tmp_path):
+	filename, recorded = record(str(tmp_path) + os.sep)
+	#DS short: SourceErrorT6 above the high limit
+	name = [step["name"] for step in TESTPLAN if "SourceErrorT6" in [limit[5] for limit in step["limits"]]][0]
+	plan = candidate_plan({name: {"Source": (None, -1000.0)}})
+	counts = list(replay([filename], plan, processes = 1).values())[0]
+	assert counts["moved"] != {}
+	assert counts["candidate"].get(ERR.PASSED, 0) == 0
+	assert set([new for rec, new in counts["moved"]]) == set([ERR.DS_SHORT])
+	assert counts["moved"][(ERR.PASSED, ERR.DS_SHORT)] == counts["recorded"][ERR.PASSED]
+
+
+def test_candidate_plan_errors():
+	with pytest.raises(ValueError):
+		candidate_plan({"no such step": {"Gate": (0.0, 1.0)}})
+	plan = candidate_plan({TESTPLAN[0]["name"]: {"Gate": (None, 6.0)}})
+	assert plan[0]["limits"][0][1] == TESTPLAN[0]["limits"][0][1]
+	assert plan[0]["limits"][0][3] == 6.0
+	assert TESTPLAN[0]["limits"][0][3] != 6.0
@@ -0,0 +1,65 @@
+from InlineClasses import ERR
+from InlineSPC import SPCEngine, FAIL
+
+NDUT = 9
+
+
+def test_in_control_without_alarms():
+	spc = SPCEngine(NDUT)
+	for n in range(0, 300):
+		assert spc.update([ERR.PASSED] * NDUT) == []
+	assert spc.yield_rate() == 1.0
+	assert spc.filled == spc.WINDOW
+	assert spc.summary() == ["Yield (%i shuttles): 100.0%%" % spc.WINDOW]
+
+
+def test_single_failure_raises_no_alarm():
+	spc = SPCEngine(NDUT)
+	status = [ERR.PASSED] * NDUT
+	status[4] = ERR.GS_SHORT
+	assert spc.update(status) == []
+
+
+def test_persistent_failure_raises_each_alarm_once():
+	spc = SPCEngine(NDUT)
+	status = [ERR.PASSED] * NDUT
+	status[4] = ERR.GS_SHORT
+	alarms = []
+	for n in range(0, 10):
+		alarms.extend(spc.update(status))
+	keys = [(p, cls, kind) for p, cls, kind, value, limit in alarms]
+	assert (4, ERR.GS_SHORT, "EWMA") in keys
+	assert (4, ERR.GS_SHORT, "CUSUM") in keys
+	assert len(keys) == len(set(keys))
+	assert (4, ERR.GS_SHORT, "CUSUM") in spc.active
+	assert any(["Mo5 GS_SHORT CUSUM" in line for line in spc.summary()])
+	assert spc.rate(4, ERR.GS_SHORT) == 1.0
+	assert spc.rate(NDUT, FAIL) == 1.0 / NDUT
+
+
+def test_alarm_ends_when_the_rate_is_back():
+	spc = SPCEngine(NDUT)
+	status = [ERR.PASSED] * NDUT
+	status[0] = ERR.DS_SHORT
+	for n in range(0, 10):
+		spc.update(status)
+	assert len(spc.active) > 0
+	for n in range(0, 1000):
+		spc.update([ERR.PASSED] * NDUT)
+	assert spc.active == {}
+	assert spc.rate(0, ERR.DS_SHORT) == 0.0
+
+
+def test_nores_is_not_counted():
+	spc = SPCEngine(NDUT, window = 5)
+	status = [ERR.NORES] * NDUT
+	status[0] = ERR.NOT_BONDED
+	spc.update(status)
+	assert spc.samples[0] == 1
+	assert spc.samples[NDUT] == 1
+	assert spc.rate(0, ERR.NOT_BONDED) == 1.0
+	assert spc.yield_rate(1) == 1.0
+	#the window is rolling: the shuttle leaves the window after 5 shuttles
+	for n in range(0, 5):
+		spc.update([ERR.PASSED] * NDUT)
+	assert spc.rate(0, ERR.NOT_BONDED) == 0.0
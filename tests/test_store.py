@@ -0,0 +1,70 @@
+from InlineClasses import ERR, STATUS
+from InlineStore import ResultWriter, ResultReader, HEADERS, HEADER_SIZE, STORE_MAGIC, record_struct, results_filename
+from array import array
+from datetime import date
+import math
+import os
+import time
+
+NSTEPS = 2
+NDUT = 3
+NRAW = NSTEPS * 3 * NDUT
+
+
+def write(path, shuttles, nsteps = NSTEPS):
+	writer = ResultWriter(path, nsteps, NDUT)
+	numbers = []
+	for n in range(0, shuttles):
+		raw = array("f", [float(n + k) for k in range(0, nsteps * 3 * NDUT)])
+		numbers.append(writer.append(time.time(), "LOT%i" % n, "SN%i" % n, 4.5, STATUS.PASSED, raw, [ERR.PASSED, ERR.GS_SHORT, ERR.NORES]))
+	filename = writer.filename
+	writer.close()
+	return filename, numbers
+
+
+def test_round_trip(tmp_path):
+	path = str(tmp_path) + os.sep
+	filename, numbers = write(path, 3)
+	assert filename == results_filename(path, date.today())
+	assert numbers == [1, 2, 3]
+	with ResultReader(filename) as reader:
+		assert (len(reader), reader.NSTEPS, reader.NDUT) == (3, NSTEPS, NDUT)
+		rec = reader[2]
+		assert (rec.shuttle, rec.lot, rec.serial, rec.testerstatus) == (2, "LOT1", "SN1", STATUS.PASSED)
+		assert math.isclose(rec.testtime, 4.5)
+		assert list(rec.raw) == [float(1 + k) for k in range(0, NRAW)]
+		assert rec.dutstatus == [ERR.PASSED, ERR.GS_SHORT, ERR.NORES]
+		#VPhase of step 1
+		assert list(reader.raw(2, 1, 1)) == [float(1 + k) for k in range(4 * NDUT, 5 * NDUT)]
+		assert [r.shuttle for r in reader] == [1, 2, 3]
+
+
+def test_append_after_restart_removes_an_incomplete_record(tmp_path):
+	path = str(tmp_path) + os.sep
+	filename, numbers = write(path, 2)
+	with open(filename, "ab") as f:
+		f.write(b"\0" * 10)
+	filename, numbers = write(path, 1)
+	assert numbers == [3]
+	assert os.path.getsize(filename) == HEADER_SIZE + 3 * record_struct(NSTEPS, NDUT).size
+
+
+def test_other_layout_rolls_over(tmp_path):
+	path = str(tmp_path) + os.sep
+	first, numbers = write(path, 2)
+	second, numbers = write(path, 1, NSTEPS + 1)
+	assert second == results_filename(path, date.today(), 2)
+	assert numbers == [1]
+	#the first file is continued with its own layout
+	assert write(path, 1)[0] == first
+	with ResultReader(second) as reader:
+		assert (len(reader), reader.NSTEPS) == (1, NSTEPS + 1)
+
+
+def test_version_1_header(tmp_path):
+	filename, numbers = write(str(tmp_path) + os.sep, 2)
+	with open(filename, "r+b") as f:
+		f.write(HEADERS[1].pack(STORE_MAGIC, 1, HEADER_SIZE, record_struct(NSTEPS, NDUT).size, NSTEPS, NDUT).ljust(HEADERS[2].size, b"\0"))
+	with ResultReader(filename) as reader:
+		assert len(reader) == 2
+		assert reader[2].lot == "LOT1"
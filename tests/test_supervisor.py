@@ -0,0 +1,34 @@
+from InlineClasses import ERR
+from InlineSupervisor import Aggregator
+
+
+def shuttle(dutstatus):
+	return {"timestamp": 1.0, "shuttle": 1, "lot": "L", "serial": "S", "testtime": 4.0, "status": 1, "dutstatus": [int(e) for e in dutstatus]}
+
+
+def test_shuttles_are_counted_per_station_and_line():
+	aggregator = Aggregator()
+	aggregator.handle(("shuttle", "L1", shuttle([ERR.PASSED, ERR.GS_SHORT, ERR.NORES])))
+	aggregator.handle(("shuttle", "L2", shuttle([ERR.PASSED, ERR.PASSED, ERR.TESTER_FAULT])))
+	l1 = aggregator.station("L1")
+	assert (l1["shuttles"], l1["duts"]) == (1, 2)
+	assert l1["classes"][ERR.GS_SHORT] == 1
+	#codes without class of their own are counted as UNKNOWN
+	assert aggregator.station("L2")["classes"][ERR.UNKNOWN] == 1
+	line = aggregator.line
+	assert (line["shuttles"], line["duts"]) == (2, 5)
+	assert line["classes"][ERR.PASSED] == 3
+
+
+def test_state_alarm_and_exit():
+	aggregator = Aggregator()
+	aggregator.handle(("state", "L1", ("IDLE", "PASSED")))
+	assert (aggregator.station("L1")["state"], aggregator.station("L1")["status"]) == ("IDLE", "PASSED")
+	aggregator.handle(("alarm", "L1", "Repetition Error: Position 6, GS_SHORT"))
+	assert aggregator.station("L1")["alarms"] == 1
+	assert aggregator.line["alarms"] == 1
+	aggregator.handle(("exit", "L1", None))
+	assert aggregator.station("L1")["state"] == "EXIT"
+	summary = aggregator.summary().split("\n")
+	assert summary[1].startswith("L1")
+	assert summary[-1].startswith("line")
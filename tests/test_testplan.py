@@ -0,0 +1,54 @@
+from InlineClasses import OP, ERR, QGUI, Ports, states, position
+from InlineTestPlan import TESTPLAN, compile_testplan
+
+
+def step(name, actions, limits = (), post = ()):
+	return {"name": name, "actions": list(actions), "limits": list(limits), "post": list(post)}
+
+
+def ops(schedule, kind):
+	return [op for op in schedule if op[0] == kind]
+
+
+def test_redundant_relay_writes_and_settles_are_removed():
+	plan = [step("A", [(OP.RELAY, Ports.DOUT_VGATE_ON, states.SET), (OP.SETTLE, 0.3)], [(QGUI.Gate, 1.0, ERR.VLOW, 2.0, ERR.VHIGH, None)]),
+			step("B", [(OP.RELAY, Ports.DOUT_VGATE_ON, states.SET), (OP.SETTLE, 0.3)], [(QGUI.Gate, 1.0, ERR.VLOW, 2.0, ERR.VHIGH, None)]),
+			step("C", [(OP.RELAY, Ports.DOUT_VGATE_ON, states.CLEAR), (OP.SETTLE, 0.3), (OP.WAIT, 0.1)])]
+	schedule, stores = compile_testplan(plan)
+	assert ops(schedule, OP.RELAY) == [(OP.RELAY, Ports.DOUT_VGATE_ON, states.SET), (OP.RELAY, Ports.DOUT_VGATE_ON, states.CLEAR)]
+	assert len(ops(schedule, OP.SETTLE)) == 2
+	#a fixed wait is always kept
+	assert ops(schedule, OP.WAIT) == [(OP.WAIT, 0.1)]
+	assert stores == []
+
+
+def test_steps_are_framed_and_only_steps_with_limits_are_measured():
+	plan = [step("A", [(OP.RELAY, Ports.SHUTTLE_VALVE, position.UP)]),
+			step("B", [], [(QGUI.Source, 0.0, ERR.VLOW, 1.0, ERR.VHIGH, "S")])]
+	schedule, stores = compile_testplan(plan)
+	assert [op[0] for op in schedule] == [OP.STEP, OP.RELAY, OP.END, OP.STEP, OP.MEASURE, OP.EVAL, OP.END]
+	assert schedule[0] == (OP.STEP, "A")
+	assert ops(schedule, OP.MEASURE) == [(OP.MEASURE, (1,))]
+	assert stores == ["S"]
+
+
+def test_measured_modules_and_stores():
+	plan = [step("A", [], [(QGUI.Gate, 1.0, ERR.VLOW, 2.0, ERR.VHIGH, "G"), (QGUI.Phase, 1.0, ERR.VLOW, 2.0, ERR.VHIGH, None)]),
+			step("B", [], [(QGUI.Gate, 1.0, ERR.VLOW, 2.0, ERR.VHIGH, "G"), (QGUI.Source, 1.0, ERR.VLOW, 2.0, ERR.VHIGH, "S")])]
+	schedule, stores = compile_testplan(plan)
+	assert ops(schedule, OP.MEASURE) == [(OP.MEASURE, (0, 1)), (OP.MEASURE, (0, 1))]
+	evals = ops(schedule, OP.EVAL)
+	assert evals[0][1] == (QGUI.Gate, QGUI.Phase)
+	assert evals[1][-1] == ("G", "S")
+	assert stores == ["G", "S"]
+
+
+def test_testplan():
+	schedule, stores = compile_testplan(TESTPLAN)
+	assert len(ops(schedule, OP.STEP)) == len(TESTPLAN)
+	for store in ("PhaseErrorT3", "SourceErrorT3", "GateErrorT4", "SourceErrorT4", "GateErrorT5", "SourceErrorT5", "SourceErrorT6"):
+		assert store in stores
+	#the needle contact of TS3 is a fixed wait, not an adaptive settle
+	ts3 = schedule[schedule.index((OP.STEP, TESTPLAN[2]["name"])):]
+	ts3 = ts3[0:ts3.index((OP.END,))]
+	assert len(ops(ts3, OP.WAIT)) > 0